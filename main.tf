@@ -81,6 +81,9 @@ resource "google_cloudfunctions2_function" "default" {
     max_instance_count    = 1
     service_account_email = data.google_service_account.default.email
     ingress_settings      = "ALLOW_INTERNAL_ONLY"
+    environment_variables = {
+      VALIDATION_MODE = var.validation_mode
+    }
   }
 
   event_trigger {
@@ -0,0 +1,110 @@
+from typing import Dict, Iterable, Sequence, Union
+import numpy as np
+
+from src.columnar import CashflowColumns, MISSING_MONTH
+
+
+GroupMapping = Dict[str, Union[str, Iterable[str]]]
+
+
+def _group_memberships(columns: CashflowColumns, group_mapping: GroupMapping):
+    """
+    Flattens a group mapping into parallel arrays of (account code, group code),
+    ordered by account code. Accounts not present in the mapping do not belong to
+    any group.
+    """
+    group_names: Dict[str, int] = {}
+    account_codes, group_codes = [], []
+    for account_code, account_name in enumerate(columns.account_names):
+        groups = group_mapping.get(account_name, ())
+        if isinstance(groups, str):
+            groups = (groups,)
+        for group in groups:
+            account_codes.append(account_code)
+            group_codes.append(group_names.setdefault(group, len(group_names)))
+
+    return (
+        tuple(group_names),
+        np.array(account_codes, dtype=np.int64),
+        np.array(group_codes, dtype=np.int64),
+    )
+
+
+def aggregate_cashflows_by_group(
+    columns: CashflowColumns, group_mapping: GroupMapping
+) -> CashflowColumns:
+    """
+    Sums inflows, outflows and valuations of the accounts of every group by month.
+
+    The aggregation is a dense bincount over (group, month) keys, so its cost is linear
+    in the number of rows. Accounts may belong to several groups (e.g. a portfolio and
+    the whole book), in which case their rows are counted once per group. Rows without
+    a month are ignored. Months where an account has no row do not contribute to the
+    group valuation, so gaps should be filled beforehand (see validation.FILL).
+
+    Args:
+        columns (CashflowColumns): The account level cashflow extract.
+        group_mapping (Dict[str, Union[str, Iterable[str]]]):
+            Group name, or group names, of every account name.
+    Returns:
+        CashflowColumns: One row per (group, month) with data, where account_names
+            are the group names, sorted by group and month.
+    """
+    group_names, member_accounts, member_groups = _group_memberships(
+        columns, group_mapping
+    )
+    rows = np.flatnonzero(columns.months != MISSING_MONTH)
+    if len(group_names) == 0 or len(rows) == 0:
+        return CashflowColumns.empty(group_names)
+
+    # expand every row once per group its account belongs to; memberships are ordered
+    # by account, so those of an account are contiguous from first_membership
+    memberships_per_account = np.bincount(
+        member_accounts, minlength=len(columns.account_names)
+    )
+    first_membership = np.cumsum(memberships_per_account) - memberships_per_account
+    repeats = memberships_per_account[columns.account_codes[rows]]
+    expanded_rows = np.repeat(rows, repeats)
+    starts = np.cumsum(repeats) - repeats
+    membership = np.repeat(
+        first_membership[columns.account_codes[rows]] - starts, repeats
+    ) + np.arange(len(expanded_rows))
+    groups = member_groups[membership]
+
+    first_month = int(columns.months[rows].min())
+    span = int(columns.months[rows].max()) - first_month + 1
+    keys = groups * span + (columns.months[expanded_rows] - first_month)
+    size = len(group_names) * span
+    present = np.bincount(keys, minlength=size) > 0
+    key_values = np.flatnonzero(present)
+
+    def sum_by_key(values: np.ndarray) -> np.ndarray:
+        return np.bincount(keys, weights=values[expanded_rows], minlength=size)[
+            key_values
+        ]
+
+    return CashflowColumns(
+        account_names=group_names,
+        account_codes=(key_values // span).astype(np.int32),
+        months=(key_values % span + first_month).astype(np.int32),
+        inflows=sum_by_key(columns.inflows),
+        outflows=sum_by_key(columns.outflows),
+        valuations=sum_by_key(columns.valuations),
+    )
+
+
+def merge_aggregated_cashflows(parts: Sequence[CashflowColumns]) -> CashflowColumns:
+    """
+    Merges group level cashflows aggregated from several extracts of the same data,
+    summing the rows of a group and month found in more than one of them.
+
+    Args:
+        parts (Sequence[CashflowColumns]): Outputs of aggregate_cashflows_by_group().
+    Returns:
+        CashflowColumns: One row per (group, month), sorted by group and month.
+    """
+    merged = CashflowColumns.concatenate(parts)
+
+    return aggregate_cashflows_by_group(
+        merged, {group_name: group_name for group_name in merged.account_names}
+    )
@@ -0,0 +1,549 @@
+from dataclasses import dataclass
+import datetime as dt
+import json
+from logging import INFO
+import math
+from operator import attrgetter
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+from src import model
+from src.utils.logs import AggregatingLogger, default_module_logger
+
+
+logger = default_module_logger(__file__)
+aggregated_logger = AggregatingLogger(logger)
+
+
+MISSING_MONTH = np.iinfo(np.int32).min
+
+
+def date_to_month_index(date: Optional[dt.date]) -> int:
+    """
+    Converts a date into a month index (months elapsed since year 0).
+
+    Args:
+        date (dt.date, optional): The date to convert.
+    Returns:
+        int: The month index, or MISSING_MONTH when date is None.
+    """
+    if date is None:
+        return MISSING_MONTH
+    return date.year * 12 + date.month - 1
+
+
+def month_index_to_date(month_index: int) -> Optional[dt.date]:
+    """
+    Converts a month index back into the first day of that month.
+
+    Args:
+        month_index (int): The month index as produced by date_to_month_index().
+    Returns:
+        dt.date: The first day of the month, or None for MISSING_MONTH.
+    """
+    if month_index == MISSING_MONTH:
+        return None
+    year, month = divmod(int(month_index), 12)
+    return dt.date(year, month + 1, 1)
+
+
+@dataclass
+class CashflowColumns:
+    """
+    Column-oriented representation of a cashflow extract. Each row of the extract
+    is stored at the same position across all arrays, so that whole-extract
+    operations can be expressed as array operations instead of per-object loops.
+
+    Attributes:
+        account_names (Tuple[str, ...]): Distinct account names; position is the account code.
+        account_codes (np.ndarray): int32 account code of every row.
+        months (np.ndarray): int32 month index of every row (MISSING_MONTH when unknown).
+        inflows (np.ndarray): float64 inflow of every row (NaN when unknown).
+        outflows (np.ndarray): float64 outflow of every row (NaN when unknown).
+        valuations (np.ndarray): float64 valuation of every row (NaN when unknown).
+    """
+
+    account_names: Tuple[str, ...]
+    account_codes: np.ndarray
+    months: np.ndarray
+    inflows: np.ndarray
+    outflows: np.ndarray
+    valuations: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.account_codes)
+
+    @classmethod
+    def from_snapshots(
+        cls, cashflow_snapshots: List[model.CashflowSnapshot]
+    ) -> "CashflowColumns":
+        """
+        Builds the columnar representation of a list of cashflow snapshots.
+
+        Args:
+            cashflow_snapshots (List[model.CashflowSnapshot]): The snapshots to convert.
+        Returns:
+            CashflowColumns: The columnar representation, rows kept in input order.
+        """
+        count = len(cashflow_snapshots)
+        codes: Dict[str, int] = {}
+        account_codes = np.fromiter(
+            (
+                codes.setdefault(name, len(codes))
+                for name in map(attrgetter("account_name"), cashflow_snapshots)
+            ),
+            dtype=np.int32,
+            count=count,
+        )
+        months = np.fromiter(
+            map(
+                date_to_month_index,
+                map(attrgetter("first_day_of_month"), cashflow_snapshots),
+            ),
+            dtype=np.int32,
+            count=count,
+        )
+
+        def float_column(attribute: str) -> np.ndarray:
+            return np.fromiter(
+                (
+                    np.nan if value is None else value
+                    for value in map(attrgetter(attribute), cashflow_snapshots)
+                ),
+                dtype=np.float64,
+                count=count,
+            )
+
+        return cls(
+            account_names=tuple(codes),
+            account_codes=account_codes,
+            months=months,
+            inflows=float_column("cumulative_inflow"),
+            outflows=float_column("cumulative_outflow"),
+            valuations=float_column("valuation"),
+        )
+
+    @classmethod
+    def from_records(
+        cls, records: Sequence[Tuple[str, int, float, float, float]]
+    ) -> "CashflowColumns":
+        """
+        Builds the columnar representation of a sequence of records.
+
+        Args:
+            records (Sequence[Tuple[str, int, float, float, float]]): Account name, month
+                index, inflow, outflow and valuation of every row.
+        Returns:
+            CashflowColumns: The columnar representation, rows kept in input order.
+        """
+        codes: Dict[str, int] = {}
+        account_codes = np.fromiter(
+            (codes.setdefault(record[0], len(codes)) for record in records),
+            dtype=np.int32,
+            count=len(records),
+        )
+        numbers = np.array([record[1:] for record in records], dtype=np.float64)
+        numbers = numbers.reshape(len(records), 4)
+
+        return cls(
+            account_names=tuple(codes),
+            account_codes=account_codes,
+            months=numbers[:, 0].astype(np.int32),
+            inflows=numbers[:, 1].copy(),
+            outflows=numbers[:, 2].copy(),
+            valuations=numbers[:, 3].copy(),
+        )
+
+    @classmethod
+    def concatenate(cls, parts: Sequence["CashflowColumns"]) -> "CashflowColumns":
+        """
+        Concatenates several extracts, merging their account codings.
+
+        Args:
+            parts (Sequence[CashflowColumns]): The extracts to concatenate.
+        Returns:
+            CashflowColumns: The rows of all the extracts, in order.
+        """
+        if len(parts) == 0:
+            return cls.empty()
+
+        codes: Dict[str, int] = {}
+        account_codes = []
+        for part in parts:
+            recoding = np.array(
+                [codes.setdefault(name, len(codes)) for name in part.account_names],
+                dtype=np.int32,
+            )
+            account_codes.append(recoding[part.account_codes])
+
+        return cls(
+            account_names=tuple(codes),
+            account_codes=np.concatenate(account_codes),
+            months=np.concatenate([part.months for part in parts]),
+            inflows=np.concatenate([part.inflows for part in parts]),
+            outflows=np.concatenate([part.outflows for part in parts]),
+            valuations=np.concatenate([part.valuations for part in parts]),
+        )
+
+    @classmethod
+    def empty(cls, account_names: Tuple[str, ...] = ()) -> "CashflowColumns":
+        """
+        Builds an extract without rows.
+
+        Args:
+            account_names (Tuple[str, ...]): The account names of the extract.
+        Returns:
+            CashflowColumns: The empty extract.
+        """
+        return cls(
+            account_names=account_names,
+            account_codes=np.empty(0, dtype=np.int32),
+            months=np.empty(0, dtype=np.int32),
+            inflows=np.empty(0),
+            outflows=np.empty(0),
+            valuations=np.empty(0),
+        )
+
+    def take(self, indices: np.ndarray) -> "CashflowColumns":
+        """
+        Selects a subset of rows, keeping the same account coding.
+
+        Args:
+            indices (np.ndarray): Integer positions or boolean mask of the rows to keep.
+        Returns:
+            CashflowColumns: A new instance with the selected rows.
+        """
+        return CashflowColumns(
+            account_names=self.account_names,
+            account_codes=self.account_codes[indices],
+            months=self.months[indices],
+            inflows=self.inflows[indices],
+            outflows=self.outflows[indices],
+            valuations=self.valuations[indices],
+        )
+
+    def sort_order(self) -> np.ndarray:
+        """
+        Computes the stable row order by account code and then by month.
+
+        Returns:
+            np.ndarray: Row positions that sort the extract by (account, month).
+        """
+        return np.lexsort((self.months, self.account_codes))
+
+    def to_snapshots(self) -> List[model.CashflowSnapshot]:
+        """
+        Converts the columnar representation back into cashflow snapshots.
+
+        Returns:
+            List[model.CashflowSnapshot]: One snapshot per row, in row order.
+        """
+        names = self.account_names
+        return [
+            model.CashflowSnapshot(
+                first_day_of_month=month_index_to_date(month),
+                cumulative_inflow=inflow,
+                cumulative_outflow=outflow,
+                valuation=valuation,
+                account_name=names[code],
+            )
+            for code, month, inflow, outflow, valuation in zip(
+                self.account_codes.tolist(),
+                self.months.tolist(),
+                self.inflows.tolist(),
+                self.outflows.tolist(),
+                self.valuations.tolist(),
+            )
+        ]
+
+
+def _round(values: Sequence[float], decimals: int = 4) -> List[float]:
+    return [round(value, decimals) for value in values]
+
+
+def _json_numbers(values: np.ndarray) -> List[str]:
+    return [
+        repr(value) if math.isfinite(value) else "null" for value in values.tolist()
+    ]
+
+
+@dataclass
+class IrrColumns:
+    """
+    Column-oriented container of IRR results, filled in place by the compute stage.
+    Each calculated month is stored at the same position across all arrays, so that
+    results can be annualized and serialized without one object per row.
+    IrrSnapshot objects can still be obtained as views of single rows.
+
+    Attributes:
+        account_names (Tuple[str, ...]): Distinct account names; position is the account code.
+        account_codes (np.ndarray): int32 account code of every row.
+        months (np.ndarray): int32 month index of every row.
+        irr_monthly (np.ndarray, optional): float64 monthly IRR (NaN when undefined),
+            None when the IRR is not calculated.
+        irr_annual (np.ndarray, optional): float64 annualized IRR.
+        twr_monthly (np.ndarray): float64 monthly time-weighted return.
+        twr_cumulative (np.ndarray): float64 cumulative time-weighted return.
+        irr_valuation_sensitivity (np.ndarray, optional): float64 dIRR/dValuation.
+        mirr_monthly (np.ndarray, optional): float64 monthly MIRR, None when the MIRR
+            is not calculated.
+        mirr_annual (np.ndarray, optional): float64 annualized MIRR.
+    """
+
+    account_names: Tuple[str, ...]
+    account_codes: np.ndarray
+    months: np.ndarray
+    irr_monthly: Optional[np.ndarray]
+    irr_annual: Optional[np.ndarray]
+    twr_monthly: np.ndarray
+    twr_cumulative: np.ndarray
+    irr_valuation_sensitivity: Optional[np.ndarray]
+    mirr_monthly: Optional[np.ndarray] = None
+    mirr_annual: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.account_codes)
+
+    @classmethod
+    def allocate(
+        cls,
+        account_names: Tuple[str, ...],
+        rows: int,
+        solve_irr: bool = True,
+        mirr: bool = False,
+    ) -> "IrrColumns":
+        """
+        Preallocates the arrays of a given number of result rows, filled with NaN.
+
+        Args:
+            account_names (Tuple[str, ...]): The account names of the results.
+            rows (int): The number of result rows.
+            solve_irr (bool): Whether IRR and sensitivity arrays are allocated.
+            mirr (bool): Whether MIRR arrays are allocated.
+        Returns:
+            IrrColumns: The preallocated container.
+        """
+
+        def column() -> np.ndarray:
+            return np.full(rows, np.nan)
+
+        return cls(
+            account_names=account_names,
+            account_codes=np.zeros(rows, dtype=np.int32),
+            months=np.zeros(rows, dtype=np.int32),
+            irr_monthly=column() if solve_irr else None,
+            irr_annual=column() if solve_irr else None,
+            twr_monthly=column(),
+            twr_cumulative=column(),
+            irr_valuation_sensitivity=column() if solve_irr else None,
+            mirr_monthly=column() if mirr else None,
+            mirr_annual=column() if mirr else None,
+        )
+
+    def annualize(self):
+        """
+        Computes the annualized IRR and MIRR of all the rows from the monthly values.
+        """
+        with np.errstate(invalid="ignore"):
+            if self.irr_monthly is not None:
+                self.irr_annual = np.round((1 + self.irr_monthly) ** 12 - 1, 4)
+            if self.mirr_monthly is not None:
+                self.mirr_annual = np.round((1 + self.mirr_monthly) ** 12 - 1, 4)
+
+    def snapshot(self, position: int) -> model.IrrSnapshot:
+        """
+        Builds the IrrSnapshot view of a row.
+
+        Args:
+            position (int): The position of the row.
+        Returns:
+            model.IrrSnapshot: The IRR snapshot of the row.
+        """
+
+        def value(column: Optional[np.ndarray]) -> Optional[float]:
+            return None if column is None else column[position].item()
+
+        return model.IrrSnapshot(
+            month_index_to_date(self.months[position]),
+            value(self.irr_monthly),
+            self.account_names[self.account_codes[position]],
+            value(self.twr_monthly),
+            value(self.twr_cumulative),
+            value(self.irr_valuation_sensitivity),
+            value(self.mirr_monthly),
+        )
+
+    def by_account(self) -> Dict[str, List[model.IrrSnapshot]]:
+        """
+        Builds the IrrSnapshot views of all the rows, grouped by account.
+
+        Returns:
+            Dict[str, List[model.IrrSnapshot]]: The IRR snapshots of every account,
+                keyed by account name. Accounts without results have an empty list.
+        """
+        irr_snapshots: Dict[str, List[model.IrrSnapshot]] = {
+            name: [] for name in self.account_names
+        }
+        for position in range(len(self)):
+            irr_snapshot = self.snapshot(position)
+            irr_snapshots[irr_snapshot.account_name].append(irr_snapshot)
+
+        return irr_snapshots
+
+    def to_accounts(self) -> Dict[str, model.Account]:
+        """
+        Builds Account objects holding the IrrSnapshot views of their results.
+
+        Returns:
+            Dict[str, model.Account]: The accounts, keyed by account name.
+        """
+        accounts = {}
+        for name, irr_snapshots in self.by_account().items():
+            accounts[name] = model.Account(name)
+            accounts[name].irr_snapshots = irr_snapshots
+
+        return accounts
+
+    def iter_ndjson(
+        self,
+        name_field: str,
+        include_sensitivities: bool = False,
+        chunk_rows: int = 65536,
+    ) -> Iterator[str]:
+        """
+        Serializes the results as newline delimited JSON, with the same rows and fields
+        as destination_repository.irr_rows(), directly from the arrays and in chunks of
+        rows to bound the memory used. Rows where neither the IRR nor the MIRR is
+        defined are skipped.
+
+        Args:
+            name_field (str): The name of the field holding the account name.
+            include_sensitivities (bool): Whether to add the irr_valuation_sensitivity field.
+            chunk_rows (int): The maximum number of rows serialized at once.
+        Yields:
+            str: One JSON object per line for up to chunk_rows rows.
+        """
+        missing = np.full(len(self), np.nan)
+        irr_monthly = missing if self.irr_monthly is None else self.irr_monthly
+        irr_annual = missing if self.irr_annual is None else self.irr_annual
+        irr_defined = ~(np.isnan(irr_monthly) | np.isnan(irr_annual))
+        keep = irr_defined
+        if self.mirr_monthly is not None:
+            keep = irr_defined | ~np.isnan(self.mirr_monthly)
+        names = [json.dumps(name) for name in self.account_names]
+        fields = [
+            ("first_day_of_month", None),
+            ("irr_monthly", np.where(irr_defined, irr_monthly, np.nan)),
+            ("irr_annual", np.where(irr_defined, irr_annual, np.nan)),
+            ("twr_monthly", self.twr_monthly),
+            ("twr_cumulative", self.twr_cumulative),
+            (name_field, None),
+        ]
+        if self.mirr_monthly is not None:
+            fields += [
+                ("mirr_monthly", self.mirr_monthly),
+                ("mirr_annual", self.mirr_annual),
+            ]
+        if include_sensitivities:
+            sensitivities = self.irr_valuation_sensitivity
+            fields.append(
+                (
+                    "irr_valuation_sensitivity",
+                    missing if sensitivities is None else sensitivities,
+                )
+            )
+        line = "{" + ", ".join(f"{json.dumps(key)}: %s" for key, _ in fields) + "}\n"
+
+        kept_rows = np.flatnonzero(keep)
+        for start in range(0, len(kept_rows), chunk_rows):
+            rows = kept_rows[start : start + chunk_rows]
+            months, month_positions = np.unique(self.months[rows], return_inverse=True)
+            dates = [
+                json.dumps(None if date is None else date.strftime("%Y-%m-%d"))
+                for date in map(month_index_to_date, months.tolist())
+            ]
+            values = [
+                [dates[position] for position in month_positions.tolist()],
+                *(_json_numbers(column[rows]) for _, column in fields[1:5]),
+                [names[code] for code in self.account_codes[rows].tolist()],
+                *(_json_numbers(column[rows]) for _, column in fields[6:]),
+            ]
+            yield "".join(line % row for row in zip(*values))
+
+    def to_ndjson(self, name_field: str, include_sensitivities: bool = False) -> str:
+        """
+        Serializes all the results as newline delimited JSON (see iter_ndjson()).
+
+        Args:
+            name_field (str): The name of the field holding the account name.
+            include_sensitivities (bool): Whether to add the irr_valuation_sensitivity field.
+        Returns:
+            str: One JSON object per line, with a trailing newline if not empty.
+        """
+        return "".join(self.iter_ndjson(name_field, include_sensitivities))
+
+
+def calculate_irr_columns(
+    columns: CashflowColumns,
+    mirr_rates: Optional[model.MirrRates] = None,
+    solve_irr: bool = True,
+) -> IrrColumns:
+    """
+    Calculates the IRR results of every account of an extract into a preallocated
+    IrrColumns: the IRR, its valuation sensitivity, the time-weighted return and, if
+    requested, the MIRR. model.Account.calculate_irr() builds on it.
+
+    Args:
+        columns (CashflowColumns): The cashflow extract, sorted by account and month.
+        mirr_rates (model.MirrRates, optional): If provided, the MIRR is also calculated.
+        solve_irr (bool): Whether to calculate the IRR and its sensitivity.
+    Returns:
+        IrrColumns: The results of every month but the first of every account, in
+            extract order. Only accounts with cashflows in the extract are kept.
+    """
+    present_codes, first_rows, counts = np.unique(
+        columns.account_codes, return_index=True, return_counts=True
+    )
+    order = np.argsort(first_rows)
+    account_names = tuple(columns.account_names[code] for code in present_codes[order])
+    starts, counts = first_rows[order].tolist(), counts[order].tolist()
+
+    irrs = IrrColumns.allocate(
+        account_names,
+        sum(max(count - 1, 0) for count in counts),
+        solve_irr=solve_irr,
+        mirr=mirr_rates is not None,
+    )
+    net_cashflows = columns.outflows - columns.inflows
+    position = 0
+    for code, (start, count) in enumerate(zip(starts, counts)):
+        if count < 2:
+            aggregated_logger.log(
+                "not_enough_values",
+                INFO,
+                "Not enough values for %s",
+                account_names[code],
+            )
+            continue
+        series = slice(start, start + count)
+        rows = slice(position, position + count - 1)
+        net, valuations = net_cashflows[series].tolist(), columns.valuations[series]
+        if solve_irr:
+            solved = model.calculate_irr_series(net, valuations.tolist(), decimals=None)
+            irrs.irr_monthly[rows] = _round(solved)
+            irrs.irr_valuation_sensitivity[rows] = model.calculate_irr_sensitivities(
+                net, valuations, solved
+            )
+        if mirr_rates is not None:
+            irrs.mirr_monthly[rows] = model.calculate_mirr_series(
+                net, valuations, *mirr_rates.monthly()
+            )
+        irrs.twr_monthly[rows], irrs.twr_cumulative[rows] = model.calculate_twr_series(
+            net, valuations
+        )
+        irrs.account_codes[rows] = code
+        irrs.months[rows] = columns.months[start + 1 : start + count]
+        position += count - 1
+
+    irrs.annualize()
+    return irrs
@@ -1,9 +1,19 @@
 from abc import ABC, abstractmethod
-from typing import Dict, List
+from contextlib import contextmanager
+import datetime as dt
+from typing import IO, Callable, Dict, Iterable, Iterator, List, Optional
+from google.api_core.exceptions import Conflict, NotFound, PreconditionFailed
 from google.cloud import bigquery
+import json
 import math
+import os
+import tempfile
+import time
+import uuid
 
 from src import model
+from src.columnar import IrrColumns
+from src.npv_profile import NpvProfile
 
 
 class AbstractDestinationRepository(ABC):
@@ -14,6 +24,24 @@ class AbstractDestinationRepository(ABC):
     Methods:
         load_irrs(self, accounts: Dict[str, model.Account]):
             Abstract method for loading Internal Rate of Return (IRR) data into the repository.
+        load_group_irrs(self, group_irrs: Dict[str, List[model.IrrSnapshot]]):
+            Abstract method for loading the IRR data of groups of accounts into the repository.
+        irr_columns_loader(self) -> ContextManager[Callable[[IrrColumns], None]]:
+            Loads columnar IRR results batch by batch. Defaults to load_irrs() with
+            IrrSnapshot views.
+        load_irr_columns(self, irrs: IrrColumns):
+            Loads columnar IRR results in a single batch.
+        load_group_irr_columns(self, group_irrs: IrrColumns):
+            Loads columnar group IRR results. Defaults to load_group_irrs().
+        run_lock(self, ttl: float) -> ContextManager[bool]:
+            Excludes concurrent runs loading into the repository. Defaults to no locking.
+        get_run_fingerprints(self) -> Dict[str, str]:
+            Returns the source fingerprints recorded by the last successful run.
+        record_run_fingerprints(self, fingerprints: Dict[str, Optional[str]]):
+            Records the source fingerprints of a successful run. Defaults to not recording.
+            Repositories recording them clear them whenever IRRs are loaded.
+        load_npv_profiles(self, npv_profiles: Iterable[NpvProfile]):
+            Loads NPV profiles and their IRR roots, if supported by the repository.
     """
 
     @abstractmethod
@@ -29,6 +57,201 @@ class AbstractDestinationRepository(ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def load_group_irrs(self, group_irrs: Dict[str, List[model.IrrSnapshot]]):
+        """
+        Abstract method for loading the IRR data of groups of accounts into the repository.
+
+        Args:
+            group_irrs (Dict[str, List[model.IrrSnapshot]]):
+                A dictionary with the IRR snapshots of every group, keyed by group name.
+        Raises:
+            NotImplementedError: This method should be implemented by concrete subclasses.
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def irr_columns_loader(self) -> Iterator[Callable[[IrrColumns], None]]:
+        """
+        Context manager loading columnar IRR results into the repository batch by
+        batch. It yields a function to call with the results of every batch of accounts;
+        they are loaded together, replacing the previous results, when the context exits
+        without error. Repositories that can serialize the arrays directly should
+        override it, so that the results of a batch need not be kept once passed; by
+        default they are converted into accounts with IrrSnapshot views and passed to
+        load_irrs() at the end.
+
+        Yields:
+            Callable[[IrrColumns], None]: The function taking the results of a batch.
+        """
+        accounts: Dict[str, model.Account] = {}
+        yield lambda irrs: accounts.update(irrs.to_accounts())
+        self.load_irrs(accounts)
+
+    def load_irr_columns(self, irrs: IrrColumns):
+        """
+        Loads columnar IRR results into the repository, as a single batch of
+        irr_columns_loader().
+
+        Args:
+            irrs (IrrColumns): The IRR results of every account.
+        """
+        with self.irr_columns_loader() as load_batch:
+            load_batch(irrs)
+
+    def load_group_irr_columns(self, group_irrs: IrrColumns):
+        """
+        Loads columnar IRR results of groups of accounts into the repository. By default
+        the results are converted into IrrSnapshot views and passed to load_group_irrs().
+
+        Args:
+            group_irrs (IrrColumns): The IRR results of every group.
+        """
+        self.load_group_irrs(group_irrs.by_account())
+
+    @contextmanager
+    def run_lock(self, ttl: float = 3600) -> Iterator[bool]:
+        """
+        Context manager excluding concurrent runs loading into the repository. It yields
+        whether the lock was acquired; a run that does not acquire it should not load.
+        Locks not released within `ttl` seconds, e.g. by a crashed run, are considered
+        stale. Repositories without locking support always yield True.
+
+        Args:
+            ttl (float): Seconds after which a lock is considered stale.
+        Yields:
+            bool: Whether the lock was acquired.
+        """
+        yield True
+
+    def get_run_fingerprints(self) -> Dict[str, str]:
+        """
+        Returns the source fingerprints recorded by the last successful run, keyed by
+        kind of fingerprint. Repositories without recording support return no fingerprint.
+
+        Returns:
+            Dict[str, str]: The recorded fingerprints.
+        """
+        return {}
+
+    def record_run_fingerprints(self, fingerprints: Dict[str, Optional[str]]):
+        """
+        Records the source fingerprints of a successful run, replacing the previous ones.
+        Repositories without recording support ignore them.
+
+        Args:
+            fingerprints (Dict[str, Optional[str]]): The fingerprints keyed by kind. None
+                values are not recorded.
+        """
+
+    def load_npv_profiles(self, npv_profiles: Iterable[NpvProfile]):
+        """
+        Loads NPV profiles and their IRR roots into the repository.
+
+        Args:
+            npv_profiles (Iterable[NpvProfile]): The NPV profiles of batches of accounts.
+        Raises:
+            NotImplementedError: If the repository does not support NPV profiles.
+        """
+        raise NotImplementedError
+
+
+RUN_LABEL_PREFIX = "irr_run_"
+
+
+def _json_float(value: Optional[float]) -> Optional[float]:
+    return None if value is None or math.isnan(value) else value
+
+
+def _is_defined(value: Optional[float]) -> bool:
+    return value is not None and not math.isnan(value)
+
+
+def irr_rows(
+    irr_snapshots: Iterable[model.IrrSnapshot],
+    name_field: str,
+    include_sensitivities: bool = False,
+) -> List[Dict]:
+    """
+    Builds the JSON-like rows to persist from IRR snapshots, skipping the snapshots
+    where neither the IRR nor the MIRR is defined. MIRR fields are only added when
+    the MIRR was calculated.
+
+    Args:
+        irr_snapshots (Iterable[model.IrrSnapshot]): The IRR snapshots to convert.
+        name_field (str): The name of the field holding the snapshot account_name.
+        include_sensitivities (bool): Whether to add the irr_valuation_sensitivity field.
+    Returns:
+        List[Dict]: One dictionary per IRR snapshot with a defined IRR or MIRR.
+    """
+    rows = []
+    for irr in irr_snapshots:
+        irr_defined = _is_defined(irr.irr_monthly) and _is_defined(irr.irr_annual)
+        if not irr_defined and not _is_defined(irr.mirr_monthly):
+            continue
+        row = {
+            "first_day_of_month": irr.first_day_of_month.strftime("%Y-%m-%d"),
+            "irr_monthly": irr.irr_monthly if irr_defined else None,
+            "irr_annual": irr.irr_annual if irr_defined else None,
+            "twr_monthly": _json_float(irr.twr_monthly),
+            "twr_cumulative": _json_float(irr.twr_cumulative),
+            name_field: irr.account_name,
+        }
+        if irr.mirr_monthly is not None:
+            row["mirr_monthly"] = _json_float(irr.mirr_monthly)
+            row["mirr_annual"] = _json_float(irr.mirr_annual)
+        if include_sensitivities:
+            row["irr_valuation_sensitivity"] = _json_float(
+                irr.irr_valuation_sensitivity
+            )
+        rows.append(row)
+
+    return rows
+
+
+def irr_schema(
+    name_field: str, mirr: bool = False, include_sensitivities: bool = False
+) -> List[bigquery.SchemaField]:
+    """
+    Returns the BigQuery schema of the rows built by irr_rows() and
+    IrrColumns.iter_ndjson(), so that loads do not depend on the values seen.
+
+    Args:
+        name_field (str): The name of the field holding the account or group name.
+        mirr (bool): Whether the rows hold the MIRR fields.
+        include_sensitivities (bool): Whether the rows hold the valuation sensitivity.
+    Returns:
+        List[bigquery.SchemaField]: The fields of the rows, in order.
+    """
+    fields = [
+        ("first_day_of_month", "DATE"),
+        ("irr_monthly", "FLOAT"),
+        ("irr_annual", "FLOAT"),
+        ("twr_monthly", "FLOAT"),
+        ("twr_cumulative", "FLOAT"),
+        (name_field, "STRING"),
+    ]
+    if mirr:
+        fields += [("mirr_monthly", "FLOAT"), ("mirr_annual", "FLOAT")]
+    if include_sensitivities:
+        fields.append(("irr_valuation_sensitivity", "FLOAT"))
+    return [bigquery.SchemaField(name, field_type) for name, field_type in fields]
+
+
+NPV_PROFILE_SCHEMA = [
+    bigquery.SchemaField("first_day_of_month", "DATE"),
+    bigquery.SchemaField("rate_annual", "FLOAT"),
+    bigquery.SchemaField("npv", "FLOAT"),
+    bigquery.SchemaField("entity_name", "STRING"),
+]
+IRR_ROOT_SCHEMA = [
+    bigquery.SchemaField("first_day_of_month", "DATE"),
+    bigquery.SchemaField("root", "INTEGER"),
+    bigquery.SchemaField("irr_monthly", "FLOAT"),
+    bigquery.SchemaField("irr_annual", "FLOAT"),
+    bigquery.SchemaField("entity_name", "STRING"),
+]
+
 
 class BigQueryDestinationRepository(AbstractDestinationRepository):
     """
@@ -38,19 +261,42 @@ class BigQueryDestinationRepository(AbstractDestinationRepository):
 
     Args:
         client (bigquery.Client): The BigQuery client used for data operations.
+        include_sensitivities (bool): Whether IRR valuation sensitivities are loaded.
     Attributes:
         client (bigquery.Client): The BigQuery client instance.
         irr_destination (str): The destination table for IRR snapshots.
+        group_irr_destination (str): The destination table for group IRR snapshots.
+        include_sensitivities (bool): Whether IRR valuation sensitivities are loaded.
     Methods:
         load_table_from_json(data, destination, job_config):
             Loads a list of dictionaries as JSON into the specified BigQuery table.
         load_irrs(accounts):
             Loads IRR snapshots from a dictionary of Account objects into the IRR destination table.
+        load_group_irrs(group_irrs):
+            Loads IRR snapshots of groups of accounts into the group IRR destination table.
+        load_table_from_ndjson(data, destination, schema):
+            Loads newline delimited JSON text into the specified BigQuery table.
+        irr_columns_loader():
+            Loads columnar IRR results batch by batch into the IRR destination table.
+        load_group_irr_columns(group_irrs):
+            Loads columnar IRR results into the group IRR destination table.
+        run_lock(ttl):
+            Excludes concurrent runs by creating the run lock table, which fails if it exists.
+        get_run_fingerprints() / record_run_fingerprints(fingerprints):
+            Reads or writes the run fingerprints as labels of the IRR destination table,
+            cleared by every load of the table.
+        load_npv_profiles(npv_profiles):
+            Loads NPV profiles and IRR roots into their destination tables.
     """
 
-    def __init__(self, client: bigquery.Client):
+    def __init__(self, client: bigquery.Client, include_sensitivities: bool = False):
         self.client = client
         self.irr_destination = "tier3_domain.entity_irrs"
+        self.group_irr_destination = "tier3_domain.group_irrs"
+        self.run_lock_table = "tier3_domain.irr_run_lock"
+        self.npv_profile_destination = "tier3_domain.npv_profiles"
+        self.irr_root_destination = "tier3_domain.irr_roots"
+        self.include_sensitivities = include_sensitivities
 
     def load_table_from_json(
         self,
@@ -80,22 +326,492 @@ class BigQueryDestinationRepository(AbstractDestinationRepository):
                 A dictionary mapping account identifiers to Account objects, each containing IRR snapshots.
         """
 
-        irrs = [
-            {
-                "first_day_of_month": irr.first_day_of_month.strftime("%Y-%m-%d"),
-                "irr_monthly": irr.irr_monthly,
-                "irr_annual": irr.irr_annual,
-                "entity_name": irr.account_name,
-            }
-            for account in accounts.values()
-            for irr in account.irr_snapshots
-            if irr.irr_monthly is not None
-            and not math.isnan(irr.irr_monthly)
-            and irr.irr_annual is not None
-            and not math.isnan(irr.irr_annual)
-        ]
+        irrs = irr_rows(
+            (irr for account in accounts.values() for irr in account.irr_snapshots),
+            "entity_name",
+            self.include_sensitivities,
+        )
         job_config = bigquery.LoadJobConfig(
             write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
             source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
         )
+        self._clear_run_fingerprints()
         self.load_table_from_json(irrs, self.irr_destination, job_config)
+
+    def load_group_irrs(self, group_irrs: Dict[str, List[model.IrrSnapshot]]):
+        """
+        Loads IRR snapshots of groups of accounts into the group destination table.
+
+        Args:
+            group_irrs (Dict[str, List[model.IrrSnapshot]]):
+                A dictionary mapping group names to their IRR snapshots.
+        """
+        irrs = irr_rows(
+            (irr for irr_snapshots in group_irrs.values() for irr in irr_snapshots),
+            "group_name",
+            self.include_sensitivities,
+        )
+        job_config = bigquery.LoadJobConfig(
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+        )
+        self.load_table_from_json(irrs, self.group_irr_destination, job_config)
+
+    def load_table_from_ndjson(
+        self,
+        data: Iterable[str],
+        destination: str,
+        schema: List[bigquery.SchemaField],
+    ):
+        """
+        Loads newline delimited JSON text into a BigQuery table, replacing its content
+        and its schema, so that the table is created or gains fields as needed. The
+        text is spooled to a temporary file rather than held in memory.
+
+        Args:
+            data (Iterable[str]): Chunks of the rows to load, one JSON object per line.
+            destination (str): The destination BigQuery table identifier.
+            schema (List[bigquery.SchemaField]): The schema of the rows.
+        """
+        with tempfile.TemporaryFile() as file:
+            for chunk in data:
+                file.write(chunk.encode())
+            self._load_ndjson_file(file, destination, schema)
+
+    def _load_ndjson_file(
+        self, file: IO[bytes], destination: str, schema: List[bigquery.SchemaField]
+    ):
+        file.seek(0)
+        job_config = bigquery.LoadJobConfig(
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+            schema=schema,
+        )
+        load_job = self.client.load_table_from_file(
+            file, destination, job_config=job_config
+        )
+        load_job.result()
+
+    @contextmanager
+    def irr_columns_loader(self) -> Iterator[Callable[[IrrColumns], None]]:
+        """
+        Context manager loading columnar IRR results into the destination table batch
+        by batch. Every batch is serialized from the arrays to a temporary file, which
+        is loaded with a single job when the context exits without error.
+
+        Yields:
+            Callable[[IrrColumns], None]: The function taking the results of a batch.
+        """
+        mirr = False
+        with tempfile.TemporaryFile() as file:
+
+            def load_batch(irrs: IrrColumns):
+                nonlocal mirr
+                mirr = mirr or irrs.mirr_monthly is not None
+                for chunk in irrs.iter_ndjson(
+                    "entity_name", self.include_sensitivities
+                ):
+                    file.write(chunk.encode())
+
+            yield load_batch
+            self._clear_run_fingerprints()
+            self._load_ndjson_file(
+                file,
+                self.irr_destination,
+                irr_schema("entity_name", mirr, self.include_sensitivities),
+            )
+
+    def load_group_irr_columns(self, group_irrs: IrrColumns):
+        """
+        Loads columnar IRR results of groups of accounts into the group destination table.
+
+        Args:
+            group_irrs (IrrColumns): The IRR results of every group.
+        """
+        self.load_table_from_ndjson(
+            group_irrs.iter_ndjson("group_name", self.include_sensitivities),
+            self.group_irr_destination,
+            irr_schema(
+                "group_name",
+                group_irrs.mirr_monthly is not None,
+                self.include_sensitivities,
+            ),
+        )
+
+    def _create_run_lock_table(
+        self, table_id: bigquery.TableReference, ttl: float, holder: str
+    ) -> bool:
+        """
+        Creates the run lock table, labelled with its holder and expiring after `ttl`
+        seconds. If the existing one is stale, it is taken over by updating it with
+        the ETag read along with its expiration, so that BigQuery rejects the takeover
+        when another run updated the table first. Returns whether the lock was acquired.
+        """
+        for _ in range(2):
+            now = dt.datetime.now(dt.timezone.utc)
+            table = bigquery.Table(table_id)
+            table.expires = now + dt.timedelta(seconds=ttl)
+            table.labels = {"holder": holder}
+            try:
+                self.client.create_table(table)
+                return True
+            except Conflict:
+                try:
+                    existing = self.client.get_table(table_id)
+                except NotFound:
+                    continue
+                if existing.expires is not None and existing.expires > now:
+                    return False
+                existing.expires = table.expires
+                existing.labels = table.labels
+                try:
+                    self.client.update_table(existing, ["expires", "labels"])
+                    return True
+                except PreconditionFailed:
+                    return False
+                except NotFound:
+                    continue
+        return False
+
+    @contextmanager
+    def run_lock(self, ttl: float = 3600) -> Iterator[bool]:
+        """
+        Excludes concurrent runs by creating the run lock table, which BigQuery refuses
+        to do if it already exists, and deleting it at the end of the run. The table
+        expires after `ttl` seconds, so the lock of a crashed run is eventually released
+        or taken over. A run only deletes the table while it is still labelled as its
+        holder, so that it does not release a lock taken over after its own expired.
+
+        Args:
+            ttl (float): Seconds after which a lock is considered stale.
+        Yields:
+            bool: Whether the lock was acquired.
+        """
+        table_id = bigquery.TableReference.from_string(
+            self.run_lock_table, default_project=self.client.project
+        )
+        holder = uuid.uuid4().hex
+        acquired = self._create_run_lock_table(table_id, ttl, holder)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    table = self.client.get_table(table_id)
+                except NotFound:
+                    table = None
+                if table is not None and table.labels.get("holder") == holder:
+                    self.client.delete_table(table_id, not_found_ok=True)
+
+    def get_run_fingerprints(self) -> Dict[str, str]:
+        """
+        Returns the run fingerprints stored as labels of the IRR destination table,
+        read from the table metadata without running any query.
+
+        Returns:
+            Dict[str, str]: The recorded fingerprints, empty if the table does not exist.
+        """
+        try:
+            table = self.client.get_table(self.irr_destination)
+        except NotFound:
+            return {}
+
+        return {
+            key[len(RUN_LABEL_PREFIX) :]: value
+            for key, value in table.labels.items()
+            if key.startswith(RUN_LABEL_PREFIX)
+        }
+
+    def record_run_fingerprints(self, fingerprints: Dict[str, Optional[str]]):
+        """
+        Stores the run fingerprints as labels of the IRR destination table, replacing
+        the previous ones. Label values are limited to 63 lowercase letters, digits,
+        underscores and dashes.
+
+        Args:
+            fingerprints (Dict[str, Optional[str]]): The fingerprints keyed by kind.
+        """
+        table = self.client.get_table(self.irr_destination)
+        # labels left out of an update are kept: remove the previous ones explicitly
+        table.labels = {
+            **{key: None for key in table.labels if key.startswith(RUN_LABEL_PREFIX)},
+            **{
+                f"{RUN_LABEL_PREFIX}{key}": value for key, value in fingerprints.items()
+            },
+        }
+        self.client.update_table(table, ["labels"])
+
+    def _clear_run_fingerprints(self):
+        # a load job keeps the labels of the table it replaces
+        try:
+            self.record_run_fingerprints({})
+        except NotFound:
+            pass
+
+    def load_npv_profiles(self, npv_profiles: Iterable[NpvProfile]):
+        """
+        Loads NPV profiles and their IRR roots into their destination tables. Both are
+        spooled to temporary files batch by batch, then loaded with one job per table.
+
+        Args:
+            npv_profiles (Iterable[NpvProfile]): The NPV profiles of batches of accounts.
+        """
+        with tempfile.TemporaryFile() as profiles, tempfile.TemporaryFile() as roots:
+            for npv_profile in npv_profiles:
+                for chunk in npv_profile.iter_ndjson("entity_name"):
+                    profiles.write(chunk.encode())
+                for chunk in npv_profile.iter_roots_ndjson("entity_name"):
+                    roots.write(chunk.encode())
+            self._load_ndjson_file(
+                profiles, self.npv_profile_destination, NPV_PROFILE_SCHEMA
+            )
+            self._load_ndjson_file(roots, self.irr_root_destination, IRR_ROOT_SCHEMA)
+
+
+class FileDestinationRepository(AbstractDestinationRepository):
+    """
+    Repository for writing IRR data as newline delimited JSON files into a local
+    directory, with the same rows that would be loaded into BigQuery.
+
+    Args:
+        directory (str): The directory where files are written.
+        include_sensitivities (bool): Whether IRR valuation sensitivities are written.
+    Attributes:
+        directory (str): The directory where files are written.
+        irr_destination (str): The file name for IRR snapshots.
+        group_irr_destination (str): The file name for group IRR snapshots.
+        include_sensitivities (bool): Whether IRR valuation sensitivities are written.
+    Methods:
+        write_json(data, destination):
+            Writes a list of dictionaries as newline delimited JSON, replacing the file.
+        load_irrs(accounts):
+            Writes IRR snapshots from a dictionary of Account objects into the IRR file.
+        load_group_irrs(group_irrs):
+            Writes IRR snapshots of groups of accounts into the group IRR file.
+        irr_columns_loader():
+            Writes columnar IRR results batch by batch into the IRR file.
+        load_group_irr_columns(group_irrs):
+            Writes columnar IRR results into the group IRR file.
+        run_lock(ttl):
+            Excludes concurrent runs by exclusively creating a lock file.
+        get_run_fingerprints() / record_run_fingerprints(fingerprints):
+            Reads or writes the run fingerprints in a JSON file, removed by every write of
+            the IRR file.
+        load_npv_profiles(npv_profiles):
+            Writes NPV profiles and IRR roots into their files.
+    """
+
+    def __init__(self, directory: str, include_sensitivities: bool = False):
+        self.directory = directory
+        self.irr_destination = "entity_irrs.json"
+        self.group_irr_destination = "group_irrs.json"
+        self.run_fingerprints_file = "run_fingerprints.json"
+        self.run_lock_file = "run.lock"
+        self.npv_profile_destination = "npv_profiles.json"
+        self.irr_root_destination = "irr_roots.json"
+        self.include_sensitivities = include_sensitivities
+
+    def write_json(self, data: List[Dict], destination: str):
+        """
+        Writes a list of dictionaries as newline delimited JSON, replacing the file.
+
+        Args:
+            data (List[Dict]): The rows to write.
+            destination (str): The file name, relative to the directory.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, destination), "w") as file:
+            for row in data:
+                file.write(json.dumps(row))
+                file.write("\n")
+
+    def load_irrs(self, accounts: Dict[str, model.Account]):
+        """
+        Writes IRR snapshots from the provided accounts into the IRR file.
+
+        Args:
+            accounts (Dict[str, model.Account]):
+                A dictionary mapping account identifiers to Account objects, each containing IRR snapshots.
+        """
+        irrs = irr_rows(
+            (irr for account in accounts.values() for irr in account.irr_snapshots),
+            "entity_name",
+            self.include_sensitivities,
+        )
+        self._clear_run_fingerprints()
+        self.write_json(irrs, self.irr_destination)
+
+    def load_group_irrs(self, group_irrs: Dict[str, List[model.IrrSnapshot]]):
+        """
+        Writes IRR snapshots of groups of accounts into the group IRR file.
+
+        Args:
+            group_irrs (Dict[str, List[model.IrrSnapshot]]):
+                A dictionary mapping group names to their IRR snapshots.
+        """
+        irrs = irr_rows(
+            (irr for irr_snapshots in group_irrs.values() for irr in irr_snapshots),
+            "group_name",
+            self.include_sensitivities,
+        )
+        self.write_json(irrs, self.group_irr_destination)
+
+    def write_ndjson(self, data: Iterable[str], destination: str):
+        """
+        Writes newline delimited JSON text, replacing the file.
+
+        Args:
+            data (Iterable[str]): Chunks of the rows to write, one JSON object per line.
+            destination (str): The file name, relative to the directory.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, destination), "w") as file:
+            file.writelines(data)
+
+    @contextmanager
+    def irr_columns_loader(self) -> Iterator[Callable[[IrrColumns], None]]:
+        """
+        Context manager writing columnar IRR results into the IRR file batch by batch,
+        serialized from the arrays as every batch is passed.
+
+        Yields:
+            Callable[[IrrColumns], None]: The function taking the results of a batch.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._clear_run_fingerprints()
+        with open(os.path.join(self.directory, self.irr_destination), "w") as file:
+            yield lambda irrs: file.writelines(
+                irrs.iter_ndjson("entity_name", self.include_sensitivities)
+            )
+
+    def load_group_irr_columns(self, group_irrs: IrrColumns):
+        """
+        Writes columnar IRR results of groups of accounts into the group IRR file.
+
+        Args:
+            group_irrs (IrrColumns): The IRR results of every group.
+        """
+        self.write_ndjson(
+            group_irrs.iter_ndjson("group_name", self.include_sensitivities),
+            self.group_irr_destination,
+        )
+
+    @staticmethod
+    def _read_run_lock_holder(path: str) -> Optional[str]:
+        try:
+            with open(path) as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _create_run_lock_file(self, path: str, ttl: float, holder: str) -> bool:
+        """
+        Exclusively creates the lock file holding `holder`, taking over the existing one
+        if it is older than `ttl` seconds. Returns whether the lock was acquired.
+        """
+        for _ in range(2):
+            try:
+                with os.fdopen(
+                    os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY), "w"
+                ) as file:
+                    file.write(holder)
+                return True
+            except FileExistsError:
+                try:
+                    age = time.time() - os.stat(path).st_mtime
+                except FileNotFoundError:
+                    continue
+                if age < ttl:
+                    return False
+                stale_holder = self._read_run_lock_holder(path)
+                if stale_holder is None:
+                    continue
+                # replace the stale lock atomically, unless another run took it over
+                # meanwhile, and check that no concurrent takeover replaced ours
+                fd, temp_path = tempfile.mkstemp(dir=self.directory)
+                with os.fdopen(fd, "w") as file:
+                    file.write(holder)
+                if self._read_run_lock_holder(path) != stale_holder:
+                    os.remove(temp_path)
+                    return False
+                os.rename(temp_path, path)
+                return self._read_run_lock_holder(path) == holder
+        return False
+
+    @contextmanager
+    def run_lock(self, ttl: float = 3600) -> Iterator[bool]:
+        """
+        Excludes concurrent runs by exclusively creating a lock file in the directory,
+        holding an identifier of the run. The file is removed at the end of the run,
+        unless another run took the lock over in the meantime.
+
+        Args:
+            ttl (float): Seconds after which a lock is considered stale.
+        Yields:
+            bool: Whether the lock was acquired.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, self.run_lock_file)
+        holder = uuid.uuid4().hex
+        acquired = self._create_run_lock_file(path, ttl, holder)
+        try:
+            yield acquired
+        finally:
+            if acquired and self._read_run_lock_holder(path) == holder:
+                os.remove(path)
+
+    def get_run_fingerprints(self) -> Dict[str, str]:
+        """
+        Returns the run fingerprints recorded in the directory.
+
+        Returns:
+            Dict[str, str]: The recorded fingerprints, empty if none were recorded.
+        """
+        try:
+            with open(os.path.join(self.directory, self.run_fingerprints_file)) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def record_run_fingerprints(self, fingerprints: Dict[str, Optional[str]]):
+        """
+        Records the run fingerprints in the directory, replacing the previous ones.
+
+        Args:
+            fingerprints (Dict[str, Optional[str]]): The fingerprints keyed by kind.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(
+            os.path.join(self.directory, self.run_fingerprints_file), "w"
+        ) as file:
+            json.dump(
+                {
+                    key: value
+                    for key, value in fingerprints.items()
+                    if value is not None
+                },
+                file,
+            )
+
+    def _clear_run_fingerprints(self):
+        try:
+            os.remove(os.path.join(self.directory, self.run_fingerprints_file))
+        except FileNotFoundError:
+            pass
+
+    def load_npv_profiles(self, npv_profiles: Iterable[NpvProfile]):
+        """
+        Writes NPV profiles and their IRR roots into their files, batch by batch.
+
+        Args:
+            npv_profiles (Iterable[NpvProfile]): The NPV profiles of batches of accounts.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(
+            os.path.join(self.directory, self.npv_profile_destination), "w"
+        ) as profile_file, open(
+            os.path.join(self.directory, self.irr_root_destination), "w"
+        ) as root_file:
+            for npv_profile in npv_profiles:
+                profile_file.writelines(npv_profile.iter_ndjson("entity_name"))
+                root_file.writelines(npv_profile.iter_roots_ndjson("entity_name"))
@@ -1,5 +1,8 @@
 import click
 from src.entrypoints.cli.calculate_irr import calculate_irr
+from src.entrypoints.cli.npv_profile import npv_profile
+from src.entrypoints.cli.profile import profile
+from src.entrypoints.cli.required_valuation import required_valuation
 import warnings
 from dotenv import load_dotenv
 
@@ -13,6 +16,9 @@ def cli():
 
 
 cli.add_command(calculate_irr)
+cli.add_command(profile)
+cli.add_command(required_valuation)
+cli.add_command(npv_profile)
 
 if __name__ == "__main__":
     load_dotenv(dotenv_path=".env", override=True)
@@ -1,8 +1,16 @@
 import click
+import functools
+import json
 import os
 
-from src import source_repository, destination_repository, services, model
-from src.utils.gcp_clients import create_bigquery_client
+from src import (
+    source_repository,
+    destination_repository,
+    services,
+    model,
+    validation,
+)
+from src.utils.gcp_clients import BigQueryClientPool
 from src.utils.logs import default_module_logger
 
 
@@ -10,17 +18,197 @@ logger = default_module_logger(__file__)
 
 
 @click.command()
-def calculate_irr() -> None:
+@click.option(
+    "--groups",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="JSON file mapping account names to a group name or a list of group names. "
+    "When provided, group level IRRs are also calculated.",
+)
+@click.option(
+    "--validation-mode",
+    type=click.Choice(validation.VALIDATION_MODES),
+    default=validation.REPORT,
+    show_default=True,
+    help="How accounts with flagged cashflows are handled: only reported, filled "
+    "(invalid rows dropped, duplicated months deduplicated, gaps filled) or "
+    "quarantined (left out of the results).",
+)
+@click.option(
+    "--check-monotonic",
+    is_flag=True,
+    default=False,
+    help="Also flag accounts whose inflow or outflow decreases from a month to the next.",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Local directory where the source extract is cached, in one subdirectory "
+    "per source and destination project when several --projects are given. "
+    "Disabled by default.",
+)
+@click.option(
+    "--cache-ttl",
+    type=float,
+    default=3600,
+    show_default=True,
+    help="Seconds during which the cached extract is used without checking the source.",
+)
+@click.option(
+    "--source-file",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Newline delimited JSON export of the cashflow table to read instead of BigQuery.",
+)
+@click.option(
+    "--memory-budget-mb",
+    type=int,
+    default=None,
+    help="Approximate memory, in MB, for the cashflows. When set, the source is "
+    "grouped by account through local disk instead of loaded as a whole.",
+)
+@click.option(
+    "--spill-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Local directory used to spill cashflows. Defaults to the temporary directory.",
+)
+@click.option(
+    "--sensitivities",
+    is_flag=True,
+    default=False,
+    help="Also load the sensitivity of every IRR to the valuation (dIRR/dValuation).",
+)
+@click.option(
+    "--mirr-rates",
+    type=(float, float),
+    default=None,
+    metavar="FINANCE REINVESTMENT",
+    help="Annual finance and reinvestment rates (e.g. 0.05 0.03). When provided, "
+    "the modified IRR is also calculated.",
+)
+@click.option(
+    "--mirr-only",
+    is_flag=True,
+    default=False,
+    help="Calculate the modified IRR instead of the IRR. Requires --mirr-rates.",
+)
+@click.option(
+    "--projects",
+    "project_pairs",
+    type=(str, str),
+    multiple=True,
+    metavar="SOURCE DESTINATION",
+    help="Source and destination project of a pipeline. Can be repeated to run the "
+    "pipelines of several projects concurrently. Defaults to the PROJECT_SOURCE and "
+    "PROJECT_DESTINATION environment variables.",
+)
+@click.option(
+    "--max-workers",
+    type=int,
+    default=4,
+    show_default=True,
+    help="Maximum number of project pipelines running at the same time.",
+)
+@click.option(
+    "--skip-unchanged",
+    is_flag=True,
+    default=False,
+    help="Skip projects whose source data is unchanged since their last successful "
+    "run, and projects already being run by another invocation.",
+)
+def calculate_irr(
+    groups,
+    validation_mode,
+    check_monotonic,
+    cache_dir,
+    cache_ttl,
+    source_file,
+    memory_budget_mb,
+    spill_dir,
+    sensitivities,
+    mirr_rates,
+    mirr_only,
+    project_pairs,
+    max_workers,
+    skip_unchanged,
+) -> None:
+    if mirr_only and mirr_rates is None:
+        raise click.UsageError("--mirr-only requires --mirr-rates")
+    if source_file is not None and len(project_pairs) > 1:
+        raise click.UsageError("--source-file cannot be used with several --projects")
+
+    group_mapping = None
+    if groups is not None:
+        with open(groups) as groups_file:
+            group_mapping = json.load(groups_file)
+    if not project_pairs:
+        source_project = (
+            os.environ["PROJECT_SOURCE"]
+            if source_file is None
+            else os.environ.get("PROJECT_SOURCE")
+        )
+        project_pairs = [(source_project, os.environ["PROJECT_DESTINATION"])]
+
+    client_pool = BigQueryClientPool()
+
+    def project_pipeline(source_project: str, destination_project: str):
+        if source_file is not None:
+            cashflow_repository = source_repository.FileSourceRepository(source_file)
+        else:
+            cashflow_repository = source_repository.BigQuerySourceRepository(
+                client=client_pool.get(source_project),
+            )
+        if cache_dir is not None:
+            cashflow_repository = source_repository.CachedSourceRepository(
+                cashflow_repository,
+                cache_dir=(
+                    cache_dir
+                    if len(project_pairs) == 1
+                    else os.path.join(cache_dir, source_project, destination_project)
+                ),
+                ttl=cache_ttl,
+            )
+        bq_destination_repository = (
+            destination_repository.BigQueryDestinationRepository(
+                client=client_pool.get(destination_project),
+                include_sensitivities=sensitivities,
+            )
+        )
+        pipeline = (
+            services.deduplicated_irr_pipeline
+            if skip_unchanged
+            else services.irr_pipeline
+        )
+        pipeline(
+            source_repository=cashflow_repository,
+            destination_repository=bq_destination_repository,
+            validation_mode=validation_mode,
+            check_monotonic=check_monotonic,
+            group_mapping=group_mapping,
+            memory_budget=(
+                None if memory_budget_mb is None else memory_budget_mb * 1024 * 1024
+            ),
+            spill_dir=spill_dir,
+            mirr_rates=None if mirr_rates is None else model.MirrRates(*mirr_rates),
+            solve_irr=not mirr_only,
+        )
 
-    bq_source_repository = source_repository.BigQuerySourceRepository(
-        client=create_bigquery_client(os.environ["PROJECT_SOURCE"]),
-    )
-    bq_destination_repository = destination_repository.BigQueryDestinationRepository(
-        client=create_bigquery_client(os.environ["PROJECT_DESTINATION"])
-    )
     logger.info("Starting IRR pipeline execution")
-    services.irr_pipeline(
-        source_repository=bq_source_repository,
-        destination_repository=bq_destination_repository,
+    runs = services.run_pipelines(
+        {
+            f"{source_project}->{destination_project}": functools.partial(
+                project_pipeline, source_project, destination_project
+            )
+            for source_project, destination_project in project_pairs
+        },
+        max_workers=max_workers,
     )
+    for run in runs:
+        status = "ok" if run.succeeded else f"failed: {run.error!r}"
+        click.echo(f"{run.name:<40}{run.seconds:>10.1f}s  {status}")
+    failed = [run.name for run in runs if not run.succeeded]
+    if failed:
+        raise click.ClickException(f"IRR pipeline failed for {', '.join(failed)}")
     logger.info("Completed IRR pipeline execution")
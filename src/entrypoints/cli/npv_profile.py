@@ -0,0 +1,82 @@
+import click
+import numpy as np
+import os
+
+from src import source_repository, destination_repository, validation
+from src.npv_profile import iter_npv_profiles
+from src.utils.gcp_clients import create_bigquery_client
+from src.utils.logs import default_module_logger
+
+
+logger = default_module_logger(__file__)
+
+
+@click.command()
+@click.option(
+    "--rate-min",
+    type=float,
+    default=-0.5,
+    show_default=True,
+    help="Lowest annual discount rate of the grid. Must be above -1.",
+)
+@click.option(
+    "--rate-max",
+    type=float,
+    default=1.0,
+    show_default=True,
+    help="Highest annual discount rate of the grid.",
+)
+@click.option(
+    "--rate-step",
+    type=float,
+    default=0.01,
+    show_default=True,
+    help="Step between the annual discount rates of the grid.",
+)
+@click.option(
+    "--source-file",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Newline delimited JSON export of the cashflow table to read instead of BigQuery.",
+)
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Local directory where npv_profiles.json and irr_roots.json are written. "
+    "Loaded into the BigQuery destination project when not provided.",
+)
+def npv_profile(rate_min, rate_max, rate_step, source_file, output_dir) -> None:
+    """
+    Calculates the NPV of every account and month over a grid of annual discount rates,
+    together with every real IRR found where the NPV changes sign.
+    """
+    if rate_min <= -1 or rate_step <= 0 or rate_max < rate_min:
+        raise click.UsageError(
+            "The rate grid requires -1 < --rate-min <= --rate-max and --rate-step > 0"
+        )
+    rates = np.arange(rate_min, rate_max + rate_step / 2, rate_step).round(10)
+
+    if source_file is not None:
+        cashflow_repository = source_repository.FileSourceRepository(source_file)
+    else:
+        cashflow_repository = source_repository.BigQuerySourceRepository(
+            client=create_bigquery_client(os.environ["PROJECT_SOURCE"]),
+        )
+    if output_dir is not None:
+        profile_repository = destination_repository.FileDestinationRepository(
+            output_dir
+        )
+    else:
+        profile_repository = destination_repository.BigQueryDestinationRepository(
+            client=create_bigquery_client(os.environ["PROJECT_DESTINATION"]),
+        )
+
+    logger.info(f"Starting NPV profile calculation over {len(rates)} rates")
+    columns, report = validation.validate_cashflows(
+        cashflow_repository.get_cashflow_columns()
+    )
+    if not report.is_clean:
+        logger.warning(report.summary())
+    profile_repository.load_npv_profiles(iter_npv_profiles(columns, rates))
+    logger.info("Completed NPV profile calculation")
@@ -0,0 +1,118 @@
+import click
+import cProfile
+import json
+import os
+import pstats
+import tracemalloc
+
+from src import source_repository, destination_repository, services
+from src.utils.logs import default_module_logger
+from src.utils.profiling import StageRecorder, collapsed_stacks, summary_table
+
+
+logger = default_module_logger(__file__)
+
+
+@click.command()
+@click.option(
+    "--source-file",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Newline delimited JSON export of the cashflow table. "
+    "Synthetic data is generated when not provided.",
+)
+@click.option(
+    "--accounts",
+    type=int,
+    default=1000,
+    show_default=True,
+    help="Number of synthetic accounts.",
+)
+@click.option(
+    "--months",
+    type=int,
+    default=120,
+    show_default=True,
+    help="Number of months of every synthetic account.",
+)
+@click.option(
+    "--seed", type=int, default=0, show_default=True, help="Synthetic data seed."
+)
+@click.option(
+    "--groups",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="JSON file mapping account names to a group name or a list of group names.",
+)
+@click.option(
+    "--memory-budget-mb",
+    type=int,
+    default=None,
+    help="Profile the pipeline grouping accounts through local disk with this budget.",
+)
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False),
+    default="profile_output",
+    show_default=True,
+    help="Directory where the profile and the pipeline results are written.",
+)
+@click.option(
+    "--top",
+    type=int,
+    default=15,
+    show_default=True,
+    help="Number of functions and allocation sites in the summary.",
+)
+def profile(
+    source_file, accounts, months, seed, groups, memory_budget_mb, output_dir, top
+) -> None:
+    """
+    Runs the IRR pipeline under cProfile and tracemalloc and writes profile.pstats,
+    profile.collapsed (flamegraph-ready collapsed stacks) and summary.txt.
+    """
+    if source_file is not None:
+        cashflow_repository = source_repository.FileSourceRepository(source_file)
+    else:
+        cashflow_repository = source_repository.SyntheticSourceRepository(
+            accounts=accounts, months=months, seed=seed
+        )
+    group_mapping = None
+    if groups is not None:
+        with open(groups) as groups_file:
+            group_mapping = json.load(groups_file)
+    file_destination_repository = destination_repository.FileDestinationRepository(
+        output_dir
+    )
+    recorder = StageRecorder(keep_snapshots=True)
+    profiler = cProfile.Profile()
+
+    logger.info("Starting profiled IRR pipeline execution")
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        services.irr_pipeline(
+            source_repository=cashflow_repository,
+            destination_repository=file_destination_repository,
+            group_mapping=group_mapping,
+            memory_budget=(
+                None if memory_budget_mb is None else memory_budget_mb * 1024 * 1024
+            ),
+            stage_recorder=recorder,
+        )
+    finally:
+        profiler.disable()
+        tracemalloc.stop()
+    logger.info("Completed profiled IRR pipeline execution")
+
+    os.makedirs(output_dir, exist_ok=True)
+    stats = pstats.Stats(profiler)
+    stats.dump_stats(os.path.join(output_dir, "profile.pstats"))
+    with open(os.path.join(output_dir, "profile.collapsed"), "w") as file:
+        file.write("\n".join(collapsed_stacks(stats)) + "\n")
+    summary = summary_table(recorder, stats, top=top)
+    with open(os.path.join(output_dir, "summary.txt"), "w") as file:
+        file.write(summary + "\n")
+
+    click.echo(summary)
+    click.echo(f"\nProfile written to {output_dir}")
@@ -0,0 +1,61 @@
+import click
+import json
+import os
+
+from src import source_repository, validation
+from src.target_valuation import calculate_target_valuations
+from src.utils.gcp_clients import create_bigquery_client
+from src.utils.logs import default_module_logger
+
+
+logger = default_module_logger(__file__)
+
+
+@click.command()
+@click.option(
+    "--target-irr",
+    type=float,
+    required=True,
+    help="Target annual IRR as a decimal (e.g. 0.08 for 8%).",
+)
+@click.option(
+    "--source-file",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Newline delimited JSON export of the cashflow table to read instead of BigQuery.",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False),
+    default="required_valuations.json",
+    show_default=True,
+    help="Newline delimited JSON file where the required valuations are written.",
+)
+def required_valuation(target_irr, source_file, output) -> None:
+    """
+    Calculates the valuation, and the shortfall to the actual valuation, that every
+    account requires at every month to reach a target annual IRR.
+    """
+    if source_file is not None:
+        cashflow_repository = source_repository.FileSourceRepository(source_file)
+    else:
+        cashflow_repository = source_repository.BigQuerySourceRepository(
+            client=create_bigquery_client(os.environ["PROJECT_SOURCE"]),
+        )
+
+    logger.info("Starting required valuation calculation")
+    columns, report = validation.validate_cashflows(
+        cashflow_repository.get_cashflow_columns()
+    )
+    if not report.is_clean:
+        logger.warning(report.summary())
+    try:
+        target_valuations = calculate_target_valuations(columns, target_irr)
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint="--target-irr")
+
+    with open(output, "w") as file:
+        for row in target_valuations.to_rows():
+            file.write(json.dumps(row))
+            file.write("\n")
+    logger.info(f"Required valuations of {len(target_valuations)} months written")
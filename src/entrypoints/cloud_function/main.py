@@ -1,6 +1,8 @@
-from src import source_repository, destination_repository, services, model
+import os
+
+from src import source_repository, destination_repository, services, validation
 from src.utils.gcp_clients import create_bigquery_client
-from src.utils.logs import default_module_logger
+from src.utils.logs import default_module_logger, stop_logging
 
 
 logger = default_module_logger(__file__)
@@ -9,7 +11,10 @@ logger = default_module_logger(__file__)
 def function_entry_point(event, context):
     """
     Entry point for the application. This function initializes BigQuery destination and source repositories
-    connector and invokes the IRR pipeline.
+    connector and invokes the IRR pipeline, unless the source data is unchanged since the last successful
+    run or another invocation is already running it. Flagged cashflows are handled as
+    set by the VALIDATION_MODE environment variable (see validation.validate_cashflows()),
+    "report" by default. The queued logs are written before returning.
 
     Args:
          event: The dictionary with data specific to this type of event. The `@type` field maps to
@@ -30,8 +35,14 @@ def function_entry_point(event, context):
         client=client,
     )
     logger.info("Starting IRR pipeline execution")
-    services.irr_pipeline(
-        source_repository=bq_source_repository,
-        destination_repository=bq_destination_repository,
-    )
-    logger.info("Completed IRR pipeline execution")
+    try:
+        executed = services.deduplicated_irr_pipeline(
+            source_repository=bq_source_repository,
+            destination_repository=bq_destination_repository,
+            validation_mode=os.environ.get("VALIDATION_MODE", validation.REPORT),
+        )
+        if executed:
+            logger.info("Completed IRR pipeline execution")
+    finally:
+        # the instance may be frozen once the function returns, so write queued logs now
+        stop_logging()
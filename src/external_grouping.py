@@ -0,0 +1,182 @@
+import heapq
+from itertools import groupby
+from operator import itemgetter
+import os
+import pickle
+import tempfile
+import zlib
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from src import model
+from src.columnar import CashflowColumns, date_to_month_index
+
+
+ROW_BYTES = 256
+CHUNK_ROWS = 256
+MIN_READ_BUFFER = 4096
+
+Record = Tuple[str, int, float, float, float]
+record_key = itemgetter(0, 1)
+
+
+def _to_record(cashflow_snapshot: model.CashflowSnapshot) -> Record:
+    return (
+        cashflow_snapshot.account_name,
+        date_to_month_index(cashflow_snapshot.first_day_of_month),
+        _to_float(cashflow_snapshot.cumulative_inflow),
+        _to_float(cashflow_snapshot.cumulative_outflow),
+        _to_float(cashflow_snapshot.valuation),
+    )
+
+
+def _to_float(value: Optional[float]) -> float:
+    return float("nan") if value is None else float(value)
+
+
+def _partition(account_name: str, partitions: int) -> int:
+    return zlib.crc32(account_name.encode()) % partitions
+
+
+def _spill(
+    records: List[Record], directory: str, runs: List[List[str]], partitions: int
+):
+    """
+    Splits the buffered records by partition, sorts them by account and month and
+    writes them as one run per partition, appending the path of every run to `runs`.
+    """
+    buckets: List[List[Record]] = [[] for _ in range(partitions)]
+    for record in records:
+        buckets[_partition(record[0], partitions)].append(record)
+
+    for partition, bucket in enumerate(buckets):
+        if not bucket:
+            continue
+        bucket.sort(key=record_key)
+        runs[partition].append(_write_run(bucket, directory))
+
+
+def _write_run(sorted_records: Iterable[Record], directory: str) -> str:
+    """
+    Writes records as a run of pickled chunks of CHUNK_ROWS records and returns its
+    path. Chunks are small so that merging many runs holds few records of each.
+    """
+    descriptor, path = tempfile.mkstemp(dir=directory, suffix=".run")
+    with os.fdopen(descriptor, "wb") as file:
+        chunk: List[Record] = []
+        for record in sorted_records:
+            chunk.append(record)
+            if len(chunk) == CHUNK_ROWS:
+                pickle.dump(chunk, file, protocol=pickle.HIGHEST_PROTOCOL)
+                chunk = []
+        if chunk:
+            pickle.dump(chunk, file, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _read_run(path: str, buffer_size: int) -> Iterator[Record]:
+    with open(path, "rb", buffering=buffer_size) as file:
+        while True:
+            try:
+                yield from pickle.load(file)
+            except EOFError:
+                return
+
+
+def _merge_runs(
+    paths: List[str], memory_budget: int, directory: str
+) -> Iterator[Record]:
+    """
+    Merges sorted runs within a memory budget and removes them once merged.
+
+    Every run being merged holds one chunk of records and a read buffer in memory, the
+    buffers sharing the budget. When there are more runs than the budget allows to
+    merge at once, groups of runs are first merged into longer runs on disk.
+    """
+    max_runs = max(2, memory_budget // (CHUNK_ROWS * ROW_BYTES + MIN_READ_BUFFER))
+    paths = list(paths)
+    while len(paths) > max_runs:
+        group, paths = paths[:max_runs], paths[max_runs:]
+        paths.append(_write_run(_merge(group, memory_budget), directory))
+        for path in group:
+            os.remove(path)
+
+    yield from _merge(paths, memory_budget)
+    for path in paths:
+        os.remove(path)
+
+
+def _merge(paths: List[str], memory_budget: int) -> Iterator[Record]:
+    buffer_size = max(MIN_READ_BUFFER, memory_budget // len(paths))
+    return heapq.merge(
+        *(_read_run(path, buffer_size) for path in paths), key=record_key
+    )
+
+
+def _batches(
+    sorted_records: Iterable[Record], max_rows: int
+) -> Iterator[CashflowColumns]:
+    """
+    Packs records sorted by account and month into extracts of whole accounts with up
+    to `max_rows` rows. An account with more rows is packed alone.
+    """
+    batch: List[Record] = []
+    for _, account_records in groupby(sorted_records, key=itemgetter(0)):
+        account_records = list(account_records)
+        if batch and len(batch) + len(account_records) > max_rows:
+            yield CashflowColumns.from_records(batch)
+            batch = []
+        batch.extend(account_records)
+    if batch:
+        yield CashflowColumns.from_records(batch)
+
+
+def group_by_account(
+    cashflow_snapshots: Iterable[model.CashflowSnapshot],
+    memory_budget: int,
+    spill_dir: Optional[str] = None,
+    partitions: int = 16,
+) -> Iterator[CashflowColumns]:
+    """
+    Groups an unordered stream of cashflow snapshots by account within a memory budget.
+
+    Snapshots are buffered until the budget is reached. Then the buffer is sorted by
+    account and month and spilled to local disk as one sorted run per partition, where
+    accounts are assigned to partitions by hash. Once the stream is exhausted, the runs
+    of every partition are merged back, so that every account comes out complete and in
+    date order, with read buffers sized to share the budget and, if there are too many
+    runs to merge at once within it, intermediate merges on disk. If the whole stream
+    fits in the budget nothing is written to disk.
+
+    Args:
+        cashflow_snapshots (Iterable[model.CashflowSnapshot]): The snapshots to group.
+        memory_budget (int): Approximate number of bytes of snapshots held in memory,
+            assuming ROW_BYTES bytes per snapshot.
+        spill_dir (str, optional): Directory where runs are written. Defaults to the
+            system temporary directory. Runs are removed once merged.
+        partitions (int): Number of partitions runs are split into.
+    Yields:
+        CashflowColumns: Extracts of whole accounts, sorted by account and month, with
+            about memory_budget / ROW_BYTES rows at most.
+    """
+    max_rows = max(1, memory_budget // ROW_BYTES)
+    records: List[Record] = []
+    with tempfile.TemporaryDirectory(dir=spill_dir) as directory:
+        runs: List[List[str]] = [[] for _ in range(partitions)]
+        for cashflow_snapshot in cashflow_snapshots:
+            records.append(_to_record(cashflow_snapshot))
+            if len(records) >= max_rows:
+                _spill(records, directory, runs, partitions)
+                records = []
+
+        if not any(runs):
+            records.sort(key=record_key)
+            yield from _batches(records, max_rows)
+            return
+
+        if records:
+            _spill(records, directory, runs, partitions)
+            records = []
+        for partition_runs in runs:
+            if partition_runs:
+                merged = _merge_runs(partition_runs, memory_budget, directory)
+                yield from _batches(merged, max_rows)
@@ -1,11 +1,14 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
 import datetime as dt
+from logging import INFO
+import numpy as np
 import numpy_financial as npf
-from typing import List, Dict
-from src.utils.logs import default_module_logger
+from typing import List, Dict, Optional, Sequence, Tuple
+from src.utils.logs import AggregatingLogger, default_module_logger
 
 
 logger = default_module_logger(__file__)
+aggregated_logger = AggregatingLogger(logger)
 
 
 @dataclass(frozen=True)
@@ -36,6 +39,32 @@ class CashflowSnapshot:
             return self.first_day_of_month > other.first_day_of_month
 
 
+@dataclass(frozen=True)
+class MirrRates:
+    """
+    Annual rates used by the modified internal rate of return (MIRR).
+
+    Attributes:
+        finance_rate (float): Annual rate paid on the money invested (e.g., 0.05 for 5%).
+        reinvestment_rate (float): Annual rate earned on the money returned.
+    """
+
+    finance_rate: float
+    reinvestment_rate: float
+
+    def monthly(self) -> Tuple[float, float]:
+        """
+        Converts the annual rates into monthly compounded rates.
+
+        Returns:
+            Tuple[float, float]: The monthly finance and reinvestment rates.
+        """
+        return (
+            (1 + self.finance_rate) ** (1 / 12) - 1,
+            (1 + self.reinvestment_rate) ** (1 / 12) - 1,
+        )
+
+
 @dataclass(frozen=True)
 class IrrSnapshot:
     """
@@ -43,27 +72,244 @@ class IrrSnapshot:
 
     Attributes:
         first_day_of_month (datetime): The date of the IRR calculation.
-        irr_monthly (float): Monthly IRR value as a decimal (e.g., 0.02 for 2%).
+        irr_monthly (float): Monthly IRR value as a decimal (e.g., 0.02 for 2%), None
+            when the IRR was not calculated.
         account_name (str): The name of the associated account.
+        twr_monthly (float, optional): Time-weighted return of the month as a decimal.
+        twr_cumulative (float, optional): Time-weighted return since the first month.
+        irr_valuation_sensitivity (float, optional): Change of the monthly IRR per
+            unit change of the valuation at this date (dIRR/dValuation).
+        mirr_monthly (float, optional): Monthly modified IRR (MIRR) value as a decimal.
 
     Properties:
         irr_annual (float): The annualized IRR value based on the monthly IRR.
+        mirr_annual (float): The annualized MIRR value based on the monthly MIRR.
+    Methods:
+        irr_cashflow_sensitivity(months_before: int) -> Optional[float]:
+            Change of the monthly IRR per unit change of an earlier net cashflow.
     """
 
     first_day_of_month: dt.date
     irr_monthly: float
     account_name: str
+    twr_monthly: Optional[float] = field(default=None, compare=False)
+    twr_cumulative: Optional[float] = field(default=None, compare=False)
+    irr_valuation_sensitivity: Optional[float] = field(default=None, compare=False)
+    mirr_monthly: Optional[float] = field(default=None, compare=False)
 
     @property
-    def irr_annual(self) -> float:
+    def irr_annual(self) -> Optional[float]:
         """
         Compute the annualized IRR using monthly compounding.
 
         Returns:
-            float: The annualized IRR value (rounded to 4 decimal places).
+            float: The annualized IRR value (rounded to 4 decimal places), None when
+                the IRR was not calculated.
         """
+        if self.irr_monthly is None:
+            return None
         return round(((1 + self.irr_monthly) ** 12) - 1, 4)
 
+    @property
+    def mirr_annual(self) -> Optional[float]:
+        """
+        Compute the annualized MIRR using monthly compounding.
+
+        Returns:
+            float: The annualized MIRR value (rounded to 4 decimal places), None when
+                the MIRR was not calculated.
+        """
+        if self.mirr_monthly is None:
+            return None
+        return round(((1 + self.mirr_monthly) ** 12) - 1, 4)
+
+    def irr_cashflow_sensitivity(self, months_before: int) -> Optional[float]:
+        """
+        Compute the change of the monthly IRR per unit change of the net cashflow
+        (outflow minus inflow) made `months_before` months before this date.
+
+        As both derive from the same NPV, dIRR/dCashflow_t equals dIRR/dValuation
+        compounded at the IRR over the months between t and this date.
+
+        Args:
+            months_before (int): Months between the cashflow and this date.
+        Returns:
+            Optional[float]: The sensitivity, or None if it was not calculated.
+        """
+        if self.irr_valuation_sensitivity is None or self.irr_monthly is None:
+            return None
+        return self.irr_valuation_sensitivity * (1 + self.irr_monthly) ** months_before
+
+
+def calculate_irr_series(
+    net_cashflows: Sequence[float],
+    valuations: Sequence[float],
+    decimals: Optional[int] = 4,
+) -> List[float]:
+    """
+    Computes the monthly IRR at every month but the first of a chronological series.
+
+    The IRR at month k is the rate that makes zero the NPV of the net cashflows of
+    months 0 to k, where the valuation at month k is added to its net cashflow as if
+    the position was liquidated at that point.
+
+    Args:
+        net_cashflows (Sequence[float]): Outflow minus inflow of every month.
+        valuations (Sequence[float]): Valuation at every month. The first one is not used.
+        decimals (int, optional): Decimal places the IRRs are rounded to, None to not round.
+    Returns:
+        List[float]: The monthly IRR of months 1 to n - 1.
+    """
+    irrs = []
+    periodic_cashflow = [net_cashflows[0]]
+    for net_cashflow, valuation in zip(net_cashflows[1:], valuations[1:]):
+        periodic_cashflow.append(valuation + net_cashflow)
+        irr = npf.irr(periodic_cashflow)
+        irrs.append(irr if decimals is None else round(irr, decimals))
+        periodic_cashflow[-1] = net_cashflow
+
+    return irrs
+
+
+def calculate_twr_series(
+    net_cashflows: Sequence[float], valuations: Sequence[float]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the monthly and cumulative time-weighted return (TWR) at every month
+    but the first of a chronological series.
+
+    Consistently with calculate_irr_series(), net cashflows happen at the end of the
+    month and the opening position of the series is the amount invested in the first
+    month, so the return of month k is (valuation_k + net_cashflow_k) / valuation_k-1 - 1.
+    Months with a zero opening position have an undefined (NaN) return.
+
+    Args:
+        net_cashflows (Sequence[float]): Outflow minus inflow of every month.
+        valuations (Sequence[float]): Valuation at every month. The first one is not used.
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The monthly and cumulative TWR (rounded to 4
+            decimal places) of months 1 to n - 1.
+    """
+    net_cashflows = np.asarray(net_cashflows, dtype=np.float64)
+    valuations = np.asarray(valuations, dtype=np.float64)
+    opening = np.concatenate((-net_cashflows[:1], valuations[1:-1]))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = np.where(
+            opening != 0, (valuations[1:] + net_cashflows[1:]) / opening, np.nan
+        )
+
+    return np.round(growth - 1, 4), np.round(np.cumprod(growth) - 1, 4)
+
+
+def calculate_irr_sensitivities(
+    net_cashflows: Sequence[float],
+    valuations: Sequence[float],
+    irrs: Sequence[float],
+) -> np.ndarray:
+    """
+    Computes dIRR/dValuation at every month but the first of a chronological series,
+    from the IRRs already solved by calculate_irr_series().
+
+    The IRR at month k is the implicit root of NPV_k(r) = sum_t CF_t / (1 + r)^t, so by
+    the implicit function theorem dIRR/dValuation_k = -(1 + r)^-k / NPV_k'(r). The
+    derivatives of all months are evaluated at once as a triangular matrix product.
+    Months with an undefined IRR or a flat NPV have an undefined (NaN) sensitivity.
+
+    Args:
+        net_cashflows (Sequence[float]): Outflow minus inflow of every month.
+        valuations (Sequence[float]): Valuation at every month. The first one is not used.
+        irrs (Sequence[float]): Unrounded monthly IRR of months 1 to n - 1.
+    Returns:
+        np.ndarray: dIRR/dValuation of months 1 to n - 1.
+    """
+    net_cashflows = np.asarray(net_cashflows, dtype=np.float64)
+    valuations = np.asarray(valuations, dtype=np.float64)
+    rates = np.asarray(irrs, dtype=np.float64)
+    periods = np.arange(len(net_cashflows))
+    months = periods[1:]
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        discount = np.where(rates > -1, 1 / (1 + rates), np.nan)
+        # discount_k^(t+1) for every month k (rows) and earlier period t (columns)
+        powers = discount[:, None] ** (periods[None, :] + 1)
+        earlier = periods[None, :] < months[:, None]
+        npv_derivative = -np.where(earlier, powers * periods * net_cashflows, 0).sum(
+            axis=1
+        ) - months * (net_cashflows[1:] + valuations[1:]) * discount ** (months + 1)
+        sensitivities = -(discount**months) / npv_derivative
+
+    return np.where(np.isfinite(sensitivities), sensitivities, np.nan)
+
+
+def calculate_mirr_series(
+    net_cashflows: Sequence[float],
+    valuations: Sequence[float],
+    finance_rate: float,
+    reinvestment_rate: float,
+) -> np.ndarray:
+    """
+    Computes the monthly modified IRR (MIRR) at every month but the first of a
+    chronological series, with the same periodic cashflows as calculate_irr_series().
+
+    MIRR has a closed form: negative cashflows are discounted to the first month at
+    the finance rate, positive cashflows compounded to month k at the reinvestment
+    rate, and MIRR_k = (FV_positive / -PV_negative)^(1/k) - 1. Both sums are obtained
+    for all months at once from discounted prefix sums, so no root finding is needed.
+    Months without both a positive and a negative cashflow have an undefined (NaN) MIRR.
+
+    Args:
+        net_cashflows (Sequence[float]): Outflow minus inflow of every month.
+        valuations (Sequence[float]): Valuation at every month. The first one is not used.
+        finance_rate (float): Monthly rate paid on negative cashflows.
+        reinvestment_rate (float): Monthly rate earned on positive cashflows.
+    Returns:
+        np.ndarray: The monthly MIRR (rounded to 4 decimal places) of months 1 to n - 1.
+    """
+    net_cashflows = np.asarray(net_cashflows, dtype=np.float64)
+    valuations = np.asarray(valuations, dtype=np.float64)
+    periods = np.arange(len(net_cashflows))
+    months = periods[1:]
+    finance_discount = (1 + finance_rate) ** -periods
+    reinvestment_discount = (1 + reinvestment_rate) ** -periods
+
+    # sums over the months before k, plus the final cashflow including the valuation
+    earlier_negative = np.cumsum(np.minimum(net_cashflows, 0) * finance_discount)[:-1]
+    earlier_positive = np.cumsum(np.maximum(net_cashflows, 0) * reinvestment_discount)[
+        :-1
+    ]
+    final_cashflows = net_cashflows[1:] + valuations[1:]
+    present_negative = (
+        earlier_negative + np.minimum(final_cashflows, 0) * finance_discount[1:]
+    )
+    future_positive = (
+        earlier_positive + np.maximum(final_cashflows, 0) * reinvestment_discount[1:]
+    ) * (1 + reinvestment_rate) ** months
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mirrs = np.where(
+            (present_negative < 0) & (future_positive > 0),
+            (future_positive / -present_negative) ** (1 / months) - 1,
+            np.nan,
+        )
+
+    return np.round(mirrs, 4)
+
+
+def annual_to_monthly_rate(annual_rate: float) -> float:
+    """
+    Converts an annual rate into the equivalent monthly compounded rate.
+
+    Args:
+        annual_rate (float): The annual rate as a decimal (e.g., 0.1 for 10%).
+    Returns:
+        float: The monthly rate.
+    Raises:
+        ValueError: If the annual rate is not above -100%.
+    """
+    if annual_rate <= -1:
+        raise ValueError(f"Annual rate must be above -1, got {annual_rate}")
+    return (1 + annual_rate) ** (1 / 12) - 1
+
 
 class Account:
     """
@@ -81,7 +327,7 @@ class Account:
     Methods:
         add_cashflow(cashflow_snapshot: CashflowSnapshot):
             Adds a cashflow snapshot and keeps the internal list sorted by date.
-        calculate_irr():
+        calculate_irr(mirr_rates: Optional[MirrRates] = None, solve_irr: bool = True):
             Computes IRR snapshots from the list of sorted cashflows.
     """
 
@@ -101,42 +347,49 @@ class Account:
         self.sorted_cashflow_snapshots.append(cashflow_snapshot)
         self.sorted_cashflow_snapshots = sorted(self.sorted_cashflow_snapshots)
 
-    def calculate_irr(self):
+    def calculate_irr(
+        self, mirr_rates: Optional[MirrRates] = None, solve_irr: bool = True
+    ):
         """
         Calculates the IRR snapshots based on the chronological cashflows.
 
         This method builds a list of periodic cashflows and computes the IRR
-        at each point using NumPy's financial IRR function. The resulting
-        IRR values are stored as IrrSnapshot instances in the `irr_snapshots` list.
+        at each point using NumPy's financial IRR function, together with the
+        time-weighted return of the same months, with columnar.calculate_irr_columns().
+        The resulting values are stored as IrrSnapshot views in the `irr_snapshots`
+        list.
 
         If fewer than two cashflow snapshots exist, a warning is issued.
+
+        Args:
+            mirr_rates (MirrRates, optional): If provided, the modified IRR is also
+                calculated with these rates.
+            solve_irr (bool): Whether to calculate the IRR. It can be disabled when
+                only the MIRR is required, to skip root finding.
         """
         self.irr_snapshots = []
         if len(self.sorted_cashflow_snapshots) < 2:
-            logger.info(f"Not enough values for {self.account_name}")
+            aggregated_logger.log(
+                "not_enough_values", INFO, "Not enough values for %s", self.account_name
+            )
 
         else:
-            periodic_cashflow = [
-                self.sorted_cashflow_snapshots[0].cumulative_outflow
-                - self.sorted_cashflow_snapshots[0].cumulative_inflow
-            ]
-
-            for cashflow in self.sorted_cashflow_snapshots[1:]:
-                periodic_cashflow.append(
-                    cashflow.valuation
-                    + cashflow.cumulative_outflow
-                    - cashflow.cumulative_inflow
-                )
-                self.irr_snapshots.append(
-                    IrrSnapshot(
-                        cashflow.first_day_of_month,
-                        round(npf.irr(periodic_cashflow), 4),
-                        self.account_name,
-                    )
-                )
-                periodic_cashflow[-1] = (
-                    cashflow.cumulative_outflow - cashflow.cumulative_inflow
+            # imported here as the columnar module builds on this one
+            from src.columnar import CashflowColumns, calculate_irr_columns
+
+            irrs = calculate_irr_columns(
+                CashflowColumns.from_snapshots(self.sorted_cashflow_snapshots),
+                mirr_rates,
+                solve_irr,
+            )
+            # keep the dates of the account's own cashflow snapshots
+            self.irr_snapshots = [
+                replace(irr_snapshot, first_day_of_month=cashflow.first_day_of_month)
+                for irr_snapshot, cashflow in zip(
+                    irrs.by_account()[self.account_name],
+                    self.sorted_cashflow_snapshots[1:],
                 )
+            ]
 
     def __eq__(self, other):
         if not isinstance(other, Account):
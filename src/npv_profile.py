@@ -0,0 +1,275 @@
+from dataclasses import dataclass
+import json
+import math
+from typing import Iterator, List, Sequence, Tuple
+import numpy as np
+
+from src import model
+from src.columnar import MISSING_MONTH, CashflowColumns, month_index_to_date
+
+
+REFINE_ITERATIONS = 12
+
+
+@dataclass
+class NpvProfile:
+    """
+    NPV of every account and as-of month over a grid of discount rates, with the real
+    IRR roots found where the NPV changes sign.
+
+    Rows follow the IRR convention of model.Account.calculate_irr(): the NPV as of month
+    k discounts the net cashflows of months 0 to k, plus the valuation of month k.
+
+    Attributes:
+        account_names (Tuple[str, ...]): Distinct account names; position is the account code.
+        account_codes (np.ndarray): int32 account code of every as-of month.
+        months (np.ndarray): int32 month index of every as-of month.
+        rates_annual (np.ndarray): float64 annual discount rates of the grid, ascending.
+        npvs (np.ndarray): float64 NPV of every as-of month (rows) and grid rate (columns).
+        root_rows (np.ndarray): Row of every IRR root, in row and rate order.
+        roots_monthly (np.ndarray): float64 monthly IRR of every root.
+    """
+
+    account_names: Tuple[str, ...]
+    account_codes: np.ndarray
+    months: np.ndarray
+    rates_annual: np.ndarray
+    npvs: np.ndarray
+    root_rows: np.ndarray
+    roots_monthly: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.account_codes)
+
+    def iter_ndjson(self, name_field: str, chunk_rows: int = 4096) -> Iterator[str]:
+        """
+        Serializes the profile as newline delimited JSON, one line per as-of month and
+        grid rate, with the fields first_day_of_month, rate_annual, npv and the account name.
+
+        Args:
+            name_field (str): The name of the field holding the account name.
+            chunk_rows (int): The maximum number of as-of months serialized at once.
+        Yields:
+            str: The lines of up to chunk_rows as-of months.
+        """
+        names = [json.dumps(name) for name in self.account_names]
+        rates = [repr(rate) for rate in self.rates_annual.tolist()]
+        line = (
+            '{"first_day_of_month": "%s", "rate_annual": %s, "npv": %s, '
+            f"{json.dumps(name_field)}: %s}}\n"
+        )
+        for start in range(0, len(self), chunk_rows):
+            rows = slice(start, start + chunk_rows)
+            yield "".join(
+                line % (date, rate, _json_number(npv), names[code])
+                for code, date, npvs in zip(
+                    self.account_codes[rows].tolist(),
+                    _dates(self.months[rows]),
+                    self.npvs[rows].round(2).tolist(),
+                )
+                for rate, npv in zip(rates, npvs)
+            )
+
+    def iter_roots_ndjson(self, name_field: str) -> Iterator[str]:
+        """
+        Serializes the IRR roots as newline delimited JSON, one line per root, with the
+        fields first_day_of_month, root (0 for the lowest root of the month), irr_monthly,
+        irr_annual and the account name.
+
+        Args:
+            name_field (str): The name of the field holding the account name.
+        Yields:
+            str: One line per root.
+        """
+        roots_annual = np.round((1 + self.roots_monthly) ** 12 - 1, 4)
+        previous_row = -1
+        root = 0
+        for row, date, monthly, annual in zip(
+            self.root_rows.tolist(),
+            _dates(self.months[self.root_rows]),
+            np.round(self.roots_monthly, 4).tolist(),
+            roots_annual.tolist(),
+        ):
+            root = root + 1 if row == previous_row else 0
+            previous_row = row
+            yield json.dumps(
+                {
+                    "first_day_of_month": date,
+                    "root": root,
+                    "irr_monthly": monthly,
+                    "irr_annual": annual,
+                    name_field: self.account_names[self.account_codes[row]],
+                }
+            ) + "\n"
+
+
+def _json_number(value: float) -> str:
+    return repr(value) if math.isfinite(value) else "null"
+
+
+def _dates(months: np.ndarray) -> List[str]:
+    return [
+        month_index_to_date(month).strftime("%Y-%m-%d") for month in months.tolist()
+    ]
+
+
+def _account_positions(columns: CashflowColumns) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the row of the first month of the account of every row, and whether every
+    row is the first month of its account, for an extract sorted by account and month.
+    """
+    rows = np.arange(len(columns))
+    account_start = np.ones(len(columns), dtype=bool)
+    account_start[1:] = columns.account_codes[1:] != columns.account_codes[:-1]
+
+    return np.maximum.accumulate(np.where(account_start, rows, 0)), account_start
+
+
+def _refine_roots(
+    columns: CashflowColumns,
+    starts: np.ndarray,
+    as_of_rows: np.ndarray,
+    low: np.ndarray,
+    high: np.ndarray,
+) -> np.ndarray:
+    """
+    Refines roots bracketed by monthly rates [low, high] with the Illinois variant of
+    regula falsi, evaluating the NPV of all brackets at once as sums over the cashflows
+    of their as-of month.
+    """
+    net_cashflows = columns.outflows - columns.inflows
+    lengths = as_of_rows - starts[as_of_rows] + 1
+    bracket = np.repeat(np.arange(len(as_of_rows)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+    cashflows = net_cashflows[starts[as_of_rows][bracket] + offsets]
+    cashflows[np.cumsum(lengths) - 1] += columns.valuations[as_of_rows]
+    offsets = -offsets.astype(np.float64)
+
+    def npv(rates: np.ndarray) -> np.ndarray:
+        discounted = cashflows * np.exp(offsets * np.log1p(rates)[bracket])
+        return np.bincount(bracket, weights=discounted, minlength=len(as_of_rows))
+
+    npv_low, npv_high = npv(low), npv(high)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(REFINE_ITERATIONS):
+            step = npv_high * (high - low) / (npv_high - npv_low)
+            rate = np.where(np.isfinite(step), high - step, high)
+            npv_rate = npv(rate)
+            crossed = np.sign(npv_rate) != np.sign(npv_high)
+            # keep the bracket around the root; halve the stale end to avoid stalling
+            low, npv_low = (
+                np.where(crossed, high, low),
+                np.where(crossed, npv_high, npv_low / 2),
+            )
+            high, npv_high = rate, npv_rate
+
+    return high
+
+
+def calculate_npv_profile(
+    columns: CashflowColumns, rates_annual: Sequence[float]
+) -> NpvProfile:
+    """
+    Calculates the NPV of every account and as-of month over a grid of annual discount
+    rates, and every real IRR root within the grid.
+
+    The NPVs are evaluated for all rows and rates as one batched matrix operation: the
+    net cashflows are discounted at every rate by their position within the account and
+    accumulated with a prefix sum that restarts at every account. A root lies between
+    two consecutive rates where the NPV changes sign, or on a rate where it is zero, so
+    NPV curves with several sign changes report several IRRs. Roots are then refined by
+    regula falsi. Roots where the curve touches zero without crossing it are not reported.
+    Rows whose month is missing cannot be discounted and are left out. A non-finite
+    cashflow makes the NPVs of its account undefined from its month on, without
+    affecting the other accounts.
+
+    Args:
+        columns (CashflowColumns): The cashflow extract, sorted by account and month.
+        rates_annual (Sequence[float]): The annual discount rates of the grid.
+    Returns:
+        NpvProfile: The profile of every month but the first of every account.
+    """
+    columns = columns.take(columns.months != MISSING_MONTH)
+    rates_annual = np.unique(np.asarray(rates_annual, dtype=np.float64))
+    rates_monthly = np.array([model.annual_to_monthly_rate(r) for r in rates_annual])
+    starts, account_start = _account_positions(columns)
+    positions = (np.arange(len(columns)) - starts).astype(np.float64)
+    net_cashflows = columns.outflows - columns.inflows
+    # an undefined cashflow is left out of the prefix sum so that it does not spill over
+    # the following accounts; the months of its account from then on are undefined
+    defined = np.isfinite(net_cashflows)
+    undefined_before = np.cumsum(~defined)
+    undefined = undefined_before > np.concatenate(([0], undefined_before))[starts]
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        discount = (1 + rates_monthly[None, :]) ** -positions[:, None]
+        prefix = np.cumsum(
+            np.where(defined, net_cashflows, 0.0)[:, None] * discount, axis=0
+        )
+        # restart the prefix sum at every account: remove the sums before its first row
+        before_account = np.vstack((np.zeros((1, len(rates_monthly))), prefix))[starts]
+        npvs = prefix - before_account + columns.valuations[:, None] * discount
+    npvs[undefined] = np.nan
+
+    as_of = ~account_start
+    npvs = npvs[as_of]
+    as_of_rows = np.flatnonzero(as_of)
+
+    signs = np.sign(npvs)
+    crossing_rows, crossing_rates = np.nonzero(signs[:, :-1] * signs[:, 1:] < 0)
+    zero_rows, zero_rates = np.nonzero(signs == 0)
+    refined = _refine_roots(
+        columns,
+        starts,
+        as_of_rows[crossing_rows],
+        rates_monthly[crossing_rates],
+        rates_monthly[crossing_rates + 1],
+    )
+    root_rows = np.concatenate((crossing_rows, zero_rows))
+    roots = np.concatenate((refined, rates_monthly[zero_rates]))
+    order = np.lexsort((roots, root_rows))
+
+    return NpvProfile(
+        account_names=columns.account_names,
+        account_codes=columns.account_codes[as_of],
+        months=columns.months[as_of],
+        rates_annual=rates_annual,
+        npvs=npvs,
+        root_rows=root_rows[order],
+        roots_monthly=roots[order],
+    )
+
+
+def iter_npv_profiles(
+    columns: CashflowColumns,
+    rates_annual: Sequence[float],
+    max_cells: int = 1 << 22,
+) -> Iterator[NpvProfile]:
+    """
+    Calculates the NPV profiles of an extract in batches of whole accounts, so that the
+    NPV matrix of a batch has about `max_cells` values at most.
+
+    Args:
+        columns (CashflowColumns): The cashflow extract, sorted by account and month.
+        rates_annual (Sequence[float]): The annual discount rates of the grid.
+        max_cells (int): Approximate maximum number of NPVs calculated at once. An
+            account with more is calculated alone.
+    Yields:
+        NpvProfile: The profile of every batch of accounts, in extract order.
+    """
+    max_rows = max(1, max_cells // max(1, len(rates_annual)))
+    _, account_start = _account_positions(columns)
+    boundaries = np.append(np.flatnonzero(account_start), len(columns))
+    batch_start = 0
+    for start, end in zip(boundaries[:-1].tolist(), boundaries[1:].tolist()):
+        if start > batch_start and end - batch_start > max_rows:
+            yield calculate_npv_profile(
+                columns.take(slice(batch_start, start)), rates_annual
+            )
+            batch_start = start
+    if batch_start < len(columns):
+        yield calculate_npv_profile(
+            columns.take(slice(batch_start, None)), rates_annual
+        )
@@ -1,29 +1,249 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass
+import hashlib
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
 from src.destination_repository import AbstractDestinationRepository
 from src.source_repository import AbstractSourceRepository
-from src import model
+from src import model, validation, aggregation, external_grouping
+from src.columnar import calculate_irr_columns
+from src.utils.logs import default_module_logger, flush_aggregated_logs
+from src.utils.profiling import StageRecorder
+
+
+logger = default_module_logger(__file__)
 
 
 def irr_pipeline(
     source_repository: AbstractSourceRepository,
     destination_repository: AbstractDestinationRepository,
+    validation_mode: str = validation.REPORT,
+    check_monotonic: bool = False,
+    group_mapping: Optional[aggregation.GroupMapping] = None,
+    memory_budget: Optional[int] = None,
+    spill_dir: Optional[str] = None,
+    stage_recorder: Optional[StageRecorder] = None,
+    mirr_rates: Optional[model.MirrRates] = None,
+    solve_irr: bool = True,
 ):
     """
     Executes the Internal Rate of Return (IRR) data pipeline.
-    This pipeline retrieves cashflow snapshots from the source repository,
-    processes them to create account collections, allocates cashflows to accounts,
-    calculates IRRs for each account, and loads the resulting IRR data into the destination repository.
+    This pipeline retrieves cashflow snapshots from the source repository, validates them,
+    calculates IRRs for each account into columnar results (see columnar.IrrColumns),
+    and loads the resulting IRR data into the destination repository.
+    If a group mapping is provided, IRRs of the groups of accounts are also calculated and loaded.
+
+    By default the whole extract is held in memory. When a memory budget is given, the
+    source is streamed and grouped by account through local disk instead (see
+    external_grouping.group_by_account()), and accounts are processed in batches whose
+    results are passed to the destination as they are calculated (see
+    AbstractDestinationRepository.irr_columns_loader()).
+
+    Args:
+        source_repository (AbstractSourceRepository): The repository used to retrieve cashflow snapshots.
+        destination_repository (AbstractDestinationRepository): The repository used to store calculated IRR data.
+        validation_mode (str): How flagged cashflows are handled: "report" (default), "fill"
+            or "quarantine". See validation.validate_cashflows().
+        check_monotonic (bool): Whether to also flag decreasing inflow or outflow.
+        group_mapping (Dict[str, Union[str, Iterable[str]]], optional):
+            Group name, or group names, of every account name.
+        memory_budget (int, optional): Approximate bytes of cashflows held in memory.
+        spill_dir (str, optional): Local directory used to spill cashflows to disk.
+        stage_recorder (StageRecorder, optional): Records the resources used by every
+            stage of the pipeline: fetch, validate, compute, aggregate and load.
+        mirr_rates (model.MirrRates, optional): Finance and reinvestment rates of the
+            modified IRR. When provided, the MIRR is calculated and loaded next to the IRR.
+        solve_irr (bool): Whether to calculate the IRR. Set it to False together with
+            mirr_rates to load the MIRR instead of the IRR and skip root finding.
+    """
+    recorder = stage_recorder if stage_recorder is not None else StageRecorder()
+    with recorder.stage("fetch"):
+        if memory_budget is None:
+            extracts = iter([source_repository.get_cashflow_columns()])
+        else:
+            extracts = external_grouping.group_by_account(
+                source_repository.iter_cashflow_snapshots(), memory_budget, spill_dir
+            )
+
+    reports = []
+    group_cashflows = []
+    with ExitStack() as loader:
+        load_batch = loader.enter_context(destination_repository.irr_columns_loader())
+        while True:
+            with recorder.stage("fetch"):
+                extract = next(extracts, None)
+            if extract is None:
+                break
+            with recorder.stage("validate"):
+                columns, report = validation.validate_cashflows(
+                    extract, mode=validation_mode, check_monotonic=check_monotonic
+                )
+                reports.append(report)
+            with recorder.stage("compute"):
+                irrs = calculate_irr_columns(columns, mirr_rates, solve_irr)
+            with recorder.stage("load"):
+                load_batch(irrs)
+            if group_mapping is not None:
+                with recorder.stage("aggregate"):
+                    group_cashflows.append(
+                        aggregation.aggregate_cashflows_by_group(columns, group_mapping)
+                    )
+
+        report = validation.combine_reports(reports)
+        if not report.is_clean:
+            logger.warning(report.summary())
+
+        with recorder.stage("load"):
+            loader.close()
+
+    if group_mapping is not None:
+        with recorder.stage("aggregate"):
+            group_irrs = calculate_irr_columns(
+                aggregation.merge_aggregated_cashflows(group_cashflows),
+                mirr_rates,
+                solve_irr,
+            )
+        with recorder.stage("load"):
+            destination_repository.load_group_irr_columns(group_irrs)
+    flush_aggregated_logs()
+
+
+# irr_pipeline() arguments that do not change its results
+EXECUTION_OPTIONS = ("memory_budget", "spill_dir", "stage_recorder")
+# to be increased by every change of the pipeline results, so that runs recorded by
+# previous versions no longer match
+PIPELINE_VERSION = 1
+
+
+def _run_digest(fingerprint: Optional[str], options: str) -> Optional[str]:
+    if fingerprint is None:
+        return None
+    digest = hashlib.sha256(f"{PIPELINE_VERSION}\n{options}\n{fingerprint}".encode())
+    return digest.hexdigest()[:32]
+
+
+def deduplicated_irr_pipeline(
+    source_repository: AbstractSourceRepository,
+    destination_repository: AbstractDestinationRepository,
+    lock_ttl: float = 3600,
+    **pipeline_options: Any,
+) -> bool:
+    """
+    Executes the IRR pipeline unless the source data is unchanged since the last
+    successful run with the same options, or another run is loading at the same time.
+
+    The check is made in two steps, the second only if the first is inconclusive: the
+    source fingerprint, usually read from metadata in milliseconds, and the source
+    checksum, which also detects the same data being written again. Both are recorded,
+    combined with the pipeline version and options, by the destination after a
+    successful run, and cleared by every load of IRRs into it, including those of other
+    runs. Concurrent runs are excluded with the destination run lock.
 
     Args:
         source_repository (AbstractSourceRepository): The repository used to retrieve cashflow snapshots.
         destination_repository (AbstractDestinationRepository): The repository used to store calculated IRR data.
+        lock_ttl (float): Seconds after which the lock of a run is considered stale.
+        **pipeline_options: Further arguments of irr_pipeline().
+    Returns:
+        bool: Whether the pipeline was executed.
+    """
+    with destination_repository.run_lock(lock_ttl) as acquired:
+        if not acquired:
+            logger.info("Skipping IRR pipeline: another run is in progress")
+            return False
+
+        options = json.dumps(
+            {
+                "include_sensitivities": getattr(
+                    destination_repository, "include_sensitivities", False
+                ),
+                **{
+                    key: value
+                    for key, value in pipeline_options.items()
+                    if key not in EXECUTION_OPTIONS
+                },
+            },
+            sort_keys=True,
+            default=repr,
+        )
+        recorded = destination_repository.get_run_fingerprints()
+        fingerprints = {
+            "fingerprint": _run_digest(source_repository.get_fingerprint(), options)
+        }
+        if fingerprints["fingerprint"] is not None and (
+            recorded.get("fingerprint") == fingerprints["fingerprint"]
+        ):
+            logger.info("Skipping IRR pipeline: source fingerprint unchanged")
+            return False
+
+        fingerprints["checksum"] = _run_digest(
+            source_repository.get_checksum(), options
+        )
+        if fingerprints["checksum"] is not None and (
+            recorded.get("checksum") == fingerprints["checksum"]
+        ):
+            destination_repository.record_run_fingerprints(fingerprints)
+            logger.info("Skipping IRR pipeline: source checksum unchanged")
+            return False
+
+        irr_pipeline(source_repository, destination_repository, **pipeline_options)
+        destination_repository.record_run_fingerprints(fingerprints)
+        return True
+
+
+@dataclass
+class PipelineRun:
+    """
+    Outcome of one of the pipelines run by run_pipelines().
+
+    Attributes:
+        name (str): The name of the pipeline.
+        seconds (float): Wall time of the pipeline.
+        error (Exception, optional): The exception raised by the pipeline, if it failed.
+    """
+
+    name: str
+    seconds: float
+    error: Optional[Exception] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.error is None
+
+
+def run_pipelines(
+    pipelines: Dict[str, Callable[[], None]], max_workers: int = 4
+) -> List[PipelineRun]:
+    """
+    Runs several independent pipelines concurrently on a bounded pool of threads.
+
+    Pipelines mostly wait on the source and the destination, so running them in threads
+    brings the total wall time close to that of the slowest one. A failing pipeline is
+    logged and reported without interrupting the others.
+
+    Args:
+        pipelines (Dict[str, Callable[[], None]]): The pipelines to run, keyed by name.
+        max_workers (int): Maximum number of pipelines running at the same time.
+    Returns:
+        List[PipelineRun]: The outcome of every pipeline, in input order.
     """
-    cashflow_snapshots = source_repository.get_cashflow_snapshots()
-    accounts = model.account_collection_creation(cashflow_snapshots)
-    accounts = model.allocate_cashflow_snapshots_to_accounts(
-        cashflow_snapshots, accounts
-    )
 
-    for account in accounts.values():
-        account.calculate_irr()
+    def run(name: str, pipeline: Callable[[], None]) -> PipelineRun:
+        start = time.perf_counter()
+        try:
+            pipeline()
+        except Exception as error:
+            logger.exception(f"Pipeline {name} failed")
+            return PipelineRun(name, time.perf_counter() - start, error)
+        seconds = time.perf_counter() - start
+        logger.info(f"Pipeline {name} completed in {seconds:.1f}s")
+        return PipelineRun(name, seconds)
 
-    destination_repository.load_irrs(accounts)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(run, name, pipeline) for name, pipeline in pipelines.items()
+        ]
+        return [future.result() for future in futures]
@@ -1,9 +1,23 @@
 from abc import ABC, abstractmethod
-from typing import List
+import datetime as dt
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import zlib
+from typing import Iterator, List, Optional
+import numpy as np
 from google.cloud import bigquery
 from google.cloud.bigquery.table import RowIterator
 
 from src import model
+from src.columnar import CashflowColumns
+from src.utils.logs import default_module_logger
+
+
+logger = default_module_logger(__file__)
 
 
 class AbstractSourceRepository(ABC):
@@ -15,6 +29,14 @@ class AbstractSourceRepository(ABC):
     Methods:
         get_cashflow_snapshots(self) -> List[model.CashflowSnapshot]:
             Abstract method for retrieving cashflow snapshots from the repository.
+        get_cashflow_columns(self) -> CashflowColumns:
+            Retrieves the cashflow snapshots from the repository in columnar form.
+        iter_cashflow_snapshots(self) -> Iterator[model.CashflowSnapshot]:
+            Iterates over the cashflow snapshots, in no particular order.
+        get_fingerprint(self) -> Optional[str]:
+            Returns a cheap identifier of the current state of the source data, if any.
+        get_checksum(self) -> Optional[str]:
+            Returns a checksum of the content of the source data, if any.
     """
 
     @abstractmethod
@@ -29,6 +51,46 @@ class AbstractSourceRepository(ABC):
         """
         raise NotImplementedError
 
+    def get_cashflow_columns(self) -> CashflowColumns:
+        """
+        Retrieves the cashflow snapshots from the repository in columnar form.
+
+        Returns:
+            CashflowColumns: The cashflow snapshots, one row per snapshot.
+        """
+        return CashflowColumns.from_snapshots(self.get_cashflow_snapshots())
+
+    def iter_cashflow_snapshots(self) -> Iterator[model.CashflowSnapshot]:
+        """
+        Iterates over the cashflow snapshots, in no particular order. Sources able to
+        stream their data override it so that the whole extract is never held in memory.
+
+        Returns:
+            Iterator[model.CashflowSnapshot]: An iterator over the cashflow snapshots.
+        """
+        return iter(self.get_cashflow_snapshots())
+
+    def get_fingerprint(self) -> Optional[str]:
+        """
+        Returns a cheap identifier of the current state of the source data, that changes
+        whenever the data changes. Sources unable to provide it return None.
+
+        Returns:
+            Optional[str]: The fingerprint of the source data, or None.
+        """
+        return None
+
+    def get_checksum(self) -> Optional[str]:
+        """
+        Returns a checksum of the content of the source data. Unlike the fingerprint,
+        it does not change when the same data is written again, but it is more expensive
+        to obtain. Sources unable to provide it return None.
+
+        Returns:
+            Optional[str]: The checksum of the source data, or None.
+        """
+        return None
+
 
 class BigQuerySourceRepository(AbstractSourceRepository):
     """
@@ -40,18 +102,26 @@ class BigQuerySourceRepository(AbstractSourceRepository):
         client (bigquery.Client): The BigQuery client used to execute queries.
     Attributes:
         client (bigquery.Client): The BigQuery client used to execute queries.
+        cashflow_table (str): The staging table holding the cashflows.
         cashflow_source (str): SQL query string to select all cashflows from the staging table.
     Methods:
         get(query: str) -> RowIterator:
             Executes a SQL query on BigQuery and returns the result iterator.
+        iter_cashflow_snapshots() -> Iterator[model.CashflowSnapshot]:
+            Streams the cashflow snapshots from the BigQuery source.
         get_cashflow_snapshots() -> List[model.CashflowSnapshot]:
             Retrieves all cashflow snapshots from the BigQuery source and returns them
             as a list of CashflowSnapshot objects.
+        get_fingerprint() -> str:
+            Returns the row count and last modification time of the cashflow table.
+        get_checksum() -> str:
+            Returns a checksum combining the checksum of the cashflows of every account.
     """
 
     def __init__(self, client: bigquery.Client):
         self.client = client
-        self.cashflow_source = "SELECT * FROM tier2_staging.cashflows"
+        self.cashflow_table = "tier2_staging.cashflows"
+        self.cashflow_source = f"SELECT * FROM {self.cashflow_table}"
 
     def get(self, query: str) -> RowIterator:
         """
@@ -66,6 +136,23 @@ class BigQuerySourceRepository(AbstractSourceRepository):
 
         return query_job.result()
 
+    def iter_cashflow_snapshots(self) -> Iterator[model.CashflowSnapshot]:
+        """
+        Iterates over the rows obtained from the cashflow source, page by page,
+        yielding a `model.CashflowSnapshot` for each of them.
+
+        Returns:
+            Iterator[model.CashflowSnapshot]: An iterator over the cashflow snapshots.
+        """
+        for row in self.get(self.cashflow_source):
+            yield model.CashflowSnapshot(
+                first_day_of_month=row.first_day_of_month,
+                cumulative_inflow=row.inflow,
+                cumulative_outflow=row.outflow,
+                valuation=row.value,
+                account_name=row.entity_name,
+            )
+
     def get_cashflow_snapshots(self) -> List[model.CashflowSnapshot]:
         """
         Retrieves a list of cashflow snapshot objects from the cashflow source.
@@ -79,16 +166,386 @@ class BigQuerySourceRepository(AbstractSourceRepository):
                 A list of cashflow snapshot objects containing date, inflow, outflow,
                 value, and entity name information.
         """
-        cashflow_snapshots = []
-        for row in self.get(self.cashflow_source):
-            cashflow_snapshots.append(
-                model.CashflowSnapshot(
-                    first_day_of_month=row.first_day_of_month,
-                    cumulative_inflow=row.inflow,
-                    cumulative_outflow=row.outflow,
-                    valuation=row.value,
-                    account_name=row.entity_name,
+        return list(self.iter_cashflow_snapshots())
+
+    def get_fingerprint(self) -> str:
+        """
+        Returns the row count and last modification time of the cashflow table, read
+        from the table metadata without running any query.
+
+        Returns:
+            str: The fingerprint of the cashflow table.
+        """
+        table = self.client.get_table(self.cashflow_table)
+
+        return f"{table.num_rows}:{table.modified.isoformat()}"
+
+    def get_checksum(self) -> str:
+        """
+        Returns a checksum of the cashflow table content. Every account checksum is
+        computed by BigQuery as the number of its rows and the sum of their
+        fingerprints, so only one row per account is transferred, and they are combined
+        in account order. Unlike a XOR, the sum does not cancel out duplicated rows; it
+        is taken as BIGNUMERIC so that it cannot overflow.
+
+        Returns:
+            str: The checksum of the cashflow table.
+        """
+        rows = self.get(
+            "SELECT entity_name, COUNT(*) AS row_count, SUM(CAST("
+            "FARM_FINGERPRINT(TO_JSON_STRING(cashflow)) AS BIGNUMERIC)) AS checksum"
+            f" FROM {self.cashflow_table} AS cashflow GROUP BY entity_name"
+        )
+        digest = hashlib.sha256()
+        for entity_name, row_count, checksum in sorted(
+            (row["entity_name"], row["row_count"], row["checksum"]) for row in rows
+        ):
+            digest.update(f"{entity_name}:{row_count}:{checksum}\n".encode())
+
+        return digest.hexdigest()
+
+
+class FileSourceRepository(AbstractSourceRepository):
+    """
+    Repository for reading cashflow data from a newline delimited JSON file, such as
+    an export of the BigQuery cashflow table. Every line holds the fields
+    `first_day_of_month` (YYYY-MM-DD), `inflow`, `outflow`, `value` and `entity_name`.
+
+    Args:
+        path (str): The path of the file.
+    Attributes:
+        path (str): The path of the file.
+    Methods:
+        iter_cashflow_snapshots() -> Iterator[model.CashflowSnapshot]:
+            Streams the cashflow snapshots from the file, line by line.
+        get_cashflow_snapshots() -> List[model.CashflowSnapshot]:
+            Retrieves all cashflow snapshots from the file.
+        get_fingerprint() -> str:
+            Returns the size and last modification time of the file.
+        get_checksum() -> str:
+            Returns the CRC32 checksum of the file content.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def iter_cashflow_snapshots(self) -> Iterator[model.CashflowSnapshot]:
+        """
+        Streams the cashflow snapshots from the file, line by line.
+
+        Returns:
+            Iterator[model.CashflowSnapshot]: An iterator over the cashflow snapshots.
+        """
+        with open(self.path) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                first_day_of_month = row.get("first_day_of_month")
+                yield model.CashflowSnapshot(
+                    first_day_of_month=(
+                        None
+                        if first_day_of_month is None
+                        else dt.date.fromisoformat(first_day_of_month)
+                    ),
+                    cumulative_inflow=row.get("inflow"),
+                    cumulative_outflow=row.get("outflow"),
+                    valuation=row.get("value"),
+                    account_name=row["entity_name"],
                 )
+
+    def get_cashflow_snapshots(self) -> List[model.CashflowSnapshot]:
+        """
+        Retrieves all cashflow snapshots from the file.
+
+        Returns:
+            List[model.CashflowSnapshot]: The cashflow snapshots, in file order.
+        """
+        return list(self.iter_cashflow_snapshots())
+
+    def get_fingerprint(self) -> str:
+        """
+        Returns the size and last modification time of the file.
+
+        Returns:
+            str: The fingerprint of the file.
+        """
+        stat = os.stat(self.path)
+
+        return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+    def get_checksum(self) -> str:
+        """
+        Returns the CRC32 checksum of the file content, read in blocks.
+
+        Returns:
+            str: The checksum of the file.
+        """
+        checksum = 0
+        with open(self.path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                checksum = zlib.crc32(block, checksum)
+
+        return f"{checksum:08x}"
+
+
+class SyntheticSourceRepository(AbstractSourceRepository):
+    """
+    Repository generating reproducible random cashflow data, meant for profiling and
+    benchmarking the pipeline without access to real data.
+
+    Every account receives an initial inflow in its first month, followed by random
+    monthly inflows and outflows while its valuation follows a random walk. Rows are
+    returned shuffled, as a source without ORDER BY would.
+
+    Args:
+        accounts (int): Number of accounts to generate.
+        months (int): Number of months of every account.
+        seed (int): Seed of the random generator.
+    Attributes:
+        accounts (int): Number of accounts to generate.
+        months (int): Number of months of every account.
+        seed (int): Seed of the random generator.
+    Methods:
+        get_cashflow_columns() -> CashflowColumns:
+            Generates the cashflow data in columnar form.
+        get_cashflow_snapshots() -> List[model.CashflowSnapshot]:
+            Generates the cashflow data as CashflowSnapshot objects.
+    """
+
+    FIRST_MONTH = 2000 * 12
+
+    def __init__(self, accounts: int = 1000, months: int = 120, seed: int = 0):
+        self.accounts = accounts
+        self.months = months
+        self.seed = seed
+
+    def get_cashflow_columns(self) -> CashflowColumns:
+        """
+        Generates the cashflow data in columnar form.
+
+        Returns:
+            CashflowColumns: The generated cashflow extract, rows shuffled.
+        """
+        generator = np.random.default_rng(self.seed)
+        shape = (self.accounts, self.months)
+        inflows = np.where(
+            generator.random(shape) < 0.2, generator.gamma(2, 100, shape), 0
+        )
+        outflows = np.where(
+            generator.random(shape) < 0.1, generator.gamma(2, 50, shape), 0
+        )
+        inflows[:, 0] = generator.gamma(5, 1000, self.accounts)
+        outflows[:, 0] = 0
+        returns = generator.normal(0.005, 0.04, shape)
+        valuations = np.zeros(shape)
+        valuations[:, 0] = inflows[:, 0]
+        for month in range(1, self.months):
+            valuations[:, month] = np.maximum(
+                valuations[:, month - 1] * (1 + returns[:, month])
+                + inflows[:, month]
+                - outflows[:, month],
+                0,
             )
+        order = generator.permutation(self.accounts * self.months)
+
+        return CashflowColumns(
+            account_names=tuple(f"Account {code}" for code in range(self.accounts)),
+            account_codes=np.repeat(
+                np.arange(self.accounts, dtype=np.int32), self.months
+            )[order],
+            months=np.tile(
+                np.arange(self.months, dtype=np.int32) + self.FIRST_MONTH, self.accounts
+            )[order],
+            inflows=np.round(inflows, 2).ravel()[order],
+            outflows=np.round(outflows, 2).ravel()[order],
+            valuations=np.round(valuations, 2).ravel()[order],
+        )
+
+    def get_cashflow_snapshots(self) -> List[model.CashflowSnapshot]:
+        """
+        Generates the cashflow data as CashflowSnapshot objects.
+
+        Returns:
+            List[model.CashflowSnapshot]: The generated cashflow snapshots, shuffled.
+        """
+        return self.get_cashflow_columns().to_snapshots()
+
+
+class CachedSourceRepository(AbstractSourceRepository):
+    """
+    Repository that wraps another source repository and keeps a local copy of its
+    extract, so that later runs read it from disk instead of the wrapped source.
+
+    The extract is stored as one NumPy file per column, which is compact and can be
+    memory mapped, in the `cashflows` subdirectory of the cache directory. Only that
+    subdirectory is ever replaced, so the cache directory may hold other files. The copy is served while it is younger than `ttl` seconds or, once
+    expired, while the fingerprint of the wrapped source is unchanged.
+
+    Args:
+        source_repository (AbstractSourceRepository): The repository to cache.
+        cache_dir (str): The local directory where the extract is stored.
+        ttl (float): Seconds during which the copy is served without any check.
+    Attributes:
+        source_repository (AbstractSourceRepository): The repository to cache.
+        cache_dir (str): The local directory where the extract is stored.
+        extract_dir (str): The subdirectory of cache_dir holding the extract files.
+        ttl (float): Seconds during which the copy is served without any check.
+        hits (int): Number of extracts served from the cache, across runs.
+        misses (int): Number of extracts read from the wrapped source, across runs.
+        cache_age (float): Age in seconds of the last extract served.
+    Methods:
+        get_cashflow_columns() -> CashflowColumns:
+            Returns the extract in columnar form, from the cache when valid.
+        get_cashflow_snapshots() -> List[model.CashflowSnapshot]:
+            Returns the extract as CashflowSnapshot objects, from the cache when valid.
+        iter_cashflow_snapshots() -> Iterator[model.CashflowSnapshot]:
+            Iterates over the extract in batches read from the memory mapped columns.
+        get_fingerprint() -> Optional[str]:
+            Returns the fingerprint of the wrapped source.
+        get_checksum() -> Optional[str]:
+            Returns the checksum of the wrapped source.
+    """
+
+    COLUMNS = ("account_codes", "months", "inflows", "outflows", "valuations")
+    EXTRACT_DIR = "cashflows"
+    METADATA_FILE = "metadata.json"
+    BATCH_ROWS = 65536
+
+    def __init__(
+        self,
+        source_repository: AbstractSourceRepository,
+        cache_dir: str,
+        ttl: float = 3600,
+    ):
+        self.source_repository = source_repository
+        self.cache_dir = cache_dir
+        self.extract_dir = os.path.join(cache_dir, self.EXTRACT_DIR)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.cache_age = 0.0
 
-        return cashflow_snapshots
+    @property
+    def hit_rate(self) -> float:
+        """
+        Share of the extracts served from the cache, across runs.
+
+        Returns:
+            float: The hit rate, 0 when nothing has been served yet.
+        """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _read_metadata(self) -> Optional[dict]:
+        try:
+            with open(os.path.join(self.extract_dir, self.METADATA_FILE)) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_metadata(self, metadata: dict, directory: str):
+        with open(os.path.join(directory, self.METADATA_FILE), "w") as file:
+            json.dump(metadata, file)
+
+    def _store(self, columns: CashflowColumns, metadata: dict):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        staging_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        for name in self.COLUMNS:
+            np.save(os.path.join(staging_dir, f"{name}.npy"), getattr(columns, name))
+        metadata["account_names"] = list(columns.account_names)
+        self._write_metadata(metadata, staging_dir)
+        shutil.rmtree(self.extract_dir, ignore_errors=True)
+        os.replace(staging_dir, self.extract_dir)
+
+    def _load(self, metadata: dict) -> CashflowColumns:
+        arrays = {
+            name: np.load(os.path.join(self.extract_dir, f"{name}.npy"), mmap_mode="r")
+            for name in self.COLUMNS
+        }
+        return CashflowColumns(account_names=tuple(metadata["account_names"]), **arrays)
+
+    def get_cashflow_columns(self) -> CashflowColumns:
+        """
+        Returns the extract in columnar form. It is read from the cache when valid,
+        otherwise from the wrapped source, in which case the cache is refreshed.
+
+        Returns:
+            CashflowColumns: The cashflow extract.
+        """
+        now = time.time()
+        metadata = self._read_metadata()
+        fingerprint = None
+        hit = metadata is not None and now - metadata["created_at"] <= self.ttl
+        if metadata is not None:
+            self.hits, self.misses = metadata["hits"], metadata["misses"]
+            if not hit:
+                fingerprint = self.source_repository.get_fingerprint()
+                hit = fingerprint is not None and fingerprint == metadata["fingerprint"]
+
+        if hit:
+            self.hits += 1
+            metadata["hits"] = self.hits
+            self._write_metadata(metadata, self.extract_dir)
+            columns = self._load(metadata)
+            self.cache_age = now - metadata["created_at"]
+        else:
+            self.misses += 1
+            if fingerprint is None:
+                fingerprint = self.source_repository.get_fingerprint()
+            metadata = {
+                "created_at": now,
+                "fingerprint": fingerprint,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+            self._store(self.source_repository.get_cashflow_columns(), metadata)
+            columns = self._load(metadata)
+            self.cache_age = 0.0
+
+        logger.info(
+            f"Cashflow cache {'hit' if hit else 'miss'}: age {self.cache_age:.0f}s,"
+            f" hit rate {self.hit_rate:.0%}"
+        )
+        return columns
+
+    def get_cashflow_snapshots(self) -> List[model.CashflowSnapshot]:
+        """
+        Returns the extract as CashflowSnapshot objects, from the cache when valid.
+
+        Returns:
+            List[model.CashflowSnapshot]: The cashflow snapshots.
+        """
+        return self.get_cashflow_columns().to_snapshots()
+
+    def iter_cashflow_snapshots(self) -> Iterator[model.CashflowSnapshot]:
+        """
+        Iterates over the cashflow snapshots, from the cache when valid. The columns are
+        memory mapped and converted to snapshots `BATCH_ROWS` rows at a time, so that
+        only one batch of snapshot objects is held in memory.
+
+        Returns:
+            Iterator[model.CashflowSnapshot]: An iterator over the cashflow snapshots.
+        """
+        columns = self.get_cashflow_columns()
+        for start in range(0, len(columns), self.BATCH_ROWS):
+            batch = columns.take(slice(start, start + self.BATCH_ROWS))
+            yield from batch.to_snapshots()
+
+    def get_fingerprint(self) -> Optional[str]:
+        """
+        Returns the fingerprint of the wrapped source.
+
+        Returns:
+            Optional[str]: The fingerprint of the wrapped source data, or None.
+        """
+        return self.source_repository.get_fingerprint()
+
+    def get_checksum(self) -> Optional[str]:
+        """
+        Returns the checksum of the wrapped source.
+
+        Returns:
+            Optional[str]: The checksum of the wrapped source data, or None.
+        """
+        return self.source_repository.get_checksum()
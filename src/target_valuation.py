@@ -0,0 +1,138 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import math
+import numpy as np
+
+from src import model
+from src.columnar import CashflowColumns, month_index_to_date
+
+
+@dataclass
+class TargetValuations:
+    """
+    Column-oriented valuations required for every account and month to reach a target
+    IRR, aligned with the rows of the cashflow extract they were calculated from.
+
+    Attributes:
+        target_irr_annual (float): The target annual IRR.
+        account_names (Tuple[str, ...]): Distinct account names; position is the account code.
+        account_codes (np.ndarray): int32 account code of every row.
+        months (np.ndarray): int32 month index of every row.
+        valuations (np.ndarray): float64 actual valuation of every row.
+        required_valuations (np.ndarray): float64 valuation required to reach the target.
+    Properties:
+        valuation_shortfalls (np.ndarray): Required minus actual valuation, i.e. the extra
+            value (a gain or a contribution that is not cashed out) the account needs at
+            that month. Negative when the account is above the target.
+    """
+
+    target_irr_annual: float
+    account_names: Tuple[str, ...]
+    account_codes: np.ndarray
+    months: np.ndarray
+    valuations: np.ndarray
+    required_valuations: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.account_codes)
+
+    @property
+    def valuation_shortfalls(self) -> np.ndarray:
+        return self.required_valuations - self.valuations
+
+    def to_rows(self, name_field: str = "entity_name") -> List[Dict]:
+        """
+        Builds JSON-like rows, rounding amounts to cents and writing undefined ones as
+        null, like the first day of rows whose month is missing.
+
+        Args:
+            name_field (str): The name of the field holding the account name.
+        Returns:
+            List[Dict]: One dictionary per account and month.
+        """
+
+        def amounts(values: np.ndarray) -> List:
+            return [
+                round(value, 2) if math.isfinite(value) else None
+                for value in values.tolist()
+            ]
+
+        def date(month: int) -> Optional[str]:
+            first_day_of_month = month_index_to_date(month)
+            if first_day_of_month is None:
+                return None
+            return first_day_of_month.strftime("%Y-%m-%d")
+
+        return [
+            {
+                "first_day_of_month": date(month),
+                "target_irr_annual": self.target_irr_annual,
+                "valuation": valuation,
+                "required_valuation": required,
+                "valuation_shortfall": shortfall,
+                name_field: self.account_names[code],
+            }
+            for code, month, valuation, required, shortfall in zip(
+                self.account_codes.tolist(),
+                self.months.tolist(),
+                amounts(self.valuations),
+                amounts(self.required_valuations),
+                amounts(self.valuation_shortfalls),
+            )
+        ]
+
+
+def calculate_target_valuations(
+    columns: CashflowColumns, target_irr_annual: float
+) -> TargetValuations:
+    """
+    Calculates the valuation every account requires at every month to reach a target
+    annual IRR, with the same periodic cashflows as model.Account.calculate_irr().
+
+    The NPV at a fixed rate r is linear in the valuation of month k, so the required
+    valuation is a discounted prefix sum:
+    V_k = -(1 + r)^k * sum_{t <= k} net_cashflow_t / (1 + r)^t.
+    All accounts are solved in a single vectorized pass: the net cashflows are
+    discounted by their position within the account, summed with a prefix sum that
+    restarts at every account, and compounded back to their month. A non-finite
+    cashflow, left in by the "report" validation mode, makes the required valuations of
+    its account undefined from its month on, without affecting the other accounts.
+
+    Args:
+        columns (CashflowColumns): The cashflow extract, sorted by account and month.
+        target_irr_annual (float): The target annual IRR (e.g., 0.08 for 8%).
+    Returns:
+        TargetValuations: The valuations required at every month but the first of every
+            account, in extract order.
+    """
+    monthly_rate = model.annual_to_monthly_rate(target_irr_annual)
+    rows = np.arange(len(columns))
+    account_start = np.ones(len(columns), dtype=bool)
+    account_start[1:] = columns.account_codes[1:] != columns.account_codes[:-1]
+    starts = np.maximum.accumulate(np.where(account_start, rows, 0))
+    growth = (1 + monthly_rate) ** (rows - starts)
+
+    net_cashflows = columns.outflows - columns.inflows
+    # an undefined cashflow is left out of the prefix sum so that it does not spill over
+    # the following accounts; the months of its account from then on are undefined
+    defined = np.isfinite(net_cashflows)
+    discounted = np.cumsum(np.where(defined, net_cashflows, 0.0) / growth)
+    undefined_before = np.cumsum(~defined)
+    # restart the prefix sums at every account: subtract the totals before its first row
+    before_account = np.concatenate(([0.0], discounted))[starts]
+    undefined_before_account = np.concatenate(([0], undefined_before))[starts]
+    required_valuations = np.where(
+        undefined_before > undefined_before_account,
+        np.nan,
+        -(discounted - before_account) * growth,
+    )
+
+    kept = ~account_start
+    return TargetValuations(
+        target_irr_annual=target_irr_annual,
+        account_names=columns.account_names,
+        account_codes=columns.account_codes[kept],
+        months=columns.months[kept],
+        valuations=columns.valuations[kept],
+        required_valuations=required_valuations[kept],
+    )
@@ -1,5 +1,6 @@
 from google.cloud import bigquery
-from typing import Optional
+import threading
+from typing import Callable, Dict, Optional
 
 
 def create_bigquery_client(project_id: Optional[str] = None) -> bigquery.Client:
@@ -11,3 +12,42 @@ def create_bigquery_client(project_id: Optional[str] = None) -> bigquery.Client:
         google.cloud.bigquery.Client: A client for interacting with Google BigQuery.
     """
     return bigquery.Client(project=project_id)
+
+
+class BigQueryClientPool:
+    """
+    Thread-safe pool of BigQuery clients keyed by project, so that pipelines reading
+    from and writing to the same project, or running concurrently on it, share a
+    single client and its connection pool.
+
+    Args:
+        client_factory (Callable[[Optional[str]], bigquery.Client]):
+            Creates the client of a project. Defaults to create_bigquery_client().
+    Methods:
+        get(project_id: Optional[str]) -> bigquery.Client:
+            Returns the client of the project, creating it on first use.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[
+            [Optional[str]], bigquery.Client
+        ] = create_bigquery_client,
+    ):
+        self.client_factory = client_factory
+        self._clients: Dict[Optional[str], bigquery.Client] = {}
+        self._lock = threading.Lock()
+
+    def get(self, project_id: Optional[str] = None) -> bigquery.Client:
+        """
+        Returns the client of a project, creating it on first use.
+
+        Args:
+            project_id (str, optional): The Google Cloud project ID.
+        Returns:
+            google.cloud.bigquery.Client: The shared client of the project.
+        """
+        with self._lock:
+            if project_id not in self._clients:
+                self._clients[project_id] = self.client_factory(project_id)
+            return self._clients[project_id]
@@ -1,19 +1,172 @@
+import atexit
 from logging import INFO, Logger, StreamHandler, getLogger
+from logging.handlers import QueueHandler, QueueListener
+import queue
+import threading
+import time
+from typing import Dict, Optional
+import weakref
 
 
-def default_module_logger(src_file_name: str) -> Logger:
+_log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+_listener: Optional[QueueListener] = None
+_listener_lock = threading.Lock()
+_aggregating_loggers: "weakref.WeakSet[AggregatingLogger]" = weakref.WeakSet()
+
+
+def _start_listener() -> bool:
+    """
+    Starts the background thread writing the queued records to the console, unless it
+    is running. Returns False if it cannot be started, at interpreter shutdown.
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            listener = QueueListener(_log_queue, StreamHandler())
+            try:
+                listener.start()
+            except RuntimeError:
+                return False
+            _listener = listener
+
+    return True
+
+
+class _BackgroundQueueHandler(QueueHandler):
+    """
+    Handler putting records in the shared log queue. The background thread writing
+    them is started with the first record, and again after logging was stopped, so
+    that records are never left in the queue. When it cannot be started, records are
+    written directly.
+    """
+
+    def enqueue(self, record):
+        if _listener is None and not _start_listener():
+            StreamHandler().handle(record)
+            return
+        super().enqueue(record)
+
+
+def stop_logging():
+    """
+    Emits the pending aggregated messages and waits for the background thread to write
+    all the queued records. Logging can go on afterwards: the thread is started again
+    by the next record. Called at interpreter exit, and by entrypoints before they
+    return.
+    """
+    global _listener
+    flush_aggregated_logs()
+    with _listener_lock:
+        listener, _listener = _listener, None
+        if listener is not None:
+            listener.stop()
+            # records queued by other threads after the stop sentinel
+            while True:
+                try:
+                    record = _log_queue.get_nowait()
+                except queue.Empty:
+                    break
+                listener.handle(record)
+
+
+atexit.register(stop_logging)
+
+
+def default_module_logger(src_file_name: str, asynchronous: bool = True) -> Logger:
     """
     Gets or creates a module logger.
 
     Args:
         src_file_name (str): The name of the source file/module using the logger.
+        asynchronous (bool): Whether records are written to the console by a background
+            thread, so that logging never blocks the caller on I/O.
     Returns:
         Logger: default module logger.
     """
     logger = getLogger(src_file_name)
     if len(logger.handlers) == 0:
-        handler = StreamHandler()
-        logger.addHandler(handler)
+        if asynchronous:
+            logger.addHandler(_BackgroundQueueHandler(_log_queue))
+        else:
+            logger.addHandler(StreamHandler())
     logger.setLevel(INFO)
 
     return logger
+
+
+class AggregatingLogger:
+    """
+    Aggregates repetitive messages of a logger by key, such as one message per account,
+    into one summary line per key and interval, with the number of occurrences.
+
+    Messages are formatted lazily: only the first message of every interval is formatted,
+    when the summary is emitted. Messages below the logger level are discarded without
+    being counted.
+
+    Args:
+        logger (Logger): The logger emitting the summaries.
+        interval (float): Minimum seconds between two summaries of the same key.
+    Methods:
+        log(key: str, level: int, message: str, *args):
+            Counts a message, emitting the summary of its key if the interval elapsed.
+        flush():
+            Emits the summaries of all the keys with pending messages.
+    """
+
+    def __init__(self, logger: Logger, interval: float = 60.0):
+        self.logger = logger
+        self.interval = interval
+        # key -> [level, message, args of the first message, count, window start]
+        self._pending: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        _aggregating_loggers.add(self)
+
+    def log(self, key: str, level: int, message: str, *args):
+        """
+        Counts a message, emitting the summary of its key if the interval elapsed.
+
+        Args:
+            key (str): The key the message is aggregated by.
+            level (int): The logging level of the message.
+            message (str): The message, with %-style placeholders.
+            *args: The arguments of the message, formatted only if it is summarized.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = [level, message, args, 1, now]
+                return
+            pending[3] += 1
+            if now - pending[4] < self.interval:
+                return
+            del self._pending[key]
+        self._emit(*pending[:4])
+
+    def flush(self):
+        """
+        Emits the summaries of all the keys with pending messages.
+        """
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for level, message, args, count, _ in pending:
+            self._emit(level, message, args, count)
+
+    def _emit(self, level: int, message: str, args: tuple, count: int):
+        if count == 1:
+            self.logger.log(level, message, *args)
+        else:
+            self.logger.log(
+                level, f"{message} (and %d similar messages)", *args, count - 1
+            )
+
+
+def flush_aggregated_logs():
+    """
+    Emits the pending summaries of all the aggregating loggers.
+    """
+    for aggregating_logger in list(_aggregating_loggers):
+        aggregating_logger.flush()
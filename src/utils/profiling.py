@@ -0,0 +1,182 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+import os
+import pstats
+import time
+import tracemalloc
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+
+@dataclass
+class StageStats:
+    """
+    Resources used by a pipeline stage, accumulated over all its executions.
+
+    Attributes:
+        seconds (float): Wall time spent in the stage.
+        allocated_bytes (int): Net memory allocated by the stage, if tracemalloc is tracing.
+        peak_bytes (int): Highest memory allocated on top of the stage start, if tracing.
+        calls (int): Number of executions of the stage.
+    """
+
+    seconds: float = 0.0
+    allocated_bytes: int = 0
+    peak_bytes: int = 0
+    calls: int = 0
+
+
+class StageRecorder:
+    """
+    Records the wall time and, when tracemalloc is tracing, the memory allocated by
+    the named stages of a pipeline. Stages are not expected to be nested.
+
+    Args:
+        keep_snapshots (bool): Whether to keep the tracemalloc snapshot taken at the end
+            of the stage with the most memory in use, to attribute it to allocation sites.
+    Attributes:
+        stages (Dict[str, StageStats]): Resources used by every stage, in first run order.
+        peak_snapshot (tracemalloc.Snapshot, optional): The snapshot kept, if any.
+    Methods:
+        stage(name: str):
+            Context manager measuring the code run within it as part of stage `name`.
+    """
+
+    def __init__(self, keep_snapshots: bool = False):
+        self.stages: Dict[str, StageStats] = {}
+        self.keep_snapshots = keep_snapshots
+        self.peak_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._peak_snapshot_memory = -1
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Measures the code run within the context as part of the given stage.
+
+        Args:
+            name (str): The name of the stage.
+        """
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats = self.stages.setdefault(name, StageStats())
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                stats.allocated_bytes += current - start_memory
+                stats.peak_bytes = max(stats.peak_bytes, peak - start_memory)
+                if self.keep_snapshots and current > self._peak_snapshot_memory:
+                    self._peak_snapshot_memory = current
+                    self.peak_snapshot = tracemalloc.take_snapshot()
+
+
+def _function_label(function: Tuple[str, int, str]) -> str:
+    file_name, line, name = function
+    if file_name == "~":
+        return name
+    return f"{name} ({os.path.basename(file_name)}:{line})"
+
+
+def collapsed_stacks(stats: pstats.Stats, max_depth: int = 64) -> List[str]:
+    """
+    Builds flamegraph-ready collapsed stacks ("root;child;leaf microseconds") from
+    deterministic profiler statistics.
+
+    cProfile only keeps caller/callee pairs, so stacks are rebuilt from the functions
+    nobody calls, splitting the time of every function among its callees in
+    proportion to the time spent on every call edge. Recursion is cut at the first
+    repeated function of a stack.
+
+    Args:
+        stats (pstats.Stats): The profiler statistics.
+        max_depth (int): The maximum depth of the stacks.
+    Returns:
+        List[str]: One line per distinct stack, with its self time in microseconds.
+    """
+    raw_stats = stats.stats  # type: ignore[attr-defined]
+    callees: Dict[tuple, List[Tuple[tuple, float]]] = {}
+    roots = []
+    for function, (_, _, _, _, callers) in raw_stats.items():
+        if not callers:
+            roots.append(function)
+        for caller, (_, _, _, edge_cumulative) in callers.items():
+            callees.setdefault(caller, []).append((function, edge_cumulative))
+
+    lines: Dict[str, float] = {}
+
+    def walk(function: tuple, budget: float, path: List[str], seen: Set[tuple]):
+        _, _, own_time, cumulative, _ = raw_stats[function]
+        if cumulative <= 0 or budget <= 0:
+            return
+        share = min(budget / cumulative, 1.0)
+        path = path + [_function_label(function)]
+        stack = ";".join(path)
+        lines[stack] = lines.get(stack, 0.0) + own_time * share
+        if len(path) >= max_depth:
+            return
+        for callee, edge_cumulative in callees.get(function, []):
+            if callee not in seen:
+                walk(callee, edge_cumulative * share, path, seen | {callee})
+
+    for root in roots:
+        walk(root, raw_stats[root][3], [], {root})
+
+    return [
+        f"{stack} {round(seconds * 1e6)}"
+        for stack, seconds in lines.items()
+        if round(seconds * 1e6) > 0
+    ]
+
+
+def summary_table(
+    recorder: StageRecorder,
+    stats: pstats.Stats,
+    top: int = 15,
+) -> str:
+    """
+    Builds a plain text summary of a profiled run: time and memory by stage, the
+    functions with the highest own time and, if available, the allocation sites
+    holding the most memory at the end of the most memory hungry stage.
+
+    Args:
+        recorder (StageRecorder): The stage measurements of the run.
+        stats (pstats.Stats): The profiler statistics of the run.
+        top (int): Number of functions and allocation sites listed.
+    Returns:
+        str: The summary.
+    """
+    total = sum(stage.seconds for stage in recorder.stages.values()) or 1.0
+    lines = [
+        f"{'stage':<12}{'calls':>8}{'seconds':>12}{'share':>8}"
+        f"{'alloc MB':>12}{'peak MB':>12}"
+    ]
+    for name, stage in recorder.stages.items():
+        lines.append(
+            f"{name:<12}{stage.calls:>8}{stage.seconds:>12.3f}"
+            f"{stage.seconds / total:>8.1%}{stage.allocated_bytes / 2**20:>12.1f}"
+            f"{stage.peak_bytes / 2**20:>12.1f}"
+        )
+
+    lines += ["", f"{'own s':>10}{'cum s':>10}{'calls':>12}  function"]
+    raw_stats = stats.stats  # type: ignore[attr-defined]
+    by_own_time = sorted(raw_stats.items(), key=lambda item: item[1][2], reverse=True)
+    for function, (_, calls, own_time, cumulative, _) in by_own_time[:top]:
+        lines.append(
+            f"{own_time:>10.3f}{cumulative:>10.3f}{calls:>12}  {_function_label(function)}"
+        )
+
+    if recorder.peak_snapshot is not None:
+        lines += ["", f"{'MB':>10}{'blocks':>12}  allocation site"]
+        for statistic in recorder.peak_snapshot.statistics("lineno")[:top]:
+            frame = statistic.traceback[0]
+            lines.append(
+                f"{statistic.size / 2**20:>10.1f}{statistic.count:>12}"
+                f"  {os.path.basename(frame.filename)}:{frame.lineno}"
+            )
+
+    return "\n".join(lines)
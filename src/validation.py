@@ -0,0 +1,239 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+
+from src import model
+from src.columnar import CashflowColumns, MISSING_MONTH
+
+
+REPORT = "report"
+FILL = "fill"
+QUARANTINE = "quarantine"
+VALIDATION_MODES = (REPORT, FILL, QUARANTINE)
+
+
+@dataclass(frozen=True)
+class ValidationReport:
+    """
+    Compact summary of the issues found while validating a cashflow extract.
+
+    Attributes:
+        rows (int): Number of rows validated.
+        invalid_rows (int): Rows with a missing date or a non-finite amount.
+        duplicate_rows (int): Rows repeating a month already present for the account.
+        missing_months (int): Months absent between the first and last month of an account.
+        non_monotonic_rows (int): Rows where inflow or outflow decreases (only when checked).
+        flagged_accounts (Dict[str, Tuple[str, ...]]): Account names affected, by issue.
+        filled_rows (int): Rows added to fill gaps.
+        removed_rows (int): Rows dropped by the chosen validation mode.
+    """
+
+    rows: int
+    invalid_rows: int
+    duplicate_rows: int
+    missing_months: int
+    non_monotonic_rows: int
+    flagged_accounts: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+    filled_rows: int = 0
+    removed_rows: int = 0
+
+    @property
+    def is_clean(self) -> bool:
+        """
+        Whether no issue at all has been found.
+
+        Returns:
+            bool: True if the extract has no flagged account.
+        """
+        return not any(self.flagged_accounts.values())
+
+    def summary(self) -> str:
+        """
+        Builds a one line human readable summary of the report.
+
+        Returns:
+            str: The summary.
+        """
+        accounts = ", ".join(
+            f"{issue}={len(names)}" for issue, names in self.flagged_accounts.items()
+        )
+        return (
+            f"Validated {self.rows} rows: {self.invalid_rows} invalid, "
+            f"{self.duplicate_rows} duplicated, {self.missing_months} missing months, "
+            f"{self.non_monotonic_rows} non monotonic; "
+            f"{self.filled_rows} filled, {self.removed_rows} removed; "
+            f"accounts flagged: {accounts}"
+        )
+
+
+def _account_names(columns: CashflowColumns, mask: np.ndarray) -> Tuple[str, ...]:
+    return tuple(
+        columns.account_names[code] for code in np.unique(columns.account_codes[mask])
+    )
+
+
+def _fill_gaps(columns: CashflowColumns, gap_sizes: np.ndarray) -> CashflowColumns:
+    """
+    Adds one row per missing month. Added rows have no inflow nor outflow and carry
+    forward the valuation of the last known month. Rows of `columns` must be sorted
+    by account and month; `gap_sizes[i]` is the number of months missing right after row i.
+    """
+    repeats = np.repeat(np.arange(len(columns)), gap_sizes)
+    starts = np.cumsum(gap_sizes) - gap_sizes
+    offsets = np.arange(len(repeats)) - np.repeat(starts, gap_sizes) + 1
+    added = columns.take(repeats)
+    added.months = (added.months + offsets).astype(np.int32)
+    added.inflows = np.zeros(len(repeats))
+    added.outflows = np.zeros(len(repeats))
+
+    merged = CashflowColumns(
+        account_names=columns.account_names,
+        account_codes=np.concatenate((columns.account_codes, added.account_codes)),
+        months=np.concatenate((columns.months, added.months)),
+        inflows=np.concatenate((columns.inflows, added.inflows)),
+        outflows=np.concatenate((columns.outflows, added.outflows)),
+        valuations=np.concatenate((columns.valuations, added.valuations)),
+    )
+    return merged.take(merged.sort_order())
+
+
+def validate_cashflows(
+    columns: CashflowColumns, mode: str = REPORT, check_monotonic: bool = False
+) -> Tuple[CashflowColumns, ValidationReport]:
+    """
+    Validates a whole cashflow extract in a single vectorised pass.
+
+    Rows are grouped by account and ordered by month, then flagged when they have
+    a missing date or non-finite amount (invalid), repeat an existing month
+    (duplicate), leave months uncovered in between (gap) or, if `check_monotonic`
+    is set, decrease inflow or outflow compared to the previous month.
+
+    Depending on `mode` the extract is returned:
+        - "report": unchanged.
+        - "fill": without invalid rows, keeping the last row of each duplicated
+          month and with gap months added. Non monotonic rows are kept.
+        - "quarantine": without any row of a flagged account.
+
+    Args:
+        columns (CashflowColumns): The extract to validate.
+        mode (str): One of "report", "fill" or "quarantine".
+        check_monotonic (bool): Whether to flag decreasing inflow or outflow. Off by
+            default because amounts are consumed as per period flows by Account.calculate_irr().
+    Returns:
+        Tuple[CashflowColumns, ValidationReport]: The resulting extract and the report.
+    Raises:
+        ValueError: If mode is not a known validation mode.
+    """
+    if mode not in VALIDATION_MODES:
+        raise ValueError(
+            f"Unknown validation mode '{mode}', expected one of {VALIDATION_MODES}"
+        )
+
+    columns = columns.take(columns.sort_order())
+    invalid = (
+        (columns.months == MISSING_MONTH)
+        | ~np.isfinite(columns.inflows)
+        | ~np.isfinite(columns.outflows)
+        | ~np.isfinite(columns.valuations)
+    )
+
+    valid = columns.take(~invalid)
+    same_account = valid.account_codes[1:] == valid.account_codes[:-1]
+    month_step = np.diff(valid.months)
+    duplicate = np.zeros(len(valid), dtype=bool)
+    duplicate[1:] = same_account & (month_step == 0)
+    gap_sizes = np.zeros(len(valid), dtype=np.int64)
+    gap_sizes[:-1] = np.where(same_account & (month_step > 1), month_step - 1, 0)
+    non_monotonic = np.zeros(len(valid), dtype=bool)
+    if check_monotonic:
+        non_monotonic[1:] = same_account & (
+            (np.diff(valid.inflows) < 0) | (np.diff(valid.outflows) < 0)
+        )
+
+    flagged_accounts = {
+        "invalid": _account_names(columns, invalid),
+        "duplicate": _account_names(valid, duplicate),
+        "gap": _account_names(valid, gap_sizes > 0),
+        "non_monotonic": _account_names(valid, non_monotonic),
+    }
+
+    filled_rows = 0
+    if mode == FILL:
+        last_of_month = np.ones(len(valid), dtype=bool)
+        last_of_month[:-1] = ~duplicate[1:]
+        filled_rows = int(gap_sizes.sum())
+        result = _fill_gaps(valid.take(last_of_month), gap_sizes[last_of_month])
+    elif mode == QUARANTINE:
+        flagged = set()
+        for names in flagged_accounts.values():
+            flagged.update(names)
+        flagged_codes = [
+            code for code, name in enumerate(columns.account_names) if name in flagged
+        ]
+        result = columns.take(~np.isin(columns.account_codes, flagged_codes))
+    else:
+        result = columns
+
+    report = ValidationReport(
+        rows=len(columns),
+        invalid_rows=int(invalid.sum()),
+        duplicate_rows=int(duplicate.sum()),
+        missing_months=int(gap_sizes.sum()),
+        non_monotonic_rows=int(non_monotonic.sum()),
+        flagged_accounts=flagged_accounts,
+        filled_rows=filled_rows,
+        removed_rows=len(columns) + filled_rows - len(result),
+    )
+    return result, report
+
+
+def combine_reports(reports: Sequence[ValidationReport]) -> ValidationReport:
+    """
+    Combines the reports of several extracts holding different accounts.
+
+    Args:
+        reports (Sequence[ValidationReport]): The reports to combine.
+    Returns:
+        ValidationReport: A report with the counts and flagged accounts of all reports.
+    """
+    flagged_accounts: Dict[str, Tuple[str, ...]] = {}
+    for report in reports:
+        for issue, names in report.flagged_accounts.items():
+            flagged_accounts[issue] = flagged_accounts.get(issue, ()) + names
+
+    return ValidationReport(
+        rows=sum(report.rows for report in reports),
+        invalid_rows=sum(report.invalid_rows for report in reports),
+        duplicate_rows=sum(report.duplicate_rows for report in reports),
+        missing_months=sum(report.missing_months for report in reports),
+        non_monotonic_rows=sum(report.non_monotonic_rows for report in reports),
+        flagged_accounts=flagged_accounts,
+        filled_rows=sum(report.filled_rows for report in reports),
+        removed_rows=sum(report.removed_rows for report in reports),
+    )
+
+
+def validate_cashflow_snapshots(
+    cashflow_snapshots: List[model.CashflowSnapshot],
+    mode: str = REPORT,
+    check_monotonic: bool = False,
+) -> Tuple[List[model.CashflowSnapshot], ValidationReport]:
+    """
+    Validates a list of cashflow snapshots. See validate_cashflows() for details.
+
+    Args:
+        cashflow_snapshots (List[model.CashflowSnapshot]): The snapshots to validate.
+        mode (str): One of "report", "fill" or "quarantine".
+        check_monotonic (bool): Whether to flag decreasing inflow or outflow.
+    Returns:
+        Tuple[List[model.CashflowSnapshot], ValidationReport]:
+            The snapshots to carry on with (the input list itself in "report" mode)
+            and the validation report.
+    """
+    columns, report = validate_cashflows(
+        CashflowColumns.from_snapshots(cashflow_snapshots), mode, check_monotonic
+    )
+    if mode == REPORT:
+        return cashflow_snapshots, report
+
+    return columns.to_snapshots(), report
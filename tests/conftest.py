@@ -19,8 +19,11 @@ def bq_source_repository() -> BigQuerySourceRepository:
     """
     client = create_bigquery_client(project_id=os.environ["PROJECT_SOURCE"])
     bq_source_repository = BigQuerySourceRepository(client=client)
+    bq_source_repository.cashflow_table = (
+        f"{os.environ['SOURCE_DATASET']}.{os.environ['SOURCE_TABLE']}"
+    )
     bq_source_repository.cashflow_source = (
-        f"SELECT * FROM {os.environ['SOURCE_DATASET']}.{os.environ['SOURCE_TABLE']}"
+        f"SELECT * FROM {bq_source_repository.cashflow_table}"
     )
 
     return bq_source_repository
@@ -71,6 +74,9 @@ def bq_destination_repository() -> Generator[BigQueryDestinationRepository, None
     bq_destination_repository.irr_destination = (
         f"{os.environ['DESTINATION_DATASET']}.{os.environ['DESTINATION_TABLE']}"
     )
+    bq_destination_repository.run_lock_table = (
+        f"{os.environ['DESTINATION_DATASET']}.irr_run_lock"
+    )
 
     yield bq_destination_repository
 
@@ -0,0 +1,95 @@
+import datetime as dt
+
+from src import aggregation, model
+from src.columnar import CashflowColumns, calculate_irr_columns, date_to_month_index
+from tests.data.constants import CAHSFLOW_SNAPSHOTS
+
+
+def _group_irrs(columns, group_mapping):
+    # group IRRs are calculated as in services.irr_pipeline()
+    groups = aggregation.merge_aggregated_cashflows(
+        [aggregation.aggregate_cashflows_by_group(columns, group_mapping)]
+    )
+    return calculate_irr_columns(groups).by_account()
+
+
+def test_aggregate_cashflows_by_group():
+    """
+    GIVEN the cashflows of two accounts belonging to the same group
+    WHEN they are aggregated by group
+    THEN inflows, outflows and valuations should be summed by month
+    """
+    columns = CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS)
+
+    groups = aggregation.aggregate_cashflows_by_group(
+        columns, {"Test Account 1": "book", "Test Account 2": "book"}
+    )
+
+    assert groups.account_names == ("book",)
+    assert groups.months.tolist() == [
+        date_to_month_index(dt.date(2022, month, 1)) for month in range(1, 6)
+    ]
+    assert groups.inflows.tolist() == [1000, 0, 1000, 0, 0]
+    assert groups.outflows.tolist() == [0, 100, 100, 100, 100]
+    assert groups.valuations.tolist() == [1000, 1000, 2000, 2100, 1000]
+
+
+def test_aggregate_cashflows_multiple_groups_per_account():
+    """
+    GIVEN an account that belongs to two groups and an account without group
+    WHEN cashflows are aggregated by group
+    THEN the rows of the first account are counted in both groups only
+    """
+    columns = CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS)
+
+    groups = aggregation.aggregate_cashflows_by_group(
+        columns, {"Test Account 2": ["strategy", "book"]}
+    )
+
+    assert groups.account_names == ("strategy", "book")
+    assert groups.account_codes.tolist() == [0, 0, 1, 1]
+    assert groups.valuations.tolist() == [1000, 1100, 1000, 1100]
+
+
+def test_calculate_group_irrs():
+    """
+    GIVEN the cashflows of several accounts and a group mapping
+    WHEN group IRRs are calculated
+    THEN a group with a single account should have the IRRs of that account,
+         and a group of several accounts the IRRs of the summed cashflows
+    """
+    columns = CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS)
+    account = model.Account("Test Account 1")
+    model.allocate_cashflow_snapshots_to_accounts(
+        CAHSFLOW_SNAPSHOTS[:5], {"Test Account 1": account}
+    )
+    account.calculate_irr()
+
+    group_irrs = _group_irrs(
+        columns,
+        {"Test Account 1": ["single", "book"], "Test Account 2": "book"},
+    )
+
+    assert [irr.irr_monthly for irr in group_irrs["single"]] == [
+        irr.irr_monthly for irr in account.irr_snapshots
+    ]
+    assert group_irrs["single"][0].account_name == "single"
+    assert [irr.first_day_of_month for irr in group_irrs["book"]] == [
+        dt.date(2022, month, 1) for month in range(2, 6)
+    ]
+    assert [irr.irr_monthly for irr in group_irrs["book"]] == (
+        model.calculate_irr_series(
+            [-1000, 100, -900, 100, 100], [1000, 1000, 2000, 2100, 1000]
+        )
+    )
+
+
+def test_calculate_group_irrs_no_groups():
+    """
+    GIVEN cashflows and an empty group mapping
+    WHEN group IRRs are calculated
+    THEN no group IRR should be returned
+    """
+    columns = CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS)
+
+    assert _group_irrs(columns, {}) == {}
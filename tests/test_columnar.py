@@ -0,0 +1,104 @@
+import datetime as dt
+import json
+import numpy as np
+
+from src import columnar, model
+from src.destination_repository import irr_rows
+from tests.data.constants import CAHSFLOW_SNAPSHOTS
+
+
+def test_month_index_round_trip():
+    """
+    GIVEN a date on the first day of a month and a missing date
+    WHEN they are converted to month indexes and back
+    THEN the original values should be returned
+    """
+    date = dt.date(2022, 12, 1)
+
+    assert columnar.month_index_to_date(columnar.date_to_month_index(date)) == date
+    assert columnar.date_to_month_index(None) == columnar.MISSING_MONTH
+    assert columnar.month_index_to_date(columnar.MISSING_MONTH) is None
+
+
+def test_cashflow_columns_round_trip():
+    """
+    GIVEN a list of CashflowSnapshot objects
+    WHEN they are converted to CashflowColumns and back to snapshots
+    THEN the same snapshots should be returned in the same order
+    """
+    columns = columnar.CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS)
+
+    assert len(columns) == len(CAHSFLOW_SNAPSHOTS)
+    assert columns.account_names == ("Test Account 1", "Test Account 2")
+    assert columns.to_snapshots() == CAHSFLOW_SNAPSHOTS
+
+
+def test_cashflow_columns_missing_values():
+    """
+    GIVEN a CashflowSnapshot with missing date and valuation
+    WHEN it is converted to CashflowColumns
+    THEN the missing values should be encoded as MISSING_MONTH and NaN
+    """
+    columns = columnar.CashflowColumns.from_snapshots(
+        [model.CashflowSnapshot(None, 10, 0, None, "test account")]
+    )
+
+    assert columns.months[0] == columnar.MISSING_MONTH
+    assert np.isnan(columns.valuations[0])
+
+
+def test_calculate_irr_columns():
+    """
+    GIVEN a sorted cashflow extract
+    WHEN IRR results are calculated into IrrColumns
+    THEN their IrrSnapshot views should match the IRRs calculated by Account,
+         and the annualized IRR should be computed for every row
+    """
+    columns = columnar.CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS)
+    columns = columns.take(columns.sort_order())
+    accounts = model.allocate_cashflow_snapshots_to_accounts(
+        CAHSFLOW_SNAPSHOTS, model.account_collection_creation(CAHSFLOW_SNAPSHOTS)
+    )
+    for account in accounts.values():
+        account.calculate_irr()
+
+    irrs = columnar.calculate_irr_columns(columns)
+
+    assert irrs.irr_monthly.dtype == np.float64
+    assert irrs.months.dtype == np.int32
+    assert irrs.by_account() == {
+        name: account.irr_snapshots for name, account in accounts.items()
+    }
+    assert irrs.irr_annual.tolist() == [
+        irr.irr_annual for account in accounts.values() for irr in account.irr_snapshots
+    ]
+    assert irrs.mirr_monthly is None
+
+
+def test_irr_columns_to_ndjson():
+    """
+    GIVEN IRR results of two accounts with defined and undefined values
+    WHEN the results are serialized as newline delimited JSON
+    THEN the lines should hold the same rows as irr_rows() of their IrrSnapshot views
+    """
+    columns = columnar.CashflowColumns.from_records(
+        [
+            ("a", 24264, 1000.0, 0.0, 0.0),
+            ("a", 24265, 0.0, 0.0, 1100.0),
+            ("a", 24266, 0.0, 0.0, 1200.0),
+            ("b", 24264, 0.0, 0.0, 0.0),
+            ("b", 24265, 0.0, 0.0, 0.0),
+        ]
+    )
+    mirr_rates = model.MirrRates(0.05, 0.03)
+    irrs = columnar.calculate_irr_columns(columns, mirr_rates)
+
+    lines = irrs.to_ndjson("entity_name", include_sensitivities=True).splitlines()
+
+    assert irrs.account_names == ("a", "b")
+    assert [json.loads(line) for line in lines] == irr_rows(
+        (irr for snapshots in irrs.by_account().values() for irr in snapshots),
+        "entity_name",
+        include_sensitivities=True,
+    )
+    assert len(lines) == 2
@@ -1,7 +1,21 @@
+import datetime as dt
+import json
+import os
+import time
 from google.cloud import bigquery
 
-from src.destination_repository import BigQueryDestinationRepository
-from tests.data.constants import ACCOUNTS
+from src import model
+from src.columnar import CashflowColumns, calculate_irr_columns
+from src.npv_profile import NpvProfile, calculate_npv_profile
+from src.destination_repository import (
+    IRR_ROOT_SCHEMA,
+    NPV_PROFILE_SCHEMA,
+    BigQueryDestinationRepository,
+    FileDestinationRepository,
+    irr_rows,
+    irr_schema,
+)
+from tests.data.constants import ACCOUNTS, CAHSFLOW_SNAPSHOTS
 
 
 def test_load_table_from_json_actual_bq(
@@ -59,3 +73,444 @@ def test_load_irrs(
             assert row["entity_name"] == irr_snapshot.account_name
             assert row["first_day_of_month"] == irr_snapshot.first_day_of_month
             assert row["irr_monthly"] == irr_snapshot.irr_monthly
+
+
+def test_load_group_irrs(
+    bq_destination_repository: BigQueryDestinationRepository,
+):
+    """
+    GIVEN a BigQueryDestinationRepository and IrrSnapshot data of groups of accounts
+    WHEN the load_group_irrs method is called with these group IRRs,
+    THEN the IRR snapshots should be loaded into the group destination table,
+         with the group name on the group_name column.
+    """
+    bq_destination_repository.group_irr_destination = (
+        bq_destination_repository.irr_destination
+    )
+    group_irrs = {key: account.irr_snapshots for key, account in ACCOUNTS.items()}
+
+    bq_destination_repository.load_group_irrs(group_irrs)
+
+    for key in group_irrs.keys():
+        query_job = bq_destination_repository.client.query(
+            f"SELECT * FROM {bq_destination_repository.group_irr_destination}"
+            f" WHERE group_name = '{key}' ORDER BY first_day_of_month"
+        )
+        for row, irr_snapshot in zip(query_job.result(), group_irrs[key]):
+            assert row["group_name"] == irr_snapshot.account_name
+            assert row["first_day_of_month"] == irr_snapshot.first_day_of_month
+            assert row["irr_monthly"] == irr_snapshot.irr_monthly
+
+
+def test_irr_rows():
+    """
+    GIVEN IRR snapshots with defined and undefined IRR and time-weighted return values
+    WHEN they are converted into rows to load
+    THEN undefined IRRs should be skipped and undefined returns written as null
+    """
+    irr_snapshots = [
+        model.IrrSnapshot(dt.date(2022, 2, 1), 0.1, "account", 0.1, 0.1),
+        model.IrrSnapshot(dt.date(2022, 3, 1), float("nan"), "account"),
+        model.IrrSnapshot(dt.date(2022, 4, 1), 0.1, "account", float("nan"), None),
+    ]
+
+    rows = irr_rows(irr_snapshots, "entity_name")
+
+    assert rows == [
+        {
+            "first_day_of_month": "2022-02-01",
+            "irr_monthly": 0.1,
+            "irr_annual": 2.1384,
+            "twr_monthly": 0.1,
+            "twr_cumulative": 0.1,
+            "entity_name": "account",
+        },
+        {
+            "first_day_of_month": "2022-04-01",
+            "irr_monthly": 0.1,
+            "irr_annual": 2.1384,
+            "twr_monthly": None,
+            "twr_cumulative": None,
+            "entity_name": "account",
+        },
+    ]
+
+
+def test_irr_rows_with_sensitivities():
+    """
+    GIVEN an IRR snapshot with a valuation sensitivity
+    WHEN it is converted into a row including sensitivities
+    THEN the sensitivity should be part of the row
+    """
+    irr_snapshots = [
+        model.IrrSnapshot(dt.date(2022, 2, 1), 0.1, "account", 0.1, 0.1, 0.001)
+    ]
+
+    rows = irr_rows(irr_snapshots, "entity_name", include_sensitivities=True)
+
+    assert rows[0]["irr_valuation_sensitivity"] == 0.001
+
+
+def test_file_destination_repository(tmp_path):
+    """
+    GIVEN a FileDestinationRepository and a set of Account objects with IRR snapshots
+    WHEN account and group IRRs are loaded
+    THEN newline delimited JSON files with the IRR rows should be written
+    """
+    repository = FileDestinationRepository(str(tmp_path))
+
+    repository.load_irrs(ACCOUNTS)
+    repository.load_group_irrs({"book": ACCOUNTS["Test Account 2"].irr_snapshots})
+
+    rows = (tmp_path / repository.irr_destination).read_text().splitlines()
+    assert [json.loads(row) for row in rows] == irr_rows(
+        (irr for account in ACCOUNTS.values() for irr in account.irr_snapshots),
+        "entity_name",
+    )
+    group_rows = (tmp_path / repository.group_irr_destination).read_text()
+    assert json.loads(group_rows)["group_name"] == "Test Account 2"
+
+
+def test_irr_rows_with_mirr():
+    """
+    GIVEN IRR snapshots with a MIRR and an undefined IRR
+    WHEN they are converted into rows to load
+    THEN they should be kept with the MIRR fields and a null IRR
+    """
+    irr_snapshots = [
+        model.IrrSnapshot(dt.date(2022, 2, 1), None, "account", 0.1, 0.1, None, 0.1),
+        model.IrrSnapshot(dt.date(2022, 3, 1), None, "account", None, None, None, None),
+    ]
+
+    rows = irr_rows(irr_snapshots, "entity_name")
+
+    assert rows == [
+        {
+            "first_day_of_month": "2022-02-01",
+            "irr_monthly": None,
+            "irr_annual": None,
+            "twr_monthly": 0.1,
+            "twr_cumulative": 0.1,
+            "entity_name": "account",
+            "mirr_monthly": 0.1,
+            "mirr_annual": 2.1384,
+        }
+    ]
+
+
+def test_file_destination_repository_irr_columns(tmp_path):
+    """
+    GIVEN a FileDestinationRepository and columnar IRR results
+    WHEN they are loaded as account and group IRRs
+    THEN the files should hold the same rows as loading their IrrSnapshot views
+    """
+    columns = CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS)
+    irrs = calculate_irr_columns(columns.take(columns.sort_order()))
+    repository = FileDestinationRepository(str(tmp_path / "columns"))
+    views = FileDestinationRepository(str(tmp_path / "views"))
+
+    repository.load_irr_columns(irrs)
+    repository.load_group_irr_columns(irrs)
+    views.load_irrs(irrs.to_accounts())
+    views.load_group_irrs(irrs.by_account())
+
+    for file_name in (repository.irr_destination, repository.group_irr_destination):
+        assert (tmp_path / "columns" / file_name).read_text() == (
+            tmp_path / "views" / file_name
+        ).read_text()
+
+
+def test_load_irr_columns(
+    bq_destination_repository: BigQueryDestinationRepository,
+):
+    """
+    GIVEN a BigQueryDestinationRepository and columnar IRR results with MIRRs
+    WHEN they are loaded as account IRRs into a table that does not exist yet
+    THEN the table should be created with the IRR and MIRR columns of every row
+    """
+    columns = CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS)
+    irrs = calculate_irr_columns(
+        columns.take(columns.sort_order()), mirr_rates=model.MirrRates(0.05, 0.05)
+    )
+
+    bq_destination_repository.load_irr_columns(irrs)
+
+    query_job = bq_destination_repository.client.query(
+        f"SELECT * FROM {bq_destination_repository.irr_destination}"
+        " ORDER BY entity_name, first_day_of_month"
+    )
+    accounts = irrs.to_accounts().values()
+    expected = irr_rows(
+        (irr for account in accounts for irr in account.irr_snapshots), "entity_name"
+    )
+    rows = list(query_job.result())
+    assert len(rows) == len(expected)
+    for row, irr_row in zip(rows, expected):
+        assert row["entity_name"] == irr_row["entity_name"]
+        assert row["first_day_of_month"].isoformat() == irr_row["first_day_of_month"]
+        assert row["irr_monthly"] == irr_row["irr_monthly"]
+        assert row["mirr_monthly"] == irr_row["mirr_monthly"]
+
+
+def test_load_group_irr_columns(
+    bq_destination_repository: BigQueryDestinationRepository,
+):
+    """
+    GIVEN a BigQueryDestinationRepository and columnar IRR results of groups
+    WHEN they are loaded as group IRRs, including valuation sensitivities
+    THEN the rows should be loaded with the group_name and sensitivity columns
+    """
+    bq_destination_repository.group_irr_destination = (
+        bq_destination_repository.irr_destination
+    )
+    bq_destination_repository.include_sensitivities = True
+    columns = CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS)
+    group_irrs = calculate_irr_columns(columns.take(columns.sort_order()))
+
+    bq_destination_repository.load_group_irr_columns(group_irrs)
+
+    table = bq_destination_repository.client.get_table(
+        bq_destination_repository.group_irr_destination
+    )
+    assert [field.name for field in table.schema] == [
+        field.name for field in irr_schema("group_name", include_sensitivities=True)
+    ]
+    query_job = bq_destination_repository.client.query(
+        f"SELECT group_name, COUNT(*) AS row_count"
+        f" FROM {bq_destination_repository.group_irr_destination} GROUP BY group_name"
+    )
+    counts = {row["group_name"]: row["row_count"] for row in query_job.result()}
+    expected = irr_rows(
+        (irr for irrs in group_irrs.by_account().values() for irr in irrs), "group_name"
+    )
+    assert counts == {
+        name: sum(row["group_name"] == name for row in expected)
+        for name in {row["group_name"] for row in expected}
+    }
+
+
+def test_irr_schema():
+    """
+    GIVEN columnar IRR results with MIRRs
+    WHEN they are serialized with sensitivities
+    THEN every serialized field should be part of the IRR schema, in the same order
+    """
+    columns = CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS)
+    irrs = calculate_irr_columns(
+        columns.take(columns.sort_order()), mirr_rates=model.MirrRates(0.05, 0.05)
+    )
+
+    line = next(irrs.iter_ndjson("entity_name", include_sensitivities=True))
+
+    assert list(json.loads(line.splitlines()[0])) == [
+        field.name for field in irr_schema("entity_name", True, True)
+    ]
+
+
+def test_file_destination_repository_irr_columns_loader(tmp_path):
+    """
+    GIVEN a FileDestinationRepository and the columnar IRR results of two batches
+    WHEN they are loaded batch by batch through the IRR columns loader
+    THEN the file should hold the rows of both batches, as if loaded at once
+    """
+    columns = CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS)
+    columns = columns.take(columns.sort_order())
+    repository = FileDestinationRepository(str(tmp_path / "batches"))
+    at_once = FileDestinationRepository(str(tmp_path / "at_once"))
+
+    with repository.irr_columns_loader() as load_batch:
+        for code in range(len(columns.account_names)):
+            load_batch(
+                calculate_irr_columns(columns.take(columns.account_codes == code))
+            )
+    at_once.load_irr_columns(calculate_irr_columns(columns))
+
+    assert (tmp_path / "batches" / repository.irr_destination).read_text() == (
+        tmp_path / "at_once" / at_once.irr_destination
+    ).read_text()
+
+
+def test_file_destination_repository_run_lock(tmp_path):
+    """
+    GIVEN a FileDestinationRepository
+    WHEN its run lock is requested while held, and after a stale lock was left behind
+    THEN only the first holder and the run after the stale lock should acquire it
+    """
+    repository = FileDestinationRepository(str(tmp_path))
+
+    with repository.run_lock() as acquired:
+        with repository.run_lock() as acquired_concurrently:
+            assert acquired
+            assert not acquired_concurrently
+    with repository.run_lock() as acquired_again:
+        assert acquired_again
+
+    (tmp_path / repository.run_lock_file).touch()
+    os.utime(tmp_path / repository.run_lock_file, (0, 0))
+    with repository.run_lock(ttl=60) as acquired_after_stale_lock:
+        assert acquired_after_stale_lock
+    assert not (tmp_path / repository.run_lock_file).exists()
+
+
+def test_file_destination_repository_run_lock_stale_takeover(tmp_path):
+    """
+    GIVEN a FileDestinationRepository whose run lock was held past its time to live
+    WHEN the run lock is requested again, and the stale holder then releases it
+    THEN the lock should be taken over and still be held after the stale release
+    """
+    repository = FileDestinationRepository(str(tmp_path))
+
+    stale_lock = repository.run_lock(ttl=60)
+    assert stale_lock.__enter__()
+    os.utime(tmp_path / repository.run_lock_file, (0, 0))
+
+    with repository.run_lock(ttl=60) as taken_over:
+        stale_lock.__exit__(None, None, None)
+        with repository.run_lock(ttl=60) as acquired_concurrently:
+            assert taken_over
+            assert not acquired_concurrently
+    assert os.listdir(tmp_path) == []
+
+
+def test_file_destination_repository_run_fingerprints(tmp_path):
+    """
+    GIVEN a FileDestinationRepository without recorded run fingerprints
+    WHEN fingerprints are recorded
+    THEN they should be returned, except the undefined ones
+    """
+    repository = FileDestinationRepository(str(tmp_path))
+
+    assert repository.get_run_fingerprints() == {}
+    repository.record_run_fingerprints({"fingerprint": "a", "checksum": None})
+    assert repository.get_run_fingerprints() == {"fingerprint": "a"}
+
+
+def test_bq_run_lock_and_fingerprints(
+    bq_destination_repository: BigQueryDestinationRepository,
+):
+    """
+    GIVEN a BigQueryDestinationRepository with loaded IRRs
+    WHEN its run lock is requested while held and run fingerprints are recorded
+    THEN only the first holder should acquire the lock and fingerprints should be
+         read back from the destination table labels
+    """
+    bq_destination_repository.load_irrs(ACCOUNTS)
+
+    with bq_destination_repository.run_lock() as acquired:
+        with bq_destination_repository.run_lock() as acquired_concurrently:
+            assert acquired
+            assert not acquired_concurrently
+    bq_destination_repository.record_run_fingerprints(
+        {"fingerprint": "abc123", "checksum": None}
+    )
+
+    assert bq_destination_repository.get_run_fingerprints() == {"fingerprint": "abc123"}
+
+
+def test_bq_run_lock_stale_takeover(
+    bq_destination_repository: BigQueryDestinationRepository,
+):
+    """
+    GIVEN a BigQueryDestinationRepository whose run lock was held past its time to live
+    WHEN the run lock is requested again, and the stale holder then releases it
+    THEN the lock should be taken over and still be held after the stale release
+    """
+    stale_lock = bq_destination_repository.run_lock(ttl=1)
+    assert stale_lock.__enter__()
+    time.sleep(2)
+
+    with bq_destination_repository.run_lock() as taken_over:
+        stale_lock.__exit__(None, None, None)
+        with bq_destination_repository.run_lock() as acquired_concurrently:
+            assert taken_over
+            assert not acquired_concurrently
+
+
+def test_file_destination_repository_npv_profiles(tmp_path):
+    """
+    GIVEN a FileDestinationRepository and the NPV profile of an account
+    WHEN the profile is loaded
+    THEN one row per month and rate and one row per IRR root should be written
+    """
+    columns = CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS[:2])
+    repository = FileDestinationRepository(str(tmp_path))
+
+    repository.load_npv_profiles([calculate_npv_profile(columns, [0.0, 5.0])])
+
+    profile_rows = (tmp_path / repository.npv_profile_destination).read_text()
+    root_rows = (tmp_path / repository.irr_root_destination).read_text()
+    assert [json.loads(row) for row in profile_rows.splitlines()] == [
+        {
+            "first_day_of_month": "2022-02-01",
+            "rate_annual": 0.0,
+            "npv": 100.0,
+            "entity_name": "Test Account 1",
+        },
+        {
+            "first_day_of_month": "2022-02-01",
+            "rate_annual": 5.0,
+            "npv": -52.57,
+            "entity_name": "Test Account 1",
+        },
+    ]
+    assert json.loads(root_rows) == {
+        "first_day_of_month": "2022-02-01",
+        "root": 0,
+        "irr_monthly": 0.1,
+        "irr_annual": 2.1384,
+        "entity_name": "Test Account 1",
+    }
+
+
+def test_npv_profile_schemas():
+    """
+    GIVEN the NPV profile of an account with an IRR root
+    WHEN the profile and its roots are serialized
+    THEN every serialized field should be part of their schema, in the same order
+    """
+    npv_profile = calculate_npv_profile(
+        CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS[:2]), [0.0, 5.0]
+    )
+
+    profile_row = next(npv_profile.iter_ndjson("entity_name")).splitlines()[0]
+    root_row = next(npv_profile.iter_roots_ndjson("entity_name"))
+
+    assert list(json.loads(profile_row)) == [field.name for field in NPV_PROFILE_SCHEMA]
+    assert list(json.loads(root_row)) == [field.name for field in IRR_ROOT_SCHEMA]
+
+
+def test_load_npv_profiles(
+    bq_destination_repository: BigQueryDestinationRepository,
+):
+    """
+    GIVEN a BigQueryDestinationRepository and the NPV profiles of batches of accounts
+    WHEN the profiles are loaded into tables that do not exist yet
+    THEN the tables should be created with the rows of every batch
+    """
+    bq_destination_repository.npv_profile_destination = (
+        bq_destination_repository.irr_destination
+    )
+    bq_destination_repository.irr_root_destination = (
+        f"{bq_destination_repository.irr_destination}_roots"
+    )
+    columns = CashflowColumns.from_snapshots(CAHSFLOW_SNAPSHOTS)
+    columns = columns.take(columns.sort_order())
+    npv_profiles = [
+        calculate_npv_profile(columns.take(columns.account_codes == code), [0.0, 5.0])
+        for code in range(len(columns.account_names))
+    ]
+
+    bq_destination_repository.load_npv_profiles(npv_profiles)
+
+    client = bq_destination_repository.client
+    for destination, serialize in (
+        (bq_destination_repository.npv_profile_destination, NpvProfile.iter_ndjson),
+        (bq_destination_repository.irr_root_destination, NpvProfile.iter_roots_ndjson),
+    ):
+        query_job = client.query(f"SELECT COUNT(*) AS row_count FROM {destination}")
+        assert next(iter(query_job.result()))["row_count"] == sum(
+            chunk.count("\n")
+            for npv_profile in npv_profiles
+            for chunk in serialize(npv_profile, "entity_name")
+        )
+    client.delete_table(bq_destination_repository.irr_root_destination)
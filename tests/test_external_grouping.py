@@ -0,0 +1,98 @@
+import os
+import random
+
+from src import external_grouping
+from src.columnar import CashflowColumns
+from src.source_repository import SyntheticSourceRepository
+from tests.data.constants import CAHSFLOW_SNAPSHOTS
+
+
+def _sorted_snapshots(cashflow_snapshots):
+    return sorted(
+        cashflow_snapshots,
+        key=lambda snapshot: (snapshot.account_name, snapshot.first_day_of_month),
+    )
+
+
+def test_group_by_account_in_memory(tmp_path):
+    """
+    GIVEN an unordered stream of cashflow snapshots that fits in the memory budget
+    WHEN they are grouped by account
+    THEN a single extract sorted by account and month should be returned
+         without writing anything to disk
+    """
+    shuffled = random.Random(1).sample(CAHSFLOW_SNAPSHOTS, len(CAHSFLOW_SNAPSHOTS))
+
+    extracts = list(
+        external_grouping.group_by_account(
+            iter(shuffled), memory_budget=10**6, spill_dir=str(tmp_path)
+        )
+    )
+
+    assert len(extracts) == 1
+    assert extracts[0].to_snapshots() == _sorted_snapshots(CAHSFLOW_SNAPSHOTS)
+    assert os.listdir(tmp_path) == []
+
+
+def test_group_by_account_with_spill(tmp_path):
+    """
+    GIVEN an unordered stream of cashflow snapshots larger than the memory budget
+    WHEN they are grouped by account
+    THEN every account should come out complete, in date order and in a single
+         extract, and spill files should be removed afterwards
+    """
+    shuffled = random.Random(2).sample(CAHSFLOW_SNAPSHOTS, len(CAHSFLOW_SNAPSHOTS))
+
+    extracts = list(
+        external_grouping.group_by_account(
+            iter(shuffled),
+            memory_budget=2 * external_grouping.ROW_BYTES,
+            spill_dir=str(tmp_path),
+            partitions=2,
+        )
+    )
+
+    for extract in extracts:
+        assert len(set(extract.account_codes.tolist())) == 1
+    merged = CashflowColumns.concatenate(extracts)
+    assert _sorted_snapshots(merged.to_snapshots()) == _sorted_snapshots(
+        CAHSFLOW_SNAPSHOTS
+    )
+    for extract in extracts:
+        snapshots = extract.to_snapshots()
+        assert snapshots == _sorted_snapshots(snapshots)
+    assert os.listdir(tmp_path) == []
+
+
+def test_group_by_account_empty_stream():
+    """
+    GIVEN an empty stream of cashflow snapshots
+    WHEN they are grouped by account
+    THEN no extract should be returned
+    """
+    assert list(external_grouping.group_by_account(iter([]), memory_budget=1024)) == []
+
+
+def test_group_by_account_with_intermediate_merges(tmp_path):
+    """
+    GIVEN an unordered stream spilled into more runs than the budget can merge at once
+    WHEN they are grouped by account
+    THEN the accounts should come out complete and sorted as from an in memory sort,
+         and every run, including the intermediate ones, should be removed
+    """
+    columns = SyntheticSourceRepository(accounts=40, months=60).get_cashflow_columns()
+    snapshots = random.Random(3).sample(columns.to_snapshots(), len(columns))
+    memory_budget = 2 * external_grouping.CHUNK_ROWS * external_grouping.ROW_BYTES
+
+    extracts = list(
+        external_grouping.group_by_account(
+            iter(snapshots), memory_budget, spill_dir=str(tmp_path), partitions=2
+        )
+    )
+
+    merged = CashflowColumns.concatenate(extracts)
+    assert _sorted_snapshots(merged.to_snapshots()) == _sorted_snapshots(snapshots)
+    for extract in extracts:
+        extract_snapshots = extract.to_snapshots()
+        assert extract_snapshots == _sorted_snapshots(extract_snapshots)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.gcp_clients import BigQueryClientPool
+
+
+def test_bigquery_client_pool_reuses_clients():
+    """
+    GIVEN a client pool
+    WHEN clients are requested concurrently for the same and different projects
+    THEN a single client should be created per project
+    """
+    created = []
+
+    def client_factory(project_id):
+        created.append(project_id)
+        return object()
+
+    pool = BigQueryClientPool(client_factory)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        clients = list(executor.map(pool.get, ["a", "b", "a", "b"] * 4))
+
+    assert sorted(created) == ["a", "b"]
+    assert clients[0] is clients[2] is pool.get("a")
+    assert clients[1] is pool.get("b")
+    assert clients[0] is not clients[1]
@@ -1,4 +1,5 @@
-from src.utils.logs import default_module_logger
+from logging.handlers import QueueHandler
+from src.utils.logs import AggregatingLogger, default_module_logger, stop_logging
 import logging
 
 
@@ -15,3 +16,77 @@ def test_default_module_logger_writes_messages_to_console(caplog):
         logger.info(log_message)
 
     assert log_message in caplog.text
+
+
+def test_default_module_logger_writes_asynchronously(capsys):
+    """
+    GIVEN an asynchronous module logger
+    WHEN a log message is emitted and logging is stopped
+    THEN the message should have been queued and then written by the background thread
+    """
+    stop_logging()
+    logger = default_module_logger("asynchronous test logger")
+    assert isinstance(logger.handlers[0], QueueHandler)
+
+    logger.info("queued message")
+    stop_logging()
+
+    assert "queued message" in capsys.readouterr().err
+
+
+def test_default_module_logger_after_stop_logging(capsys):
+    """
+    GIVEN an asynchronous module logger created before logging was stopped
+    WHEN a log message is emitted after logging was stopped
+    THEN the background thread should be started again and write the message
+    """
+    logger = default_module_logger("restarted test logger")
+    stop_logging()
+
+    logger.info("message after stop")
+    stop_logging()
+
+    assert "message after stop" in capsys.readouterr().err
+
+
+def test_aggregating_logger(caplog):
+    """
+    GIVEN an aggregating logger
+    WHEN the same kind of message is logged many times and then flushed
+    THEN a single summary line with the number of messages should be written,
+         and messages below the logger level should be ignored
+    """
+    logger = logging.getLogger("aggregating test logger")
+    aggregating_logger = AggregatingLogger(logger)
+
+    with caplog.at_level(logging.INFO, logger=logger.name):
+        for account in range(1000):
+            aggregating_logger.log(
+                "key", logging.INFO, "Not enough values for %s", account
+            )
+            aggregating_logger.log("key", logging.DEBUG, "Debug %s", account)
+        assert caplog.records == []
+        aggregating_logger.flush()
+        aggregating_logger.flush()
+
+    assert caplog.messages == ["Not enough values for 0 (and 999 similar messages)"]
+
+
+def test_aggregating_logger_interval(caplog):
+    """
+    GIVEN an aggregating logger without a minimum interval between summaries
+    WHEN messages are logged
+    THEN a summary should be written as soon as a key has two messages
+    """
+    logger = logging.getLogger("aggregating interval test logger")
+    aggregating_logger = AggregatingLogger(logger, interval=0)
+
+    with caplog.at_level(logging.INFO, logger=logger.name):
+        for account in range(3):
+            aggregating_logger.log("key", logging.INFO, "Message for %s", account)
+        aggregating_logger.flush()
+
+    assert caplog.messages == [
+        "Message for 0 (and 1 similar messages)",
+        "Message for 2",
+    ]
@@ -1,5 +1,7 @@
 from src import model
 import datetime as dt
+import numpy as np
+import numpy_financial as npf
 import pytest
 
 
@@ -128,3 +130,152 @@ def test_entity_inequality():
 
     assert not entity1 == entity2
     assert not entity1 == 1
+
+
+def test_calculate_irr_series():
+    """
+    GIVEN the monthly net cashflows and valuations of a series
+    WHEN the IRR series is calculated
+    THEN an IRR should be returned for every month but the first
+    """
+    irrs = model.calculate_irr_series([-1000, 100, 100], [0, 1000, 1000])
+
+    assert irrs == [0.1, 0.1]
+
+
+def test_calculate_twr_series():
+    """
+    GIVEN the monthly net cashflows and valuations of a series
+    WHEN the time-weighted return series is calculated
+    THEN monthly returns should chain into the cumulative return, and a month with
+         no opening position should have an undefined return
+    """
+    monthly, cumulative = model.calculate_twr_series(
+        [-1000, 100, 0, 0], [0, 1000, 1210, 0]
+    )
+
+    assert monthly[:2].tolist() == [0.1, 0.21]
+    assert cumulative[:2].tolist() == [0.1, 0.331]
+    assert monthly[2] == -1
+    assert np.isnan(model.calculate_twr_series([0, 0], [0, 10])[0][0])
+
+
+def test_calculate_irrs_with_twr():
+    """
+    GIVEN an account with a collection of cashflows
+    WHEN IRRs are calculated
+    THEN the time-weighted return of every month should be calculated as well
+    """
+    entity_name = "test account"
+    entity = model.Account(entity_name)
+    model.allocate_cashflow_snapshots_to_accounts(
+        [
+            model.CashflowSnapshot(dt.datetime(2022, 1, 1), 1000, 0, 0, entity_name),
+            model.CashflowSnapshot(dt.datetime(2022, 2, 1), 0, 100, 1000, entity_name),
+            model.CashflowSnapshot(dt.datetime(2022, 3, 1), 0, 100, 1000, entity_name),
+        ],
+        {entity_name: entity},
+    )
+
+    entity.calculate_irr()
+
+    assert [irr.twr_monthly for irr in entity.irr_snapshots] == [0.1, 0.1]
+    assert [irr.twr_cumulative for irr in entity.irr_snapshots] == [0.1, 0.21]
+
+
+def test_calculate_irr_sensitivities():
+    """
+    GIVEN a series of net cashflows and valuations with their solved IRRs
+    WHEN the IRR sensitivities are calculated
+    THEN they should match the IRR change of re-solving with a bumped valuation
+    """
+    net_cashflows = [-1000, 100, 100, 50]
+    valuations = [0, 1000, 1000, 1200]
+    irrs = model.calculate_irr_series(net_cashflows, valuations, decimals=None)
+
+    sensitivities = model.calculate_irr_sensitivities(net_cashflows, valuations, irrs)
+
+    for month in range(1, len(net_cashflows)):
+        bumped = list(valuations)
+        bumped[month] += 0.01
+        bumped_irr = model.calculate_irr_series(net_cashflows, bumped, decimals=None)
+        assert sensitivities[month - 1] == pytest.approx(
+            (bumped_irr[month - 1] - irrs[month - 1]) / 0.01, rel=1e-4
+        )
+    assert np.isnan(model.calculate_irr_sensitivities([0, 0], [0, 0], [np.nan])[0])
+
+
+def test_irr_cashflow_sensitivity():
+    """
+    GIVEN an IRR snapshot with a valuation sensitivity
+    WHEN the sensitivity to an earlier cashflow is requested
+    THEN it should be the valuation sensitivity compounded at the IRR
+    """
+    irr = model.IrrSnapshot(dt.date(2022, 3, 1), 0.1, "test account", None, None, 0.5)
+
+    assert irr.irr_cashflow_sensitivity(0) == 0.5
+    assert irr.irr_cashflow_sensitivity(2) == pytest.approx(0.605)
+    assert (
+        model.IrrSnapshot(dt.date(2022, 3, 1), 0.1, "a").irr_cashflow_sensitivity(1)
+        is None
+    )
+
+
+def test_calculate_mirr_series():
+    """
+    GIVEN a series of net cashflows and valuations and MIRR rates
+    WHEN the MIRR series is calculated
+    THEN every month should match numpy-financial MIRR of its prefix,
+         and be undefined when there is no negative cashflow
+    """
+    net_cashflows = [-1000, 100, -200, 50]
+    valuations = [0, 1000, 1200, 1300]
+    finance_rate, reinvestment_rate = model.MirrRates(0.05, 0.03).monthly()
+
+    mirrs = model.calculate_mirr_series(
+        net_cashflows, valuations, finance_rate, reinvestment_rate
+    )
+
+    for month in range(1, len(net_cashflows)):
+        values = net_cashflows[: month + 1]
+        values[month] += valuations[month]
+        assert mirrs[month - 1] == round(
+            npf.mirr(values, finance_rate, reinvestment_rate), 4
+        )
+    assert np.isnan(model.calculate_mirr_series([100, 0], [0, 100], 0.01, 0.01)[0])
+
+
+def test_calculate_irrs_with_mirr_only():
+    """
+    GIVEN an account with a collection of cashflows
+    WHEN only the MIRR is calculated
+    THEN snapshots should have a MIRR and no IRR
+    """
+    entity_name = "test account"
+    entity = model.Account(entity_name)
+    model.allocate_cashflow_snapshots_to_accounts(
+        [
+            model.CashflowSnapshot(dt.datetime(2022, 1, 1), 1000, 0, 0, entity_name),
+            model.CashflowSnapshot(dt.datetime(2022, 2, 1), 0, 0, 1100, entity_name),
+        ],
+        {entity_name: entity},
+    )
+
+    entity.calculate_irr(mirr_rates=model.MirrRates(0.05, 0.03), solve_irr=False)
+
+    assert entity.irr_snapshots[0].irr_monthly is None
+    assert entity.irr_snapshots[0].irr_annual is None
+    assert entity.irr_snapshots[0].mirr_monthly == 0.1
+    assert entity.irr_snapshots[0].mirr_annual == 2.1384
+
+
+def test_annual_to_monthly_rate():
+    """
+    GIVEN annual rates
+    WHEN they are converted to monthly rates
+    THEN compounding the monthly rate over a year should give the annual rate,
+         and rates of -100% or less should be rejected
+    """
+    assert (1 + model.annual_to_monthly_rate(0.08)) ** 12 == pytest.approx(1.08)
+    with pytest.raises(ValueError):
+        model.annual_to_monthly_rate(-1)
@@ -0,0 +1,114 @@
+import numpy as np
+import numpy_financial as npf
+
+from src.columnar import MISSING_MONTH, CashflowColumns
+from src.npv_profile import calculate_npv_profile, iter_npv_profiles
+from src.source_repository import SyntheticSourceRepository
+
+
+MULTIPLE_IRR_RECORDS = [
+    ("a", 24264, 100.0, 0.0, 0.0),
+    ("a", 24265, 0.0, 230.0, 0.0),
+    ("a", 24266, 132.0, 0.0, 0.0),
+    ("b", 24264, 1000.0, 0.0, 0.0),
+    ("b", 24265, 0.0, 0.0, 1100.0),
+]
+
+
+def test_calculate_npv_profile():
+    """
+    GIVEN accounts with one and with two IRRs
+    WHEN their NPV profile is calculated over a grid of rates
+    THEN the NPVs should match numpy-financial and every IRR should be reported
+    """
+    columns = CashflowColumns.from_records(MULTIPLE_IRR_RECORDS)
+    rates_annual = np.arange(0, 10, 0.05)
+
+    npv_profile = calculate_npv_profile(columns, rates_annual)
+
+    rates_monthly = (1 + rates_annual) ** (1 / 12) - 1
+    np.testing.assert_allclose(
+        npv_profile.npvs,
+        [
+            [npf.npv(rate, [-100, 230]) for rate in rates_monthly],
+            [npf.npv(rate, [-100, 230, -132]) for rate in rates_monthly],
+            [npf.npv(rate, [-1000, 1100]) for rate in rates_monthly],
+        ],
+    )
+    assert npv_profile.root_rows.tolist() == [1, 1, 2]
+    np.testing.assert_allclose(npv_profile.roots_monthly, [0.1, 0.2, 0.1])
+
+
+def test_iter_npv_profiles():
+    """
+    GIVEN an extract of several accounts
+    WHEN NPV profiles are calculated in batches of whole accounts
+    THEN the batches should hold the same profile and roots as a single calculation
+    """
+    columns = SyntheticSourceRepository(accounts=5, months=24).get_cashflow_columns()
+    columns = columns.take(columns.sort_order())
+    rates_annual = np.arange(-0.5, 1.0, 0.1)
+
+    npv_profiles = list(iter_npv_profiles(columns, rates_annual, max_cells=50 * 15))
+    npv_profile = calculate_npv_profile(columns, rates_annual)
+
+    assert len(npv_profiles) == 3
+    np.testing.assert_allclose(
+        np.vstack([batch.npvs for batch in npv_profiles]), npv_profile.npvs
+    )
+    assert "".join(
+        line for batch in npv_profiles for line in batch.iter_roots_ndjson("name")
+    ) == "".join(npv_profile.iter_roots_ndjson("name"))
+
+
+def test_calculate_npv_profile_missing_month():
+    """
+    GIVEN accounts with rows whose month is missing, sorted first by validation
+    WHEN their NPV profile is calculated and serialized
+    THEN the rows without a month should be left out of the profile and the roots
+    """
+    records = [("a", MISSING_MONTH, 0.0, 0.0, 0.0), ("a", MISSING_MONTH, 5.0, 0.0, 0.0)]
+    columns = CashflowColumns.from_records(records + MULTIPLE_IRR_RECORDS)
+    rates_annual = np.arange(0, 10, 0.05)
+
+    npv_profile = calculate_npv_profile(columns, rates_annual)
+    expected = calculate_npv_profile(
+        CashflowColumns.from_records(MULTIPLE_IRR_RECORDS), rates_annual
+    )
+
+    np.testing.assert_allclose(npv_profile.npvs, expected.npvs)
+    assert list(npv_profile.iter_ndjson("name")) == list(expected.iter_ndjson("name"))
+    assert list(npv_profile.iter_roots_ndjson("name")) == list(
+        expected.iter_roots_ndjson("name")
+    )
+
+
+def test_calculate_npv_profile_undefined_cashflow():
+    """
+    GIVEN an account with an undefined cashflow, followed by another account
+    WHEN their NPV profile is calculated
+    THEN the NPVs of the first account should be undefined from that month on, and the
+    profile and roots of the following account should not be affected
+    """
+    records = [
+        ("a", 24264, 100.0, 0.0, 0.0),
+        ("a", 24265, 0.0, 230.0, 0.0),
+        ("a", 24266, float("nan"), 0.0, 0.0),
+        ("a", 24267, 10.0, 0.0, 0.0),
+        ("b", 24264, 1000.0, 0.0, 0.0),
+        ("b", 24265, 0.0, 0.0, 1100.0),
+    ]
+    rates_annual = np.arange(0, 10, 0.05)
+
+    npv_profile = calculate_npv_profile(
+        CashflowColumns.from_records(records), rates_annual
+    )
+    expected = calculate_npv_profile(
+        CashflowColumns.from_records(records[4:]), rates_annual
+    )
+
+    assert np.isfinite(npv_profile.npvs[0]).all()
+    assert np.isnan(npv_profile.npvs[1:3]).all()
+    np.testing.assert_allclose(npv_profile.npvs[3:], expected.npvs)
+    assert npv_profile.root_rows.tolist() == [3]
+    np.testing.assert_allclose(npv_profile.roots_monthly, expected.roots_monthly)
@@ -0,0 +1,66 @@
+import cProfile
+import pstats
+import tracemalloc
+
+from src.utils.profiling import StageRecorder, collapsed_stacks, summary_table
+
+
+def _child():
+    return sum(range(10000))
+
+
+def _parent():
+    return [_child() for _ in range(5)]
+
+
+def test_stage_recorder():
+    """
+    GIVEN a StageRecorder and tracemalloc tracing
+    WHEN code runs within named stages
+    THEN time, calls and allocations should be accumulated by stage
+    """
+    recorder = StageRecorder(keep_snapshots=True)
+    tracemalloc.start()
+    try:
+        with recorder.stage("first"):
+            data = [0] * 100000
+        with recorder.stage("first"):
+            pass
+        with recorder.stage("second"):
+            _parent()
+    finally:
+        tracemalloc.stop()
+
+    assert list(recorder.stages) == ["first", "second"]
+    assert recorder.stages["first"].calls == 2
+    assert recorder.stages["first"].allocated_bytes >= 800000
+    assert recorder.stages["second"].seconds > 0
+    assert recorder.peak_snapshot is not None
+    assert len(data) == 100000
+
+
+def test_collapsed_stacks_and_summary():
+    """
+    GIVEN profiler statistics of nested function calls
+    WHEN collapsed stacks and the summary table are built
+    THEN stacks should go from caller to callee and the summary should list stages
+         and functions
+    """
+    recorder = StageRecorder()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    with recorder.stage("compute"):
+        _parent()
+    profiler.disable()
+    stats = pstats.Stats(profiler)
+
+    stacks = collapsed_stacks(stats)
+    summary = summary_table(recorder, stats, top=5)
+
+    assert any(
+        "_parent (test_profiling.py" in line and ";_child (test_profiling.py" in line
+        for line in stacks
+    )
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in stacks)
+    assert "compute" in summary
+    assert "allocation site" not in summary
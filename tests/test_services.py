@@ -1,10 +1,28 @@
+import json
 import os
+import time
 import datetime as dt
 
-from src.destination_repository import BigQueryDestinationRepository
-from src.source_repository import BigQuerySourceRepository
+from src.destination_repository import (
+    AbstractDestinationRepository,
+    BigQueryDestinationRepository,
+    FileDestinationRepository,
+)
+from src.source_repository import BigQuerySourceRepository, FileSourceRepository
 from src import services
-from tests.data.constants import ACCOUNTS
+from tests.data.constants import ACCOUNTS, CASHFLOWS_DICTS
+
+
+class InMemoryDestinationRepository(AbstractDestinationRepository):
+    def __init__(self):
+        self.irrs = {}
+        self.group_irrs = {}
+
+    def load_irrs(self, accounts):
+        self.irrs = {name: account.irr_snapshots for name, account in accounts.items()}
+
+    def load_group_irrs(self, group_irrs):
+        self.group_irrs = group_irrs
 
 
 def test_irr_pipeline(
@@ -27,3 +45,135 @@ def test_irr_pipeline(
             assert row["entity_name"] == irr_snapshot.account_name
             assert row["first_day_of_month"] == irr_snapshot.first_day_of_month
             assert row["irr_monthly"] == irr_snapshot.irr_monthly
+
+
+def test_irr_pipeline_validation_mode(tmp_path):
+    """
+    GIVEN cashflows of an account with a duplicated month
+    WHEN they are processed by irr_pipeline() in quarantine mode
+    THEN only the IRRs of the other account should be loaded
+    """
+    path = tmp_path / "cashflows.json"
+    rows = CASHFLOWS_DICTS + [CASHFLOWS_DICTS[1]]
+    path.write_text("\n".join(json.dumps(row) for row in rows))
+    destination = InMemoryDestinationRepository()
+
+    services.irr_pipeline(
+        FileSourceRepository(str(path)), destination, validation_mode="quarantine"
+    )
+
+    assert destination.irrs == {
+        "Test Account 2": ACCOUNTS["Test Account 2"].irr_snapshots
+    }
+
+
+def test_irr_pipeline_with_memory_budget(tmp_path):
+    """
+    GIVEN cashflows exported to a file in no particular order
+    WHEN they are processed by irr_pipeline() with a memory budget small enough to spill
+    THEN the same account and group IRRs as the in memory pipeline should be loaded
+    """
+    path = tmp_path / "cashflows.json"
+    path.write_text("\n".join(json.dumps(row) for row in reversed(CASHFLOWS_DICTS)))
+    group_mapping = {"Test Account 1": "book", "Test Account 2": "book"}
+    in_memory = InMemoryDestinationRepository()
+    spilled = InMemoryDestinationRepository()
+
+    services.irr_pipeline(
+        FileSourceRepository(str(path)), in_memory, group_mapping=group_mapping
+    )
+    services.irr_pipeline(
+        FileSourceRepository(str(path)),
+        spilled,
+        group_mapping=group_mapping,
+        memory_budget=512,
+        spill_dir=str(tmp_path),
+    )
+
+    assert in_memory.irrs == {
+        key: account.irr_snapshots for key, account in ACCOUNTS.items()
+    }
+    assert spilled.irrs == in_memory.irrs
+    assert spilled.group_irrs == in_memory.group_irrs
+    assert list(in_memory.group_irrs) == ["book"]
+
+
+def test_run_pipelines():
+    """
+    GIVEN several pipelines waiting on I/O, one of which fails
+    WHEN they are run concurrently
+    THEN every pipeline should report its timing, the failure should not stop the
+         others and the total wall time should be close to the slowest pipeline
+    """
+    completed = []
+
+    def pipeline(name):
+        def run():
+            time.sleep(0.2)
+            if name == "failing":
+                raise RuntimeError("source unavailable")
+            completed.append(name)
+
+        return run
+
+    start = time.perf_counter()
+    runs = services.run_pipelines(
+        {name: pipeline(name) for name in ("a", "failing", "b")}, max_workers=3
+    )
+    seconds = time.perf_counter() - start
+
+    assert [run.name for run in runs] == ["a", "failing", "b"]
+    assert [run.succeeded for run in runs] == [True, False, True]
+    assert isinstance(runs[1].error, RuntimeError)
+    assert sorted(completed) == ["a", "b"]
+    assert all(run.seconds >= 0.2 for run in runs)
+    assert seconds < 0.5
+
+
+def test_deduplicated_irr_pipeline(tmp_path):
+    """
+    GIVEN cashflows exported to a file and a file destination
+    WHEN the deduplicated pipeline is triggered repeatedly
+    THEN it should only run for new data or options, and not while another run holds the lock
+    """
+    path = tmp_path / "cashflows.json"
+    path.write_text("\n".join(json.dumps(row) for row in CASHFLOWS_DICTS))
+    source = FileSourceRepository(str(path))
+    destination = FileDestinationRepository(str(tmp_path / "irrs"))
+
+    assert services.deduplicated_irr_pipeline(source, destination)
+    assert not services.deduplicated_irr_pipeline(source, destination)
+
+    path.write_text(path.read_text())
+    os.utime(path, ns=(0, 0))
+    assert not services.deduplicated_irr_pipeline(source, destination)
+    assert destination.get_run_fingerprints()["fingerprint"] == (
+        services._run_digest(
+            source.get_fingerprint(), '{"include_sensitivities": false}'
+        )
+    )
+
+    assert services.deduplicated_irr_pipeline(source, destination, solve_irr=False)
+
+    path.write_text("\n".join(json.dumps(row) for row in CASHFLOWS_DICTS[:-1]))
+    with destination.run_lock():
+        assert not services.deduplicated_irr_pipeline(source, destination)
+    assert services.deduplicated_irr_pipeline(source, destination)
+
+
+def test_deduplicated_irr_pipeline_after_other_load(tmp_path):
+    """
+    GIVEN a deduplicated run recorded by a file destination
+    WHEN the destination is then loaded by a plain IRR pipeline with other options
+    THEN the recorded run should be cleared and the deduplicated pipeline run again
+    """
+    path = tmp_path / "cashflows.json"
+    path.write_text("\n".join(json.dumps(row) for row in CASHFLOWS_DICTS))
+    source = FileSourceRepository(str(path))
+    destination = FileDestinationRepository(str(tmp_path / "irrs"))
+
+    assert services.deduplicated_irr_pipeline(source, destination)
+    services.irr_pipeline(source, destination, solve_irr=False)
+
+    assert destination.get_run_fingerprints() == {}
+    assert services.deduplicated_irr_pipeline(source, destination)
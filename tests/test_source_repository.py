@@ -1,4 +1,6 @@
-from tests.data.constants import CAHSFLOW_SNAPSHOTS
+import json
+
+from tests.data.constants import CAHSFLOW_SNAPSHOTS, CASHFLOWS_DICTS
 from src import source_repository
 
 
@@ -14,3 +16,183 @@ def test_get_cashflow_snapshots(
 
     assert len(results) == len(CAHSFLOW_SNAPSHOTS)
     assert sorted(results) == sorted(CAHSFLOW_SNAPSHOTS)
+
+
+def test_get_fingerprint(
+    source_repository_with_cashflows: source_repository.BigQuerySourceRepository,
+):
+    """
+    GIVEN a BigQuery source repository with a cashflow table
+    WHEN its fingerprint is requested
+    THEN the row count of the table should be part of it
+    """
+    fingerprint = source_repository_with_cashflows.get_fingerprint()
+
+    assert fingerprint.startswith(f"{len(CAHSFLOW_SNAPSHOTS)}:")
+
+
+def test_get_checksum_duplicated_rows(
+    source_repository_with_cashflows: source_repository.BigQuerySourceRepository,
+):
+    """
+    GIVEN a BigQuery source repository with a cashflow table
+    WHEN a row of the table is inserted twice more
+    THEN the checksum should change, although the two copies are identical
+    """
+    repository = source_repository_with_cashflows
+    checksum = repository.get_checksum()
+
+    repository.client.query(
+        f"INSERT INTO {repository.cashflow_table} SELECT cashflow.*"
+        f" FROM (SELECT * FROM {repository.cashflow_table} LIMIT 1) AS cashflow,"
+        " UNNEST([1, 2])"
+    ).result()
+
+    assert repository.get_checksum() != checksum
+
+
+class InMemorySourceRepository(source_repository.AbstractSourceRepository):
+    def __init__(self, cashflow_snapshots, fingerprint=None):
+        self.cashflow_snapshots = cashflow_snapshots
+        self.fingerprint = fingerprint
+        self.calls = 0
+
+    def get_cashflow_snapshots(self):
+        self.calls += 1
+        return self.cashflow_snapshots
+
+    def get_fingerprint(self):
+        return self.fingerprint
+
+
+def test_cached_source_repository_within_ttl(tmp_path):
+    """
+    GIVEN a cached source repository with a long time to live
+    WHEN cashflow snapshots are requested twice, from two instances
+    THEN the wrapped source should be read only once and the second request
+         should be a cache hit returning the same snapshots
+    """
+    source = InMemorySourceRepository(CAHSFLOW_SNAPSHOTS)
+    cache_dir = str(tmp_path / "cache")
+
+    first = source_repository.CachedSourceRepository(source, cache_dir, ttl=3600)
+    assert first.get_cashflow_snapshots() == CAHSFLOW_SNAPSHOTS
+    second = source_repository.CachedSourceRepository(source, cache_dir, ttl=3600)
+    assert second.get_cashflow_snapshots() == CAHSFLOW_SNAPSHOTS
+
+    assert source.calls == 1
+    assert (second.hits, second.misses) == (1, 1)
+    assert second.hit_rate == 0.5
+    assert second.cache_age >= 0
+
+
+def test_cached_source_repository_fingerprint(tmp_path):
+    """
+    GIVEN a cached source repository whose time to live has expired
+    WHEN cashflow snapshots are requested
+    THEN the cache should be used while the source fingerprint is unchanged,
+         and refreshed once it changes or when the source has no fingerprint
+    """
+    source = InMemorySourceRepository(CAHSFLOW_SNAPSHOTS, fingerprint="7:a")
+    cached = source_repository.CachedSourceRepository(
+        source, str(tmp_path / "cache"), ttl=-1
+    )
+
+    cached.get_cashflow_snapshots()
+    cached.get_cashflow_snapshots()
+    assert source.calls == 1
+
+    source.fingerprint = "7:b"
+    cached.get_cashflow_snapshots()
+    assert source.calls == 2
+
+    source.fingerprint = None
+    cached.get_cashflow_snapshots()
+    assert source.calls == 3
+    assert cached.get_fingerprint() is None
+
+
+def test_cached_source_repository_keeps_other_files(tmp_path):
+    """
+    GIVEN a cache directory already holding other files and directories
+    WHEN the cache is refreshed from the wrapped source
+    THEN the other files and directories should be left untouched
+    """
+    (tmp_path / "notes.txt").write_text("notes")
+    (tmp_path / "other").mkdir()
+    source = InMemorySourceRepository(CAHSFLOW_SNAPSHOTS)
+    cached = source_repository.CachedSourceRepository(source, str(tmp_path), ttl=-1)
+
+    cached.get_cashflow_snapshots()
+    cached.get_cashflow_snapshots()
+
+    assert source.calls == 2
+    assert (tmp_path / "notes.txt").read_text() == "notes"
+    assert (tmp_path / "other").is_dir()
+
+
+def test_cached_source_repository_iter_batches(tmp_path):
+    """
+    GIVEN a cached source repository with batches smaller than the extract
+    WHEN cashflow snapshots are iterated over, on a cache miss and then on a hit
+    THEN the same snapshots should be yielded as from the wrapped source, read once
+    """
+    source = InMemorySourceRepository(CAHSFLOW_SNAPSHOTS)
+    cached = source_repository.CachedSourceRepository(
+        source, str(tmp_path / "cache"), ttl=3600
+    )
+    cached.BATCH_ROWS = 2
+
+    assert list(cached.iter_cashflow_snapshots()) == CAHSFLOW_SNAPSHOTS
+    assert list(cached.iter_cashflow_snapshots()) == CAHSFLOW_SNAPSHOTS
+    assert source.calls == 1
+
+
+def test_file_source_repository(tmp_path):
+    """
+    GIVEN a newline delimited JSON export of the cashflow table
+    WHEN cashflow snapshots are read through a FileSourceRepository
+    THEN the same snapshots should be returned, and the fingerprint should be stable
+    """
+    path = tmp_path / "cashflows.json"
+    path.write_text("\n".join(json.dumps(row) for row in CASHFLOWS_DICTS) + "\n")
+    repository = source_repository.FileSourceRepository(str(path))
+
+    assert repository.get_cashflow_snapshots() == CAHSFLOW_SNAPSHOTS
+    assert list(repository.iter_cashflow_snapshots()) == CAHSFLOW_SNAPSHOTS
+    assert repository.get_fingerprint() == repository.get_fingerprint()
+
+
+def test_synthetic_source_repository():
+    """
+    GIVEN a SyntheticSourceRepository
+    WHEN cashflow data is generated twice with the same seed
+    THEN the same data should be returned, with a row per account and month
+    """
+    repository = source_repository.SyntheticSourceRepository(
+        accounts=3, months=4, seed=1
+    )
+
+    first = repository.get_cashflow_snapshots()
+    second = repository.get_cashflow_snapshots()
+
+    assert first == second
+    assert len(first) == 12
+    assert len({snapshot.account_name for snapshot in first}) == 3
+
+
+def test_file_source_repository_checksum(tmp_path):
+    """
+    GIVEN a cashflow file
+    WHEN it is rewritten with the same content and then with different content
+    THEN its checksum should only change with the content
+    """
+    path = tmp_path / "cashflows.json"
+    path.write_text("\n".join(json.dumps(row) for row in CASHFLOWS_DICTS))
+    repository = source_repository.FileSourceRepository(str(path))
+    checksum = repository.get_checksum()
+
+    path.write_text(path.read_text())
+    assert repository.get_checksum() == checksum
+    path.write_text(json.dumps(CASHFLOWS_DICTS[0]))
+    assert repository.get_checksum() != checksum
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from src import model
+from src.columnar import MISSING_MONTH, CashflowColumns
+from src.source_repository import SyntheticSourceRepository
+from src.target_valuation import calculate_target_valuations
+
+
+def test_calculate_target_valuations():
+    """
+    GIVEN a sorted cashflow extract of several accounts
+    WHEN the valuations required to reach a target IRR are calculated in one pass
+    THEN using them as valuations should give the target IRR at every month
+    """
+    columns = SyntheticSourceRepository(accounts=5, months=24).get_cashflow_columns()
+    columns = columns.take(columns.sort_order())
+
+    target_valuations = calculate_target_valuations(columns, 0.08)
+
+    target = model.annual_to_monthly_rate(0.08)
+    net_cashflows = columns.outflows - columns.inflows
+    assert len(target_valuations) == 5 * 23
+    for code in range(len(columns.account_names)):
+        required = target_valuations.required_valuations[
+            target_valuations.account_codes == code
+        ]
+        irrs = model.calculate_irr_series(
+            net_cashflows[columns.account_codes == code],
+            [0.0] + required.tolist(),
+            decimals=None,
+        )
+        assert irrs == pytest.approx([target] * 23)
+    np.testing.assert_allclose(
+        target_valuations.valuation_shortfalls,
+        target_valuations.required_valuations
+        - columns.valuations[columns.months != columns.months.min()],
+    )
+
+
+def test_target_valuations_to_rows():
+    """
+    GIVEN an account with a known IRR of 10% a month
+    WHEN the rows of the valuations required to reach that IRR are built
+    THEN the required valuation should equal the actual one, without shortfall
+    """
+    columns = CashflowColumns.from_records(
+        [("a", 24264, 1000.0, 0.0, 0.0), ("a", 24265, 0.0, 0.0, 1100.0)]
+    )
+
+    rows = calculate_target_valuations(columns, 1.1**12 - 1).to_rows()
+
+    assert rows == [
+        {
+            "first_day_of_month": "2022-02-01",
+            "target_irr_annual": pytest.approx(1.1**12 - 1),
+            "valuation": 1100.0,
+            "required_valuation": 1100.0,
+            "valuation_shortfall": 0.0,
+            "entity_name": "a",
+        }
+    ]
+
+
+def test_target_valuations_to_rows_missing_month():
+    """
+    GIVEN an account with rows whose month is missing, sorted first by validation
+    WHEN the rows of the required valuations are built
+    THEN the rows should be built with a null first day of month where it is missing
+    """
+    columns = CashflowColumns.from_records(
+        [
+            ("a", MISSING_MONTH, 0.0, 0.0, 0.0),
+            ("a", MISSING_MONTH, 0.0, 0.0, 0.0),
+            ("a", 24264, 1000.0, 0.0, 0.0),
+            ("a", 24265, 0.0, 0.0, 1100.0),
+        ]
+    )
+
+    rows = calculate_target_valuations(columns, 0.08).to_rows()
+
+    assert [row["first_day_of_month"] for row in rows] == [
+        None,
+        "2022-01-01",
+        "2022-02-01",
+    ]
+
+
+def test_calculate_target_valuations_undefined_cashflow():
+    """
+    GIVEN an extract where an earlier account has an undefined inflow, as kept by the
+          report validation mode
+    WHEN the valuations required to reach a target IRR are calculated
+    THEN only the months of that account from the undefined inflow on should be
+         undefined, and the next account should get the same results as alone
+    """
+    account_b = [
+        ("b", 24264, 100.0, 0.0, 0.0),
+        ("b", 24265, 0.0, 0.0, 0.0),
+        ("b", 24266, 0.0, 0.0, 0.0),
+    ]
+    columns = CashflowColumns.from_records(
+        [
+            ("a", 24264, 100.0, 0.0, 0.0),
+            ("a", 24265, 0.0, 0.0, 100.0),
+            ("a", 24266, float("nan"), 0.0, 100.0),
+            ("a", 24267, 0.0, 0.0, 100.0),
+        ]
+        + account_b
+    )
+
+    rows = calculate_target_valuations(columns, 0.05).to_rows()
+    alone = calculate_target_valuations(
+        CashflowColumns.from_records(account_b), 0.05
+    ).to_rows()
+
+    assert [row["required_valuation"] for row in rows[:3]] == [100.41, None, None]
+    assert rows[3:] == alone
@@ -0,0 +1,117 @@
+import datetime as dt
+import pytest
+
+from src import model, validation
+from tests.data.constants import CAHSFLOW_SNAPSHOTS
+
+
+def _snapshot(month: int, inflow=0, outflow=0, valuation=1000, name="test account"):
+    return model.CashflowSnapshot(
+        dt.date(2022, month, 1), inflow, outflow, valuation, name
+    )
+
+
+DIRTY_SNAPSHOTS = [
+    _snapshot(1, inflow=1000),
+    _snapshot(2, outflow=100),
+    _snapshot(2, outflow=50),
+    _snapshot(5, outflow=100, valuation=900),
+    model.CashflowSnapshot(None, 0, 0, 1000, "test account"),
+    _snapshot(1, inflow=500, name="clean account"),
+    _snapshot(2, name="clean account"),
+]
+
+
+def test_validate_clean_extract():
+    """
+    GIVEN a clean list of cashflow snapshots
+    WHEN they are validated in report mode
+    THEN the report should be clean and the same list should be returned
+    """
+    snapshots, report = validation.validate_cashflow_snapshots(CAHSFLOW_SNAPSHOTS)
+
+    assert snapshots is CAHSFLOW_SNAPSHOTS
+    assert report.is_clean
+    assert report.rows == len(CAHSFLOW_SNAPSHOTS)
+
+
+def test_validate_report_mode():
+    """
+    GIVEN cashflow snapshots with a missing date, a duplicated month and a gap
+    WHEN they are validated in report mode
+    THEN every issue should be counted and attributed to the account, without changes
+    """
+    snapshots, report = validation.validate_cashflow_snapshots(DIRTY_SNAPSHOTS)
+
+    assert snapshots is DIRTY_SNAPSHOTS
+    assert report.invalid_rows == 1
+    assert report.duplicate_rows == 1
+    assert report.missing_months == 2
+    assert report.non_monotonic_rows == 0
+    assert report.removed_rows == 0
+    assert report.flagged_accounts["invalid"] == ("test account",)
+    assert report.flagged_accounts["duplicate"] == ("test account",)
+    assert report.flagged_accounts["gap"] == ("test account",)
+    assert "1 duplicated" in report.summary()
+
+
+def test_validate_fill_mode():
+    """
+    GIVEN cashflow snapshots with a missing date, a duplicated month and a gap
+    WHEN they are validated in fill mode
+    THEN invalid rows are dropped, the last duplicate kept and gap months added
+         with no flows and the previous valuation
+    """
+    snapshots, report = validation.validate_cashflow_snapshots(
+        DIRTY_SNAPSHOTS, mode=validation.FILL
+    )
+
+    assert snapshots == [
+        _snapshot(1, inflow=1000),
+        _snapshot(2, outflow=50),
+        _snapshot(3),
+        _snapshot(4),
+        _snapshot(5, outflow=100, valuation=900),
+        _snapshot(1, inflow=500, name="clean account"),
+        _snapshot(2, name="clean account"),
+    ]
+    assert report.filled_rows == 2
+    assert report.removed_rows == 2
+
+
+def test_validate_quarantine_mode():
+    """
+    GIVEN cashflow snapshots of a flagged account and of a clean account
+    WHEN they are validated in quarantine mode
+    THEN only the rows of the clean account should be kept
+    """
+    snapshots, report = validation.validate_cashflow_snapshots(
+        DIRTY_SNAPSHOTS, mode=validation.QUARANTINE
+    )
+
+    assert snapshots == DIRTY_SNAPSHOTS[-2:]
+    assert report.removed_rows == 5
+
+
+def test_validate_non_monotonic():
+    """
+    GIVEN cashflow snapshots whose outflow decreases from one month to the next
+    WHEN they are validated with the monotonic check enabled
+    THEN the decreasing row should be flagged
+    """
+    snapshots = [_snapshot(1, outflow=100), _snapshot(2, outflow=50)]
+
+    _, report = validation.validate_cashflow_snapshots(snapshots, check_monotonic=True)
+
+    assert report.non_monotonic_rows == 1
+    assert report.flagged_accounts["non_monotonic"] == ("test account",)
+
+
+def test_validate_unknown_mode():
+    """
+    GIVEN a list of cashflow snapshots
+    WHEN they are validated with an unknown mode
+    THEN a ValueError should be raised
+    """
+    with pytest.raises(ValueError):
+        validation.validate_cashflow_snapshots(CAHSFLOW_SNAPSHOTS, mode="other")
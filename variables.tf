@@ -34,3 +34,9 @@ variable "zip_file_path" {
   type        = string
   description = "Name of zip file with the Cloud Function code"
 }
+
+variable "validation_mode" {
+  type        = string
+  description = "How flagged cashflows are handled: report, fill or quarantine"
+  default     = "report"
+}